@@ -0,0 +1,222 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from comment_parser import parse_comment_body
+
+logger = logging.getLogger(__name__)
+
+_OFFSET_DTYPE = np.int64
+_ENCODING = 'utf-8'
+# 评论中偶尔出现的孤立代理字符也要能原样传输
+_ERRORS = 'surrogatepass'
+
+
+def _pack(texts):
+    """把一批字符串写入一块共享内存：开头是 count+1 个 int64 字节偏移，之后是拼接的UTF-8字节"""
+    encoded = [text.encode(_ENCODING, _ERRORS) for text in texts]
+    offsets = np.zeros(len(encoded) + 1, dtype=_OFFSET_DTYPE)
+    np.cumsum([len(data) for data in encoded], out=offsets[1:])
+    header = offsets.nbytes
+    size = header + int(offsets[-1])
+    shm = SharedMemory(create=True, size=max(size, 1))
+    shm.buf[:header] = offsets.tobytes()
+    shm.buf[header:size] = b''.join(encoded)
+    return shm, size
+
+
+def _unpack(name, count):
+    """在工作进程中读出 _pack 写入的字符串，读完即断开共享内存"""
+    shm = SharedMemory(name=name)
+    try:
+        header = (count + 1) * np.dtype(_OFFSET_DTYPE).itemsize
+        offsets = np.frombuffer(shm.buf, dtype=_OFFSET_DTYPE, count=count + 1).tolist()
+        data = bytes(shm.buf[header:header + offsets[-1]])
+    finally:
+        shm.close()
+    return [data[start:end].decode(_ENCODING, _ERRORS) for start, end in zip(offsets, offsets[1:])]
+
+
+def _run_chunk(func, name, count):
+    return func(_unpack(name, count))
+
+
+def _run_parse(name):
+    return parse_comment_body(_unpack(name, 1)[0])
+
+
+def _concat(results):
+    if results and isinstance(results[0], np.ndarray):
+        return np.concatenate(results)
+    merged = []
+    for result in results:
+        merged.extend(result)
+    return merged
+
+
+class AnalysisPool:
+    """CPU密集型评论处理的多进程工作池，避免与 Flask/Socket.IO 线程争抢 GIL
+
+    map(func, texts) 把一批文本切成不超过 chunk_size 条的块，每块写入一块共享内存，
+    工作进程按名字读出后调用 func(texts)，结果按原顺序拼接返回；func 必须是模块级函数，
+    返回与输入等长的列表或 NumPy 数组。parse_async(body) 把不小于 parse_min_size 个字符的
+    评论响应交给工作进程解析。
+
+    批次小于 min_batch 条、响应小于阈值、工作池未启动或已损坏时直接在当前进程执行，
+    进程间传输的开销只花在足够大的批次上。工作进程启动失败、崩溃或共享内存不可用时
+    记录日志后永久退回进程内执行；单批任务出错时只把这一批改在当前进程内重算。
+
+    Linux 上默认用 fork 启动工作进程，启动最快，但只有在进程内没有其他线程时才安全
+    （fork 只复制调用线程，其他线程持有的锁在子进程中永远不会释放），所以 start() 应在
+    服务启动写入器、调度器等后台线程之前调用。start() 时如果已有其他线程在运行，
+    改用 spawn 启动工作进程：子进程重新导入主模块，启动较慢但不继承任何锁状态。
+    """
+
+    def __init__(self, workers=None, min_batch=1000, chunk_size=2000, parse_min_size=512 * 1024,
+                 start_method=None, enabled=True):
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.min_batch = min_batch
+        self.chunk_size = chunk_size
+        self.parse_min_size = parse_min_size
+        self.start_method = start_method
+        self.enabled = enabled
+        self._executor = None
+        self._lock = threading.Lock()
+        self.broken = False
+
+        self.batches_offloaded = 0
+        self.items_offloaded = 0
+        self.chunks_submitted = 0
+        self.bytes_shared = 0
+        self.batches_inline = 0
+        self.parses_offloaded = 0
+        self.fallbacks = 0
+        self.total_offload_time = 0.0
+
+    def start(self):
+        """创建工作进程，失败时退回进程内执行"""
+        if not self.enabled or self.broken:
+            return self
+        with self._lock:
+            if self._executor is not None:
+                return self
+            try:
+                context = multiprocessing.get_context(self.start_method)
+                if context.get_start_method() == 'fork' and threading.active_count() > 1:
+                    names = ', '.join(thread.name for thread in threading.enumerate()
+                                      if thread is not threading.current_thread())
+                    logger.warning(f"启动分析工作池时已有其他线程在运行 ({names})，fork 不安全，改用 spawn")
+                    context = multiprocessing.get_context('spawn')
+                # 先在主进程启动 resource_tracker，工作进程继承同一个，
+                # 否则各自的 tracker 会在进程退出时把仍在使用的共享内存当作泄漏删除
+                resource_tracker.ensure_running()
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                # fork 方式在首次提交时一次创建全部工作进程，这里提交一个空任务让它立即发生
+                self._executor.submit(len, ()).result(timeout=60)
+                logger.info(f"分析工作池已启动，{self.workers} 个 {context.get_start_method()} 工作进程")
+            except Exception as e:
+                logger.warning(f"分析工作池启动失败，改为在当前进程内执行: {e}")
+                self._disable()
+        return self
+
+    def _fallback(self, error):
+        self.fallbacks += 1
+        # 工作进程崩溃或共享内存不可用时不再尝试，任务本身出错只影响这一批
+        if isinstance(error, (BrokenProcessPool, OSError)):
+            self._disable()
+
+    def _disable(self):
+        self.broken = True
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    @property
+    def available(self):
+        return self._executor is not None and not self.broken
+
+    def should_offload(self, count):
+        return self.available and count >= self.min_batch
+
+    def map(self, func, texts):
+        """对一批文本调用 func，大批次分块交给工作进程"""
+        texts = list(texts)
+        if not self.should_offload(len(texts)):
+            self.batches_inline += 1
+            return func(texts)
+
+        start_time = time.perf_counter()
+        # 块数至少与工作进程数相同，让每个进程都有活干
+        chunk_size = max(1, min(self.chunk_size, -(-len(texts) // self.workers)))
+        blocks = []
+        try:
+            futures = []
+            for start in range(0, len(texts), chunk_size):
+                chunk = texts[start:start + chunk_size]
+                shm, size = _pack(chunk)
+                blocks.append(shm)
+                self.bytes_shared += size
+                futures.append(self._executor.submit(_run_chunk, func, shm.name, len(chunk)))
+            results = _concat([future.result() for future in futures])
+        except Exception as e:
+            logger.warning(f"分析工作池执行失败，改为在当前进程内执行: {e}")
+            self._fallback(e)
+            return func(texts)
+        finally:
+            for shm in blocks:
+                shm.close()
+                shm.unlink()
+
+        self.batches_offloaded += 1
+        self.items_offloaded += len(texts)
+        self.chunks_submitted += len(blocks)
+        self.total_offload_time += time.perf_counter() - start_time
+        return results
+
+    async def parse_async(self, body):
+        """解析评论响应，足够大的响应在工作进程中解析，不阻塞事件循环所在线程"""
+        if not body or len(body) < self.parse_min_size or not self.available:
+            return parse_comment_body(body)
+        shm, size = _pack([body])
+        try:
+            self.bytes_shared += size
+            data = await asyncio.wrap_future(self._executor.submit(_run_parse, shm.name))
+            self.parses_offloaded += 1
+            return data
+        except Exception as e:
+            logger.warning(f"分析工作池解析响应失败，改为在当前进程内解析: {e}")
+            self._fallback(e)
+            return parse_comment_body(body)
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self):
+        return {
+            'workers': self.workers if self.available else 0,
+            'broken': self.broken,
+            'batches_offloaded': self.batches_offloaded,
+            'items_offloaded': self.items_offloaded,
+            'chunks_submitted': self.chunks_submitted,
+            'batches_inline': self.batches_inline,
+            'parses_offloaded': self.parses_offloaded,
+            'bytes_shared': self.bytes_shared,
+            'fallbacks': self.fallbacks,
+            'avg_offload_ms': round(self.total_offload_time / self.batches_offloaded * 1000, 3)
+            if self.batches_offloaded else 0.0
+        }
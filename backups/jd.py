@@ -5,13 +5,22 @@ import random
 import re
 import time
 import argparse
-import requests
+import sys
 from datetime import datetime
 from pathlib import Path
 import pandas as pd # For Excel export
 
 from playwright.async_api import async_playwright, Page, Browser, BrowserContext, TimeoutError
 
+# 复用项目根目录下的公共模块
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from comment_dedup import CommentDeduper
+from comment_api import CommentApiClient
+from comment_parser import parse_comment_body, iter_comments, normalize_comment
+from comment_record import as_dict
+from comment_buffer import CommentBuffer
+from resource_router import ResourceRouter
+
 # 配置日志
 import logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -35,9 +44,14 @@ class JDCommentScraper:
         self.timeout = timeout
         
         # 数据存储
-        self.captured_comments = []
+        # 内存有界的评论缓冲区，超出部分溢出到磁盘
+        self.captured_comments = CommentBuffer(spill_dir=Path(user_data_dir) / "spill")
+        # 与captured_comments并行维护的去重索引
+        self.deduper = CommentDeduper()
         self.comment_api_pattern = re.compile(r'comment\?callback=fetchJSON_comment|club.jd.com/comment/skuProductPageComments.action|club.jd.com/comment/productPageComments.action')
         self.test_mode = test_mode
+        # 资源拦截路由，评论接口始终放行
+        self.resource_router = ResourceRouter(allow_pattern=self.comment_api_pattern)
         
     async def setup(self):
         """设置Playwright浏览器实例，增强反爬措施"""
@@ -124,10 +138,8 @@ class JDCommentScraper:
         # 设置拦截器捕获评论API响应
         await self.context.route(self.comment_api_pattern, self.intercept_comments)
         
-        # 设置请求拦截，过滤部分资源加快加载
-        await self.context.route("**/*.{png,jpg,jpeg,gif,svg,webp}", lambda route: route.abort() if random.random() < 0.5 else route.continue_())
-        await self.context.route("**/*.{css}", lambda route: route.continue_())
-        await self.context.route("**/*.{woff,woff2,ttf,otf,eot}", lambda route: route.abort() if random.random() < 0.5 else route.continue_())
+        # 确定性地拦截图片、字体和统计脚本等资源加快加载
+        await self.resource_router.install(self.context)
         
         self.page = await self.context.new_page()
         
@@ -147,36 +159,16 @@ class JDCommentScraper:
                 try:
                     body = await response.text()
                     
-                    # 处理JSONP响应
-                    if 'fetchJSON_comment' in body:
-                        json_str = re.search(r'fetchJSON_comment\d*\((.*)\);', body)
-                        if json_str:
-                            body = json_str.group(1)
-                    
-                    data = json.loads(body)
+                    # 按偏移剥离JSONP包裹并一次性解码
+                    data = parse_comment_body(body)
                     
-                    if 'comments' in data:
-                        comments = data['comments']
-                        logger.info(f"成功捕获 {len(comments)} 条评论")
+                    if isinstance(data, dict) and 'comments' in data:
+                        logger.info(f"成功捕获 {len(data['comments'])} 条评论")
                         
-                        for comment in comments:
-                            if comment.get('content'):  # 只添加有内容的评论
-                                comment_data = {
-                                    'content': comment.get('content', ''),
-                                    'creationTime': comment.get('creationTime', ''),
-                                    'nickname': comment.get('nickname', ''),
-                                    'score': comment.get('score', 0),
-                                    'userLevelName': comment.get('userLevelName', ''),
-                                    'productColor': comment.get('productColor', ''),
-                                    'productSize': comment.get('productSize', ''),
-                                    'images': comment.get('images', [])
-                                }
-                                # 避免重复添加相同评论
-                                content_exists = any(c['content'] == comment_data['content'] and 
-                                                    c['nickname'] == comment_data['nickname'] 
-                                                    for c in self.captured_comments)
-                                if not content_exists:
-                                    self.captured_comments.append(comment_data)
+                        for comment_data in iter_comments(data):
+                            # 避免重复添加相同评论
+                            if self.deduper.add(comment_data):
+                                self.captured_comments.append(comment_data)
                 except Exception as e:
                     logger.error(f"处理拦截的评论数据时出错: {e}")
         except Exception as e:
@@ -428,104 +420,33 @@ class JDCommentScraper:
         return True
     
     async def fetch_comments_via_api(self, sku_id, max_pages=3):
-        """直接通过API获取评论作为备选方案"""
+        """直接通过API获取评论作为备选方案
+
+        使用浏览器上下文自带的异步请求客户端，复用浏览器Cookie和长连接，
+        各页在按主机限速的前提下并发请求，不再阻塞事件循环。
+        """
         logger.info(f"尝试通过直接API请求获取商品 {sku_id} 的评论")
         api_comments = []
+        api_deduper = CommentDeduper()
         
-        user_agents = [
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-            "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36 Edg/119.0.0.0",
-            "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.5 Safari/605.1.15"
-        ]
+        if not self.context:
+            logger.error("浏览器上下文未初始化，无法请求评论API")
+            return api_comments
         
-        # 使用会话保持Cookie一致性
-        session = requests.Session()
-        session.headers.update({
-            'User-Agent': random.choice(user_agents),
-            'Referer': f'https://item.jd.com/{sku_id}.html',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
-            'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-            'Connection': 'keep-alive'
-        })
-        
-        # 提取页面中的cookie
-        if self.context:
-            try:
-                cookies = await self.context.cookies()
-                for cookie in cookies:
-                    session.cookies.set(cookie['name'], cookie['value'])
-            except Exception as e:
-                logger.error(f"提取浏览器Cookie失败: {e}")
+        client = CommentApiClient(self.context.request)
+        try:
+            comments = await client.fetch_comments(sku_id, max_pages)
+        except Exception as e:
+            logger.error(f"API请求评论失败: {e}")
+            return api_comments
         
-        for page in range(0, max_pages):
-            try:
-                # 随机延迟避免请求过快
-                await asyncio.sleep(random.uniform(1, 3))
-                
-                # 构建不同的API URL尝试几种变体
-                api_urls = [
-                    f"https://club.jd.com/comment/productPageComments.action?callback=fetchJSON_comment98&productId={sku_id}&score=0&sortType=5&page={page}&pageSize=10&isShadowSku=0&fold=1",
-                    f"https://club.jd.com/comment/skuProductPageComments.action?callback=fetchJSON_comment98&productId={sku_id}&score=0&sortType=5&page={page}&pageSize=10&isShadowSku=0&fold=1"
-                ]
-                
-                success = False
-                for api_url in api_urls:
-                    try:
-                        response = session.get(api_url, timeout=20)
-                        if response.status_code == 200:
-                            # 处理JSONP响应
-                            text = response.text
-                            json_str = re.search(r'fetchJSON_comment\d*\((.*)\);', text)
-                            if json_str:
-                                data = json.loads(json_str.group(1))
-                                
-                                if 'comments' in data and data['comments']:
-                                    comments = data['comments']
-                                    logger.info(f"API成功获取第 {page+1} 页共 {len(comments)} 条评论")
-                                    
-                                    for comment in comments:
-                                        if comment.get('content'):  # 只添加有内容的评论
-                                            comment_data = {
-                                                'content': comment.get('content', ''),
-                                                'creationTime': comment.get('creationTime', ''),
-                                                'nickname': comment.get('nickname', ''),
-                                                'score': comment.get('score', 0),
-                                                'userLevelName': comment.get('userLevelName', ''),
-                                                'productColor': comment.get('productColor', ''),
-                                                'productSize': comment.get('productSize', ''),
-                                                'images': comment.get('images', [])
-                                            }
-                                            # 避免重复添加
-                                            content_exists = any(c['content'] == comment_data['content'] and 
-                                                               c['nickname'] == comment_data['nickname'] 
-                                                               for c in api_comments)
-                                            if not content_exists:
-                                                api_comments.append(comment_data)
-                                    
-                                    success = True
-                                    break
-                                else:
-                                    logger.warning(f"API页面 {page+1} 未返回有效评论数据")
-                            else:
-                                logger.warning("API响应格式不是预期的JSONP格式")
-                        else:
-                            logger.warning(f"API请求返回状态码 {response.status_code}")
-                            
-                    except Exception as e:
-                        logger.error(f"API请求 {api_url} 失败: {e}")
-                
-                if not success:
-                    logger.warning(f"第 {page+1} 页所有API尝试均失败")
-                    
-                # 如果连续两页没有新评论，退出循环
-                if page >= 1 and not api_comments:
-                    logger.info("连续多页无评论，结束API获取")
-                    break
-                    
-            except Exception as e:
-                logger.error(f"处理第 {page+1} 页API数据时出错: {e}")
+        for comment in comments:
+            comment_data = normalize_comment(comment)
+            # 只添加有内容的评论，并避免重复添加
+            if comment_data and api_deduper.add(comment_data):
+                api_comments.append(comment_data)
         
+        logger.info(f"API共获取 {len(api_comments)} 条评论")
         return api_comments
                 
     async def load_comments(self, product_url, max_pages=3):
@@ -642,10 +563,7 @@ class JDCommentScraper:
                 logger.info(f"API请求成功获取 {len(api_comments)} 条评论")
                 # 合并结果，避免重复
                 for comment in api_comments:
-                    content_exists = any(c['content'] == comment['content'] and 
-                                        c['nickname'] == comment['nickname'] 
-                                        for c in self.captured_comments)
-                    if not content_exists:
+                    if self.deduper.add(comment):
                         self.captured_comments.append(comment)
         
         logger.info(f"总共获取到 {len(self.captured_comments)} 条评论")
@@ -653,15 +571,17 @@ class JDCommentScraper:
     
     async def close(self):
         """关闭浏览器"""
+        logger.info(f"资源拦截统计: {self.resource_router.summary()}")
         if self.context:
             await self.context.close()
         if self.browser:
             await self.browser.close()
         logger.info("浏览器已关闭")
     
-    def save_comments(self, product_id):
-        """保存评论数据到 JSON 和 Excel 文件"""
-        if not self.captured_comments:
+    def save_comments(self, product_id, comments=None):
+        """保存评论数据到 JSON 和 Excel 文件，comments 默认为 self.captured_comments"""
+        comments = self.captured_comments if comments is None else comments
+        if not comments:
             logger.warning("没有评论数据可保存")
             return None, None # Return two Nones
 
@@ -671,8 +591,13 @@ class JDCommentScraper:
         # Save to JSON
         json_filename = f"{base_filename}.json"
         try:
+            # 逐条流式写出，溢出到磁盘的评论不需要全部读回内存
             with open(json_filename, 'w', encoding='utf-8') as f:
-                json.dump(self.captured_comments, f, ensure_ascii=False, indent=4)
+                f.write('[')
+                for index, comment in enumerate(comments):
+                    f.write(',\n' if index else '\n')
+                    f.write(json.dumps(as_dict(comment), ensure_ascii=False, indent=4))
+                f.write('\n]')
             logger.info(f"评论数据已保存到 {json_filename}")
         except Exception as e:
             logger.error(f"保存JSON文件失败: {e}")
@@ -681,11 +606,11 @@ class JDCommentScraper:
         # Save to Excel
         excel_filename = f"{base_filename}.xlsx"
         try:
-            if not self.captured_comments: # 再次检查，以防JSON保存成功但列表为空
+            if not comments: # 再次检查，以防JSON保存成功但列表为空
                 logger.info("没有评论可用于Excel导出。")
                 excel_filename = None
             else:
-                df = pd.DataFrame(self.captured_comments)
+                df = pd.DataFrame([as_dict(comment) for comment in comments])
                 # 定义期望的列顺序，并筛选出实际存在的列
                 cols_order = ['nickname', 'creationTime', 'score', 'content', 'userLevelName', 'productColor', 'productSize', 'images']
                 df_cols = [col for col in cols_order if col in df.columns]
@@ -701,16 +626,89 @@ class JDCommentScraper:
 
         return json_filename, excel_filename
 
+def read_urls_file(path):
+    """读取商品链接文件，每行一个链接，忽略空行和 # 开头的注释，按商品ID去重"""
+    products = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            url = line.strip()
+            if not url or url.startswith('#'):
+                continue
+            id_match = re.search(r'/(\d+)\.html', url)
+            if not id_match:
+                logger.warning(f"无法从URL中提取商品ID，跳过: {url}")
+                continue
+            products.setdefault(id_match.group(1), url)
+    return products
+
+async def crawl_urls_file(scraper, urls_file, pages=3, concurrency=4):
+    """批量爬取链接文件中的商品
+
+    所有商品共用同一个浏览器上下文的请求客户端和按主机限速器，
+    最多 concurrency 个商品同时请求评论接口，每个商品的结果单独保存。
+    """
+    products = read_urls_file(urls_file)
+    total = len(products)
+    logger.info(f"从 {urls_file} 读取到 {total} 个商品，并发数: {concurrency}")
+    semaphore = asyncio.Semaphore(concurrency)
+    summary = {'total': total, 'done': 0, 'succeeded': 0, 'failed': [], 'comments': 0}
+    start_time = time.time()
+
+    async def crawl_one(product_id):
+        async with semaphore:
+            try:
+                comments = await scraper.fetch_comments_via_api(product_id, pages)
+                if comments:
+                    scraper.save_comments(product_id, comments)
+                    summary['succeeded'] += 1
+                    summary['comments'] += len(comments)
+                else:
+                    summary['failed'].append(product_id)
+            except Exception as e:
+                logger.error(f"商品 {product_id} 爬取失败: {e}")
+                summary['failed'].append(product_id)
+            summary['done'] += 1
+            logger.info(f"批量进度: {summary['done']}/{total}，累计 {summary['comments']} 条评论")
+
+    await asyncio.gather(*[crawl_one(product_id) for product_id in products])
+    summary['elapsed'] = round(time.time() - start_time, 2)
+    return summary
+
 async def main():
     parser = argparse.ArgumentParser(description="京东商品评论爬虫 (优化版 - Playwright)")
-    parser.add_argument("-u", "--url", required=True, help="京东商品页面URL")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("-u", "--url", help="京东商品页面URL")
+    source.add_argument("--urls-file", help="批量模式：商品链接文件，每行一个URL，仅使用API获取评论")
     parser.add_argument("-p", "--pages", type=int, default=3, help="要爬取的评论页数")
+    parser.add_argument("--concurrency", type=int, default=4, help="批量模式下同时爬取的商品数")
     parser.add_argument("--headless", action="store_true", help="启用无头模式")
     parser.add_argument("--timeout", type=int, default=90000, help="页面加载超时时间(毫秒)")
     parser.add_argument("--api-only", action="store_true", help="仅使用API获取评论，不进行页面交互")
     parser.add_argument("--test-mode", action="store_true", help="启用测试模式")
     args = parser.parse_args()
     
+    if args.urls_file:
+        try:
+            scraper = await JDCommentScraper(
+                headless=args.headless,
+                timeout=args.timeout,
+                test_mode=args.test_mode
+            ).setup()
+            summary = await crawl_urls_file(scraper, args.urls_file, args.pages, args.concurrency)
+            print("\n" + "="*60)
+            print(f"批量爬取完成: 共 {summary['total']} 个商品，成功 {summary['succeeded']} 个，"
+                  f"失败 {len(summary['failed'])} 个，共 {summary['comments']} 条评论，耗时 {summary['elapsed']} 秒")
+            if summary['failed']:
+                print(f"失败的商品: {', '.join(summary['failed'])}")
+            print("="*60)
+        except Exception as e:
+            logger.error(f"批量爬取过程中发生错误: {e}", exc_info=True)
+            print(f"\n批量爬取过程中出现错误: {e}")
+        finally:
+            if 'scraper' in locals():
+                await scraper.close()
+        return
+    
     if not args.url or not "jd.com" in args.url:
         print("请提供有效的京东商品URL，例如 https://item.jd.com/100016034372.html")
         return
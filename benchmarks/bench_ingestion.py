@@ -0,0 +1,302 @@
+"""评论入库流水线的离线基准测试
+
+不访问京东：先按京东评论接口格式生成（或使用已录制的）夹具，由本地回放服务器响应，
+分别测量以下三个阶段在 1千/1万/10万 条评论下的吞吐量、p50/p99 延迟和内存峰值：
+
+  intercept  JDCommentScraper.intercept_comments（拉取响应、解析、去重）
+  db_write   CommentWriter 入队到批量写出（save_comment_to_db 的实现，含情感打分）
+  emit       CommentEmitter 按房间批量推送（序列化后交给 Socket.IO）
+
+另外对比同样规模的评论以 CommentRecord 和原来的字典形式常驻内存时的占用。
+
+默认 db_write 写入一个只计数的空连接池，只衡量缓冲和批处理本身；
+加 --mysql 时使用 jd_service.db_config 写入真实数据库。
+默认模式不需要安装 Playwright 和 MySQL 驱动，两者都在真正启动浏览器、连接数据库时才导入。
+
+用法:
+    python benchmarks/bench_ingestion.py
+    python benchmarks/bench_ingestion.py --sizes 1000 10000
+    python benchmarks/bench_ingestion.py --fixtures jd_user_data/fixtures
+"""
+import argparse
+import asyncio
+import gc
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from comment_emitter import CommentEmitter  # noqa: E402
+from db_writer import CommentWriter  # noqa: E402
+from jd import JDCommentScraper  # noqa: E402
+from replay import ReplayServer, generate_fixtures  # noqa: E402
+from comment_record import CommentRecord, as_dict  # noqa: E402
+from sentiment import SentimentScorer  # noqa: E402
+
+BENCH_PRODUCT_ID = '100000000001'
+
+
+class _BenchRoute:
+    async def fulfill(self, **kwargs):
+        pass
+
+
+class _BenchRequest:
+    def __init__(self, url):
+        self.url = url
+        self.headers = {}
+
+
+class _NullCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.rowcount = 0
+
+    def execute(self, sql, params=()):
+        pass
+
+    def fetchall(self):
+        return []
+
+    def executemany(self, sql, rows):
+        self.rowcount = len(rows)
+        self.connection.rows += len(rows)
+
+    def close(self):
+        pass
+
+
+class _NullConnection:
+    rows = 0
+
+    def cursor(self):
+        return _NullCursor(self)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class _NullPool:
+    """只计数不写库的连接池，用于隔离测量写入器本身的开销"""
+
+    def __init__(self):
+        self.connection = _NullConnection()
+
+    def get_connection(self):
+        return self.connection
+
+
+class _CountingSocketIO:
+    """把推送的数据序列化后丢弃，近似 Socket.IO 的编码开销"""
+
+    def __init__(self):
+        self.frames = 0
+        self.bytes = 0
+
+    def emit(self, event, data, to=None):
+        self.frames += 1
+        self.bytes += len(json.dumps(data, ensure_ascii=False))
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def report(stage, size, count, elapsed, latencies, peak, unit):
+    return {
+        'stage': stage,
+        'size': size,
+        'comments': count,
+        'elapsed_s': round(elapsed, 3),
+        'comments_per_s': round(count / elapsed, 1) if elapsed else 0.0,
+        'latency_unit': unit,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'peak_mem_mb': round(peak / 1024 / 1024, 2)
+    }
+
+
+def measure(func):
+    """运行 func 并返回 (结果, 耗时, 内存峰值)"""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = func()
+    finally:
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def bench_intercept(server, urls, size, work_dir):
+    scraper = JDCommentScraper(headless=True, user_data_dir=str(work_dir / 'profile'), block_resources=False)
+    scraper.replay_server = server
+    route = _BenchRoute()
+    latencies = []
+
+    async def run():
+        for url in urls:
+            start = time.perf_counter()
+            await scraper.intercept_comments(route, _BenchRequest(url))
+            latencies.append(time.perf_counter() - start)
+
+    _, elapsed, peak = measure(lambda: asyncio.run(run()))
+    count = len(scraper.captured_comments)
+    return report('intercept', size, count, elapsed, latencies, peak, 'page'), scraper.captured_comments
+
+
+def bench_db_write(comments, size, use_mysql):
+    if use_mysql:
+        from jd_service import db_config
+        writer = CommentWriter(db_config, scorer=SentimentScorer())
+    else:
+        writer = CommentWriter({}, scorer=SentimentScorer())
+        writer._pool = _NullPool()
+    rows = [dict(comment, product_id=BENCH_PRODUCT_ID, product_name='基准测试商品') for comment in comments]
+    latencies = []
+
+    def run():
+        writer.start()
+        for row in rows:
+            start = time.perf_counter()
+            writer.enqueue(row)
+            latencies.append(time.perf_counter() - start)
+        writer.flush(timeout=600)
+
+    _, elapsed, peak = measure(run)
+    writer.stop()
+    result = report('db_write', size, writer.rows_processed, elapsed, latencies, peak, 'comment')
+    result['flushes'] = writer.flush_count
+    return result
+
+
+def bench_emit(comments, size):
+    sink = _CountingSocketIO()
+    emitter = CommentEmitter(sink, batch_size=20, flush_interval=0.5)
+    latencies = []
+
+    def run():
+        for comment in comments:
+            start = time.perf_counter()
+            emitter.add(BENCH_PRODUCT_ID, comment)
+            latencies.append(time.perf_counter() - start)
+        emitter.flush()
+
+    _, elapsed, peak = measure(run)
+    emitter.stop()
+    result = report('emit', size, emitter.comments_sent, elapsed, latencies, peak, 'comment')
+    result['frames'] = sink.frames
+    return result
+
+
+def retained_memory(build):
+    """build() 返回的对象常驻内存的字节数"""
+    gc.collect()
+    tracemalloc.start()
+    kept = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return current
+
+
+def bench_record_memory(comments, size):
+    """对比 CommentRecord 与字典两种形式保存全部评论时的内存占用"""
+    dicts = [dict(as_dict(comment), product_id=BENCH_PRODUCT_ID, product_name='基准测试商品') for comment in comments]
+    record_bytes = retained_memory(lambda: [CommentRecord.from_dict(d) for d in dicts])
+    dict_bytes = retained_memory(lambda: [dict(d) for d in dicts])
+    count = len(dicts) or 1
+    return {
+        'size': size,
+        'comments': len(dicts),
+        'record_mb': round(record_bytes / 1024 / 1024, 2),
+        'dict_mb': round(dict_bytes / 1024 / 1024, 2),
+        'record_bytes_per_comment': round(record_bytes / count),
+        'dict_bytes_per_comment': round(dict_bytes / count)
+    }
+
+
+def run_size(size, fixture_dir, use_mysql, work_dir, latency):
+    if fixture_dir:
+        server = ReplayServer(fixture_dir, latency=latency)
+        urls = server.store.urls()
+    else:
+        generated_dir = work_dir / f'fixtures_{size}'
+        urls = generate_fixtures(generated_dir, BENCH_PRODUCT_ID, size)
+        server = ReplayServer(generated_dir, latency=latency)
+
+    with server:
+        intercept_result, comments = bench_intercept(server, urls, size, work_dir)
+    try:
+        if fixture_dir:
+            # 录制的夹具按实际评论条数计规模
+            size = intercept_result['size'] = len(comments)
+        return [
+            intercept_result,
+            bench_db_write(comments, size, use_mysql),
+            bench_emit(comments, size)
+        ], bench_record_memory(comments, size)
+    finally:
+        # 删除评论缓冲区的溢出文件
+        comments.close()
+
+
+def print_memory_table(memory_results):
+    print()
+    print(f"{'规模':>8}{'评论数':>9}{'CommentRecord(MB)':>20}{'dict(MB)':>12}{'字节/条(record)':>18}{'字节/条(dict)':>16}")
+    print('-' * 90)
+    for r in memory_results:
+        print(f"{r['size']:>8}{r['comments']:>9}{r['record_mb']:>20}{r['dict_mb']:>12}"
+              f"{r['record_bytes_per_comment']:>18}{r['dict_bytes_per_comment']:>16}")
+
+
+def print_table(results):
+    header = f"{'阶段':<10}{'规模':>8}{'评论数':>9}{'条/秒':>12}{'延迟单位':>10}{'p50(ms)':>10}{'p99(ms)':>10}{'内存峰值(MB)':>14}"
+    print(header)
+    print('-' * 96)
+    for r in results:
+        print(f"{r['stage']:<10}{r['size']:>8}{r['comments']:>9}{r['comments_per_s']:>12}"
+              f"{r['latency_unit']:>10}{r['p50_ms']:>10}{r['p99_ms']:>10}{r['peak_mem_mb']:>14}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='评论入库流水线离线基准测试')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help='评论条数规模')
+    parser.add_argument('--fixtures', help='使用已录制的夹具目录，不指定时按规模生成合成夹具')
+    parser.add_argument('--mysql', action='store_true', help='写入 jd_service.db_config 指定的真实数据库')
+    parser.add_argument('--latency', type=float, default=0.0, help='回放服务器每个响应附加的延迟（秒）')
+    parser.add_argument('--json', help='把结果另存为JSON文件')
+    args = parser.parse_args()
+
+    results = []
+    memory_results = []
+    with tempfile.TemporaryDirectory(prefix='jd_bench_') as tmp:
+        work_dir = Path(tmp)
+        sizes = [0] if args.fixtures else args.sizes
+        for size in sizes:
+            stage_results, memory_result = run_size(size, args.fixtures, args.mysql, work_dir, args.latency)
+            results.extend(stage_results)
+            memory_results.append(memory_result)
+
+    print_table(results)
+    print_memory_table(memory_results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'stages': results, 'memory': memory_results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
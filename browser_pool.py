@@ -0,0 +1,259 @@
+import asyncio
+import logging
+import time
+import traceback
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from playwright.async_api import async_playwright
+
+logger = logging.getLogger(__name__)
+
+# 浏览器启动参数（与原 WebSocketJDScraper.setup 保持一致）
+BROWSER_ARGS = [
+    '--no-sandbox',
+    '--no-zygote',
+    '--single-process',
+    '--disable-gpu',
+    '--disable-dev-shm-usage',
+    '--disable-setuid-sandbox',
+    '--disable-accelerated-2d-canvas',
+    '--disable-breakpad',
+    '--window-size=1920,1080',
+    '--start-maximized'
+]
+
+USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36'
+
+# 默认的额外HTTP头，模拟正常浏览器请求
+EXTRA_HTTP_HEADERS = {
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
+    'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+    'Cache-Control': 'max-age=0',
+    'Connection': 'keep-alive',
+    'Sec-Ch-Ua': '"Chromium";v="122", "Not(A:Brand";v="24", "Google Chrome";v="122"',
+    'Sec-Ch-Ua-Mobile': '?0',
+    'Sec-Ch-Ua-Platform': '"macOS"',
+    'Sec-Fetch-Dest': 'document',
+    'Sec-Fetch-Mode': 'navigate',
+    'Sec-Fetch-Site': 'none',
+    'Sec-Fetch-User': '?1',
+    'Upgrade-Insecure-Requests': '1'
+}
+
+STEALTH_SCRIPT = """
+    Object.defineProperty(navigator, 'webdriver', { get: () => false });
+    Object.defineProperty(navigator, 'platform', { get: () => 'MacIntel' });
+    Object.defineProperty(navigator, 'plugins', { get: () => [1, 2, 3, 4, 5] });
+    Object.defineProperty(navigator, 'languages', { get: () => ['zh-CN', 'zh', 'en'] });
+    Object.defineProperty(navigator, 'cookieEnabled', { get: () => true });
+"""
+
+
+async def launch_context(playwright, user_data_dir, headless=True, timeout=90000):
+    """启动一个持久化浏览器上下文并完成反检测设置"""
+    context = await playwright.chromium.launch_persistent_context(
+        user_data_dir=str(user_data_dir),
+        headless=headless,
+        args=BROWSER_ARGS,
+        viewport={"width": 1920, "height": 1080},
+        user_agent=USER_AGENT,
+        timeout=timeout,
+        ignore_https_errors=True
+    )
+    try:
+        await context.set_extra_http_headers(EXTRA_HTTP_HEADERS)
+        await context.add_init_script(STEALTH_SCRIPT)
+    except Exception:
+        await context.close()
+        raise
+    return context
+
+
+class BrowserPoolExhausted(Exception):
+    """在等待时间内没有可用的浏览器上下文"""
+
+
+class PooledContext:
+    """浏览器池中的一个槽位"""
+
+    def __init__(self, slot, context, user_data_dir):
+        self.slot = slot
+        self.context = context
+        self.user_data_dir = user_data_dir
+        self.uses = 0
+        self.created_at = time.time()
+
+
+class BrowserPool:
+    """常驻的浏览器上下文池
+
+    服务启动时预热 size 个持久化上下文，由 run_crawler 借出使用。
+    借出前做健康检查，使用 max_uses 次后回收重建，池耗尽时 acquire 阻塞等待，
+    超过 acquire_timeout 秒抛出 BrowserPoolExhausted 形成背压。
+    池中所有 Playwright 对象都绑定在调用 start() 的事件循环上。
+    on_launch(context) 在每个上下文启动后调用（如恢复登录状态），
+    on_release(context) 在上下文归还时调用（如保存登录状态），二者都是协程函数。
+    """
+
+    def __init__(self, size=2, base_dir="jd_user_data", headless=True, timeout=90000,
+                 max_uses=20, acquire_timeout=60, on_launch=None, on_release=None):
+        self.size = size
+        self.base_dir = Path(base_dir).absolute()
+        self.headless = headless
+        self.timeout = timeout
+        self.max_uses = max_uses
+        self.acquire_timeout = acquire_timeout
+        self.on_launch = on_launch
+        self.on_release = on_release
+
+        self._playwright = None
+        self._slots = {}
+        self._idle = None
+        self.started = False
+
+        # 统计信息
+        self.total_acquired = 0
+        self.total_recycled = 0
+        self.total_wait_time = 0.0
+
+    async def start(self):
+        """启动Playwright驱动并预热所有槽位"""
+        if self.started:
+            return self
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+        self._playwright = await async_playwright().start()
+        self._idle = asyncio.Queue()
+        for slot in range(self.size):
+            self._slots[slot] = None
+            try:
+                self._slots[slot] = await self._launch(slot)
+            except Exception as e:
+                # 预热失败的槽位在首次借出时再尝试启动
+                logger.error(f"浏览器池槽位 {slot} 预热失败: {e}")
+            self._idle.put_nowait(slot)
+        self.started = True
+        logger.info(f"浏览器池已启动，槽位数: {self.size}")
+        return self
+
+    async def _launch(self, slot):
+        user_data_dir = self.base_dir / f"pool_{slot}"
+        user_data_dir.mkdir(parents=True, exist_ok=True)
+        start_time = time.time()
+        context = await launch_context(self._playwright, user_data_dir,
+                                       headless=self.headless, timeout=self.timeout)
+        if self.on_launch:
+            try:
+                await self.on_launch(context)
+            except Exception as e:
+                logger.warning(f"浏览器池槽位 {slot} 启动回调失败 (忽略): {e}")
+        logger.info(f"浏览器池槽位 {slot} 启动完成，耗时 {time.time() - start_time:.2f} 秒")
+        return PooledContext(slot, context, user_data_dir)
+
+    async def _is_healthy(self, pooled):
+        """通过新建并关闭一个页面确认上下文仍然可用"""
+        try:
+            page = await pooled.context.new_page()
+            await page.close()
+            return True
+        except Exception as e:
+            logger.warning(f"浏览器池槽位 {pooled.slot} 健康检查失败: {e}")
+            return False
+
+    async def _discard(self, pooled):
+        try:
+            await pooled.context.close()
+        except Exception as e:
+            logger.warning(f"关闭浏览器池槽位 {pooled.slot} 时出错 (忽略): {e}")
+
+    async def acquire(self, timeout=None):
+        """借出一个健康的浏览器上下文，池耗尽时等待"""
+        if not self.started:
+            raise RuntimeError("浏览器池尚未启动")
+
+        wait_timeout = self.acquire_timeout if timeout is None else timeout
+        wait_start = time.time()
+        try:
+            slot = await asyncio.wait_for(self._idle.get(), timeout=wait_timeout)
+        except asyncio.TimeoutError:
+            raise BrowserPoolExhausted(f"浏览器池已耗尽，等待 {wait_timeout} 秒后仍无空闲槽位")
+        self.total_wait_time += time.time() - wait_start
+
+        try:
+            pooled = self._slots.get(slot)
+            if pooled and not await self._is_healthy(pooled):
+                await self._discard(pooled)
+                self.total_recycled += 1
+                pooled = None
+            if pooled is None:
+                pooled = await self._launch(slot)
+                self._slots[slot] = pooled
+        except Exception:
+            # 启动失败时归还槽位，避免池容量永久缩小
+            self._slots[slot] = None
+            self._idle.put_nowait(slot)
+            raise
+
+        self.total_acquired += 1
+        return pooled
+
+    async def release(self, pooled, broken=False):
+        """归还上下文，关闭遗留页面，达到使用上限或已损坏时回收"""
+        pooled.uses += 1
+        if not broken and self.on_release:
+            try:
+                await self.on_release(pooled.context)
+            except Exception as e:
+                logger.warning(f"浏览器池槽位 {pooled.slot} 归还回调失败 (忽略): {e}")
+        if not broken:
+            for page in list(pooled.context.pages):
+                try:
+                    await page.close()
+                except Exception:
+                    broken = True
+
+        if broken or pooled.uses >= self.max_uses:
+            logger.info(f"回收浏览器池槽位 {pooled.slot}，已使用 {pooled.uses} 次")
+            await self._discard(pooled)
+            self._slots[pooled.slot] = None
+            self.total_recycled += 1
+
+        self._idle.put_nowait(pooled.slot)
+
+    @asynccontextmanager
+    async def lease(self, timeout=None):
+        """以上下文管理器方式借出浏览器上下文"""
+        pooled = await self.acquire(timeout)
+        try:
+            yield pooled
+        finally:
+            await self.release(pooled)
+
+    def stats(self):
+        """返回池占用情况"""
+        idle = self._idle.qsize() if self._idle else 0
+        return {
+            'size': self.size,
+            'idle': idle,
+            'in_use': self.size - idle if self.started else 0,
+            'warm': sum(1 for pooled in self._slots.values() if pooled),
+            'acquired': self.total_acquired,
+            'recycled': self.total_recycled,
+            'wait_time': round(self.total_wait_time, 3)
+        }
+
+    async def close(self):
+        """关闭所有上下文并停止Playwright驱动进程"""
+        for slot, pooled in list(self._slots.items()):
+            if pooled:
+                await self._discard(pooled)
+            self._slots[slot] = None
+        if self._playwright:
+            try:
+                await self._playwright.stop()
+            except Exception as e:
+                logger.error(f"停止Playwright驱动时出错: {e}")
+                logger.error(traceback.format_exc())
+            self._playwright = None
+        self.started = False
+        logger.info("浏览器池已关闭")
@@ -0,0 +1,341 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
+
+import metrics
+from comment_parser import parse_comment_body
+from endpoint_health import (default_endpoint_health, classify_status,
+                             OUTCOME_OK, OUTCOME_EMPTY, OUTCOME_ERROR)
+from replay import fetch_url
+
+logger = logging.getLogger(__name__)
+
+# 评论接口模板，按尝试顺序排列
+COMMENT_API_ENDPOINTS = {
+    'productPageComments': "https://club.jd.com/comment/productPageComments.action?callback=fetchJSON_comment98&productId={product_id}&score={score}&sortType={sort_type}&page={page}&pageSize={page_size}&isShadowSku=0&fold=1",
+    'skuProductPageComments': "https://club.jd.com/comment/skuProductPageComments.action?callback=fetchJSON_comment98&productId={product_id}&score={score}&sortType={sort_type}&page={page}&pageSize={page_size}&isShadowSku=0&fold=1"
+}
+
+# 评分筛选: 0全部 1差评 2中评 3好评 4晒图 5追评
+COMMENT_SCORES = (0, 1, 2, 3, 4, 5)
+
+# productCommentSummary 中各评分筛选对应的计数字段，计数为0的筛选直接跳过
+SCORE_SUMMARY_FIELDS = {
+    0: 'commentCount',
+    1: 'poorCount',
+    2: 'generalCount',
+    3: 'goodCount',
+    5: 'afterCount'
+}
+
+# 评论接口请求头，覆盖浏览器上下文中面向页面导航的默认头
+API_HEADERS = {
+    'Accept': '*/*',
+    'Sec-Fetch-Dest': 'script',
+    'Sec-Fetch-Mode': 'no-cors',
+    'Sec-Fetch-Site': 'same-site'
+}
+
+
+class _HostState:
+    def __init__(self, max_concurrency):
+        self.lock = asyncio.Lock()
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.next_time = 0.0
+
+
+class HostRateLimiter:
+    """按主机限速：同一主机的请求间隔不小于 min_interval 秒，并发不超过 max_concurrency"""
+
+    def __init__(self, min_interval=0.3, max_concurrency=4):
+        self.min_interval = min_interval
+        self.max_concurrency = max_concurrency
+        self._hosts = {}
+
+    def _state(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _HostState(self.max_concurrency)
+        return state
+
+    @asynccontextmanager
+    async def limit(self, url):
+        state = self._state(urlparse(url).hostname)
+        async with state.semaphore:
+            async with state.lock:
+                now = time.monotonic()
+                wait = state.next_time - now
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                state.next_time = max(now, state.next_time) + self.min_interval
+            yield
+
+
+# 进程内共享的限速器，所有并发爬取任务共用同一份主机配额
+default_rate_limiter = HostRateLimiter()
+
+
+class CommentApiClient:
+    """评论接口的异步HTTP客户端
+
+    基于 Playwright 的 APIRequestContext（通常是 context.request），
+    复用浏览器上下文的Cookie和长连接，多页评论在限速器约束下并发请求。
+    每个接口的熔断器和自适应令牌桶由 endpoint_health 提供，在所有爬取任务间共享，
+    已熔断的接口直接跳过，所有接口都熔断时请求立即失败而不再重试。
+    endpoint_order 指定接口的尝试顺序，每次尝试后调用 on_endpoint_result(接口名, 是否成功, 耗时)。
+    与浏览器拦截路径一致，设置了 replay_server 时请求改发到本地回放服务器，
+    设置了 recorder 时把成功的响应保存为夹具。
+    """
+
+    def __init__(self, request_context, rate_limiter=None, timeout=20000, page_size=10,
+                 endpoint_health=None, endpoint_order=None, on_endpoint_result=None,
+                 replay_server=None, recorder=None):
+        self.request_context = request_context
+        self.rate_limiter = rate_limiter or default_rate_limiter
+        self.endpoint_health = endpoint_health or default_endpoint_health
+        self.timeout = timeout
+        self.page_size = page_size
+        self.endpoint_order = endpoint_order or list(COMMENT_API_ENDPOINTS)
+        self.on_endpoint_result = on_endpoint_result
+        self.replay_server = replay_server
+        self.recorder = recorder
+
+        # 统计信息
+        self.requests_sent = 0
+        self.requests_failed = 0
+        self.requests_skipped = 0
+
+    def build_url(self, endpoint, product_id, page, score=0, sort_type=5):
+        return COMMENT_API_ENDPOINTS[endpoint].format(
+            product_id=product_id, score=score, sort_type=sort_type,
+            page=page, page_size=self.page_size
+        )
+
+    async def _get(self, url, headers):
+        """发出请求，返回 (状态码, 响应体)，状态码不是2xx时响应体为空"""
+        if self.replay_server:
+            return await asyncio.get_running_loop().run_in_executor(
+                None, fetch_url, self.replay_server.url_for(url), self.timeout / 1000)
+        response = await self.request_context.get(url, headers=headers, timeout=self.timeout)
+        if not response.ok:
+            return response.status, ''
+        body = await response.text()
+        if self.recorder:
+            self.recorder.record(url, response.status, body)
+        return response.status, body
+
+    async def fetch_json(self, url, product_id, health=None):
+        """请求单个接口URL，返回解析后的JSON，失败返回 None
+
+        传入 health 时把请求结果记录到该接口的熔断器。
+        """
+        headers = dict(API_HEADERS, Referer=f'https://item.jd.com/{product_id}.html')
+        async with self.rate_limiter.limit(url):
+            self.requests_sent += 1
+            # 只统计请求本身的耗时，不含限速等待
+            start_time = time.monotonic()
+            try:
+                status, body = await self._get(url, headers)
+                if not 200 <= status < 300:
+                    logger.warning(f"评论接口返回状态码 {status}: {url}")
+                    self.requests_failed += 1
+                    if health:
+                        health.record(classify_status(status), time.monotonic() - start_time)
+                    return None
+                metrics.api_response_seconds.observe(time.monotonic() - start_time, endpoint=health.name if health else 'unknown')
+            except Exception as e:
+                logger.warning(f"评论接口请求失败: {url}, {e}")
+                self.requests_failed += 1
+                if health:
+                    health.record(OUTCOME_ERROR, time.monotonic() - start_time)
+                return None
+
+        parse_start = time.perf_counter()
+        data = parse_comment_body(body)
+        metrics.parse_seconds.observe(time.perf_counter() - parse_start, source='api')
+        valid = isinstance(data, dict) and isinstance(data.get('comments'), list)
+        if data is None:
+            logger.warning(f"评论接口响应无法解析: {url}")
+            self.requests_failed += 1
+        if health:
+            health.record(OUTCOME_OK if valid else OUTCOME_EMPTY, time.monotonic() - start_time)
+        return data
+
+    async def fetch_page(self, product_id, page, score=0, sort_type=5):
+        """按顺序尝试熔断器放行的评论接口，返回第一个有效的响应数据"""
+        for endpoint in self.endpoint_order:
+            health = self.endpoint_health.get(endpoint)
+            if not health.allow():
+                self.requests_skipped += 1
+                continue
+            await health.acquire()
+            url = self.build_url(endpoint, product_id, page, score, sort_type)
+            start_time = time.monotonic()
+            data = await self.fetch_json(url, product_id, health)
+            valid = isinstance(data, dict) and isinstance(data.get('comments'), list)
+            if self.on_endpoint_result:
+                self.on_endpoint_result(endpoint, valid, time.monotonic() - start_time)
+            if valid:
+                return data
+        return None
+
+    async def fetch_comments(self, product_id, max_pages=3, score=0, sort_type=5):
+        """并发请求第 0..max_pages-1 页，按页序返回原始评论列表"""
+        start_time = time.time()
+        results = await asyncio.gather(*[
+            self.fetch_page(product_id, page, score, sort_type) for page in range(max_pages)
+        ])
+        comments = []
+        for data in results:
+            if data:
+                comments.extend(data['comments'])
+        logger.info(f"评论接口并发获取 {max_pages} 页，共 {len(comments)} 条评论，耗时 {time.time() - start_time:.2f} 秒")
+        return comments
+
+    async def fetch_since(self, product_id, since, max_pages=100, on_page=None, since_id=None):
+        """按时间倒序(sortType=6)逐页请求，返回 (水位线之后的评论, 是否已衔接上水位线)
+
+        水位线为 since（creationTime）和 since_id（评论ID）。时间早于 since 或ID等于 since_id
+        的评论已经见过；与 since 同一秒的其他评论可能是水位线之后新发的，同一秒内的先后顺序
+        也不确定，所以仍然返回（重复入库由数据库按内容指纹过滤），直到翻到早于 since 的评论、
+        越过了水位线所在的那一秒才停止。只有 since_id 时翻到该评论即停止。
+        没有水位线、越过水位线或评论已全部翻完时视为已衔接；请求失败或达到 max_pages
+        仍未越过水位线时未衔接，中间还有没取到的评论，调用方不能推进水位线。
+        每页的新评论调用 on_page(page, comments)。
+        """
+        def is_older(comment):
+            created = comment.get('creationTime')
+            return bool(since) and isinstance(created, str) and created < since
+
+        def is_boundary(comment):
+            return since_id is not None and comment.get('id') == since_id
+
+        new_comments = []
+        reached = since is None and since_id is None
+        for page in range(max_pages):
+            data = await self.fetch_page(product_id, page, score=0, sort_type=6)
+            if not data:
+                break
+            if not data['comments']:
+                reached = True
+                break
+            comments = data['comments']
+            passed = any(is_older(c) for c in comments)
+            if not since:
+                # 没有时间水位线时按页内顺序，边界评论之后的都已见过
+                boundary = next((index for index, c in enumerate(comments) if is_boundary(c)), None)
+                if boundary is not None:
+                    comments = comments[:boundary]
+                    passed = True
+            fresh = [c for c in comments if not is_older(c) and not is_boundary(c)]
+            if fresh:
+                new_comments.extend(fresh)
+                if on_page:
+                    on_page(page, fresh)
+            if passed:
+                reached = True
+                break
+        if not reached:
+            logger.warning(f"商品 {product_id} 增量获取 {len(new_comments)} 条评论后仍未衔接上水位线 {since}")
+        logger.info(f"商品 {product_id} 增量获取 {len(new_comments)} 条 {since} 之后的评论")
+        return new_comments, reached
+
+    async def crawl(self, product_id, max_pages=3, scores=COMMENT_SCORES, sort_type=5,
+                    cursors=None, workers=4, on_page=None):
+        """按评分筛选分页爬取评论
+
+        先请求全部评论(score=0)的起始页，根据 productCommentSummary 跳过没有评论的筛选，
+        再由 workers 个协程并发请求其余页面。每个筛选的页数取 maxPage 与 max_pages 的较小值，
+        遇到空页即停止该筛选的后续页面。
+
+        cursors 为 {score: 下一个待请求的页码}，原地更新为连续成功的最远页，
+        传入上次的 cursors 即可从断点续爬。每成功获取一页调用 on_page(score, page, comments)。
+        """
+        cursors = {} if cursors is None else cursors
+        queue = asyncio.Queue()
+        limits = {}
+        stop_at = {}
+        done = {score: set() for score in scores}
+        result = {'pages_fetched': 0, 'pages_failed': 0, 'comments': 0, 'summary': None, 'max_page': {}}
+
+        def advance_cursor(score, page):
+            done[score].add(page)
+            while cursors.get(score, 0) in done[score]:
+                cursors[score] = cursors.get(score, 0) + 1
+
+        def handle_page(score, page, data):
+            if data is None:
+                result['pages_failed'] += 1
+                return
+            comments = data['comments']
+            if not comments:
+                # 空页之后不会再有评论，停止该筛选
+                stop_at[score] = min(stop_at.get(score, page), page)
+                return
+            result['pages_fetched'] += 1
+            result['comments'] += len(comments)
+            advance_cursor(score, page)
+            if on_page:
+                on_page(score, page, comments)
+
+        def schedule_rest(score, first_page, data):
+            # 起始页决定该筛选的总页数
+            if not data:
+                limits[score] = 0
+                return
+            max_page = data.get('maxPage')
+            result['max_page'][score] = max_page
+            # 接口未返回maxPage时按 max_pages 请求，依赖空页提前结束
+            limits[score] = max_pages if max_page is None else min(max_page, max_pages)
+            for page in range(first_page + 1, limits[score]):
+                queue.put_nowait((score, page, False))
+
+        async def worker():
+            while True:
+                score, page, is_first = await queue.get()
+                try:
+                    if page >= stop_at.get(score, page + 1):
+                        continue
+                    data = await self.fetch_page(product_id, page, score, sort_type)
+                    handle_page(score, page, data)
+                    if is_first:
+                        schedule_rest(score, page, data)
+                except Exception as e:
+                    logger.warning(f"评论分页请求出错: 筛选 {score} 第 {page + 1} 页, {e}")
+                    result['pages_failed'] += 1
+                finally:
+                    queue.task_done()
+
+        start_time = time.time()
+        pending_scores = [score for score in scores if cursors.get(score, 0) < max_pages]
+
+        # 先取全部评论的起始页，获取各筛选的评论数
+        if 0 in pending_scores:
+            first_page = cursors.get(0, 0)
+            data = await self.fetch_page(product_id, first_page, 0, sort_type)
+            handle_page(0, first_page, data)
+            if data:
+                result['summary'] = data.get('productCommentSummary')
+            schedule_rest(0, first_page, data)
+            pending_scores.remove(0)
+
+        summary = result['summary'] or {}
+        for score in pending_scores:
+            field = SCORE_SUMMARY_FIELDS.get(score)
+            if summary and field and not summary.get(field):
+                continue
+            queue.put_nowait((score, cursors.get(score, 0), True))
+
+        tasks = [asyncio.ensure_future(worker()) for _ in range(workers)]
+        try:
+            await queue.join()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        logger.info(f"商品 {product_id} 分页爬取完成: 成功 {result['pages_fetched']} 页，失败 {result['pages_failed']} 页，"
+                    f"共 {result['comments']} 条评论，耗时 {time.time() - start_time:.2f} 秒")
+        return result
@@ -0,0 +1,106 @@
+import json
+import logging
+import os
+import tempfile
+from collections import deque
+from pathlib import Path
+
+from comment_record import CommentRecord, as_dict
+
+logger = logging.getLogger(__name__)
+
+
+class CommentBuffer:
+    """内存有界、溢出到磁盘的评论缓冲区，替代无限增长的 captured_comments 列表
+
+    内存中最多保留最近的 capacity 条评论，超出时把较早的一半按JSON行追加写入
+    spill_dir 下的临时文件。len() 返回全部评论条数，迭代时先从文件流式读回已溢出的评论，
+    再产出内存中的部分，任意时刻内存中的评论数都不超过 capacity。
+    数据库写入和Socket.IO推送在评论到达时就已逐条处理，不依赖这里保存的全部评论。
+    """
+
+    def __init__(self, capacity=5000, spill_dir=None):
+        self.capacity = max(1, capacity)
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        self._memory = deque()
+        self._spill_path = None
+        self._spill_file = None
+        self.spilled = 0
+        self.spill_writes = 0
+
+    def append(self, comment):
+        self._memory.append(comment)
+        if len(self._memory) > self.capacity:
+            # 一次溢出一半，摊薄文件写入次数
+            self._spill(len(self._memory) - self.capacity // 2)
+
+    def extend(self, comments):
+        for comment in comments:
+            self.append(comment)
+
+    def _open_spill_file(self):
+        if self.spill_dir:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+        fd, path = tempfile.mkstemp(prefix='comments_', suffix='.jsonl',
+                                    dir=str(self.spill_dir) if self.spill_dir else None)
+        self._spill_path = Path(path)
+        self._spill_file = os.fdopen(fd, 'a', encoding='utf-8')
+
+    def _spill(self, count):
+        if self._spill_file is None:
+            self._open_spill_file()
+        lines = []
+        for _ in range(count):
+            lines.append(json.dumps(as_dict(self._memory.popleft()), ensure_ascii=False))
+        self._spill_file.write('\n'.join(lines) + '\n')
+        self._spill_file.flush()
+        self.spilled += count
+        self.spill_writes += 1
+        if self.spill_writes == 1:
+            logger.info(f"评论缓冲区超过 {self.capacity} 条，开始溢出到 {self._spill_path}")
+
+    @property
+    def has_spilled(self):
+        return self.spilled > 0
+
+    def __len__(self):
+        return self.spilled + len(self._memory)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __iter__(self):
+        """按到达顺序流式产出全部评论"""
+        if self._spill_path is not None:
+            with open(self._spill_path, 'r', encoding='utf-8') as f:
+                for _, line in zip(range(self.spilled), f):
+                    yield CommentRecord.from_dict(json.loads(line))
+        yield from list(self._memory)
+
+    def recent(self, count=None):
+        """内存中最近的评论"""
+        comments = list(self._memory)
+        return comments if count is None else comments[-count:]
+
+    def clear(self):
+        self._memory.clear()
+        self.close()
+
+    def close(self):
+        """删除溢出文件"""
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+        if self._spill_path is not None:
+            self._spill_path.unlink(missing_ok=True)
+            self._spill_path = None
+        self.spilled = 0
+
+    def stats(self):
+        return {
+            'total': len(self),
+            'in_memory': len(self._memory),
+            'spilled': self.spilled,
+            'spill_writes': self.spill_writes,
+            'capacity': self.capacity
+        }
@@ -0,0 +1,153 @@
+import hashlib
+import logging
+import math
+import struct
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+def comment_fingerprint(comment_data):
+    """评论内容+昵称的稳定指纹（SHA1十六进制），跨进程、跨次爬取保持一致"""
+    key = f"{comment_data.get('content', '')}\x00{comment_data.get('nickname', '')}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def fingerprint_keys(keys):
+    """对 content\x00nickname 形式的键批量计算指纹，供 AnalysisPool 在工作进程中调用"""
+    sha1 = hashlib.sha1
+    return [sha1(key.encode('utf-8')).hexdigest() for key in keys]
+
+
+def comment_fingerprints(comments, pool=None):
+    """批量计算评论指纹，结果与逐条调用 comment_fingerprint 相同；大批次可交给 AnalysisPool"""
+    keys = [f"{comment_data.get('content', '')}\x00{comment_data.get('nickname', '')}" for comment_data in comments]
+    if pool is not None:
+        return pool.map(fingerprint_keys, keys)
+    return fingerprint_keys(keys)
+
+
+class BloomFilter:
+    """定长位数组布隆过滤器，基于评论指纹做双重哈希"""
+
+    MAGIC = b'JDBF'
+    HEADER = struct.Struct('<4sIIQ')
+
+    def __init__(self, num_bits, num_hashes, bits=None, count=0):
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.bits = bits if bits is not None else bytearray((num_bits + 7) // 8)
+        self.count = count
+
+    @classmethod
+    def for_capacity(cls, capacity=100000, error_rate=0.01):
+        """按预期元素数量和误判率计算位数组大小和哈希次数"""
+        num_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        num_hashes = max(1, round(num_bits / capacity * math.log(2)))
+        return cls(num_bits, num_hashes)
+
+    def _positions(self, fingerprint):
+        h1 = int(fingerprint[:16], 16)
+        h2 = int(fingerprint[16:32], 16) | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, fingerprint):
+        for pos in self._positions(fingerprint):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, fingerprint):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(fingerprint))
+
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.num_bits, self.num_hashes, self.count))
+            f.write(self.bits)
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            magic, num_bits, num_hashes, count = cls.HEADER.unpack(f.read(cls.HEADER.size))
+            if magic != cls.MAGIC:
+                raise ValueError(f"不是有效的布隆过滤器文件: {path}")
+            bits = bytearray(f.read())
+        if len(bits) != (num_bits + 7) // 8:
+            raise ValueError(f"布隆过滤器文件已损坏: {path}")
+        return cls(num_bits, num_hashes, bits, count)
+
+
+class BloomFilterStore:
+    """按商品ID持久化布隆过滤器，记录已写入数据库的评论"""
+
+    def __init__(self, base_dir="jd_user_data/dedup", capacity=100000, error_rate=0.01):
+        self.base_dir = Path(base_dir)
+        self.capacity = capacity
+        self.error_rate = error_rate
+
+    def _path(self, product_id):
+        return self.base_dir / f"{product_id}.bloom"
+
+    def load(self, product_id):
+        path = self._path(product_id)
+        if path.exists():
+            try:
+                bloom = BloomFilter.load(path)
+                if bloom.count > self.capacity:
+                    logger.warning(f"商品 {product_id} 的布隆过滤器已超过设计容量 ({bloom.count}/{self.capacity})，误判率将升高")
+                return bloom
+            except Exception as e:
+                logger.warning(f"加载商品 {product_id} 的布隆过滤器失败，重新创建: {e}")
+        return BloomFilter.for_capacity(self.capacity, self.error_rate)
+
+    def save(self, product_id, bloom):
+        try:
+            bloom.save(self._path(product_id))
+        except Exception as e:
+            logger.error(f"保存商品 {product_id} 的布隆过滤器失败: {e}")
+
+
+class CommentDeduper:
+    """评论去重索引
+
+    与 captured_comments 并行维护一个指纹集合，add 为 O(1)。
+    可选挂载一个布隆过滤器，记录写入器确认已写入数据库的评论（mark_stored 应在批次写入成功后调用）。
+    布隆过滤器存在少量误判，is_stored 只能用于统计可能重复的评论，不能据此跳过入库，
+    否则误判的新评论会永久丢失；去重以数据库的内容指纹唯一键为准。
+    """
+
+    def __init__(self, bloom=None):
+        self._seen = set()
+        self.bloom = bloom
+        self.duplicates = 0
+
+    def add(self, comment_data):
+        """加入索引，评论在本次爬取中首次出现时返回 True"""
+        fingerprint = comment_fingerprint(comment_data)
+        if fingerprint in self._seen:
+            self.duplicates += 1
+            return False
+        self._seen.add(fingerprint)
+        return True
+
+    def __contains__(self, comment_data):
+        return comment_fingerprint(comment_data) in self._seen
+
+    def __len__(self):
+        return len(self._seen)
+
+    def is_stored(self, comment_data):
+        """根据布隆过滤器判断评论是否可能已入库，可能误判为已入库"""
+        return self.bloom is not None and comment_fingerprint(comment_data) in self.bloom
+
+    def mark_stored(self, comment_data):
+        """记录评论已写入数据库，应在写入成功后调用"""
+        if self.bloom is not None:
+            self.bloom.add(comment_fingerprint(comment_data))
+
+    def clear(self):
+        self._seen.clear()
+        self.duplicates = 0
@@ -0,0 +1,123 @@
+import logging
+import threading
+import time
+
+from comment_record import as_dict
+
+logger = logging.getLogger(__name__)
+
+
+def product_room(product_id):
+    """商品对应的Socket.IO房间名"""
+    return f"product_{product_id}"
+
+
+class CommentEmitter:
+    """按商品房间批量推送评论
+
+    新评论先进入对应商品的缓冲区，缓冲区达到 batch_size 或距首条评论超过
+    flush_interval 秒时，以一帧 new_comments 推送给订阅了该商品的客户端。
+    进度、错误等事件也只发往该商品的房间。
+    """
+
+    def __init__(self, socketio, batch_size=20, flush_interval=0.5):
+        self.socketio = socketio
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._buffers = {}
+        self._first_at = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread = None
+
+        # 推送指标
+        self.frames_sent = 0
+        self.comments_sent = 0
+        self.events_sent = 0
+
+    def start(self):
+        """启动按时间间隔刷新的后台线程"""
+        if self._thread:
+            return self
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name='comment-emitter', daemon=True)
+        self._thread.start()
+        return self
+
+    def add(self, product_id, comment_data):
+        """缓冲一条评论，达到批大小时立即推送"""
+        with self._lock:
+            buffer = self._buffers.setdefault(product_id, [])
+            if not buffer:
+                self._first_at[product_id] = time.monotonic()
+            buffer.append(comment_data)
+            batch = self._take(product_id) if len(buffer) >= self.batch_size else None
+        if batch:
+            self._send(product_id, batch)
+        elif not self._thread:
+            self.start()
+
+    def emit(self, event, data, product_id):
+        """向商品房间发送普通事件，先推送缓冲中的评论以保证顺序"""
+        self.flush(product_id)
+        self.socketio.emit(event, data, to=product_room(product_id))
+        self.events_sent += 1
+
+    def flush(self, product_id=None):
+        """立即推送缓冲中的评论，不指定商品时推送全部"""
+        with self._lock:
+            product_ids = [product_id] if product_id is not None else list(self._buffers)
+            batches = [(pid, self._take(pid)) for pid in product_ids]
+        for pid, batch in batches:
+            if batch:
+                self._send(pid, batch)
+
+    def _take(self, product_id):
+        """调用方需持有 self._lock"""
+        self._first_at.pop(product_id, None)
+        return self._buffers.pop(product_id, None)
+
+    def _send(self, product_id, batch):
+        try:
+            self.socketio.emit('new_comments', {
+                'product_id': product_id,
+                'count': len(batch),
+                'comments': [as_dict(comment) for comment in batch]
+            }, to=product_room(product_id))
+            self.frames_sent += 1
+            self.comments_sent += len(batch)
+        except Exception as e:
+            logger.error(f"推送商品 {product_id} 的评论失败: {e}")
+
+    def _run(self):
+        while not self._stopping:
+            self._wakeup.wait(self.flush_interval / 2)
+            now = time.monotonic()
+            with self._lock:
+                due = [pid for pid, first_at in self._first_at.items() if now - first_at >= self.flush_interval]
+                batches = [(pid, self._take(pid)) for pid in due]
+            for pid, batch in batches:
+                if batch:
+                    self._send(pid, batch)
+
+    def stats(self):
+        with self._lock:
+            buffered = sum(len(buffer) for buffer in self._buffers.values())
+        return {
+            'frames_sent': self.frames_sent,
+            'comments_sent': self.comments_sent,
+            'events_sent': self.events_sent,
+            'buffered': buffered
+        }
+
+    def stop(self):
+        """推送剩余评论并停止后台线程"""
+        if not self._thread:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        self._thread.join(5)
+        self._thread = None
+        self.flush()
@@ -0,0 +1,113 @@
+import json
+import logging
+from datetime import datetime
+
+from comment_record import CommentRecord
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，未安装时使用标准库
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+_json_decoder = json.JSONDecoder()
+
+# 可能包含评论列表的字段，按优先级排列
+COMMENT_LIST_FIELDS = ('comments', 'data', 'commentList', 'list')
+
+
+def jsonp_bounds(body):
+    """返回JSONP包裹内JSON的起止偏移 (start, end)，不是JSONP时返回整个字符串的范围
+
+    只按偏移定位，不复制字符串：回调名必须是标识符，其后紧跟 '('，
+    结尾是 ')' 或 ');'（允许首尾空白）。
+    """
+    start = 0
+    length = len(body)
+    while start < length and body[start].isspace():
+        start += 1
+    if start < length and body[start] in '{[':
+        return start, length
+
+    paren = body.find('(', start, start + 128)
+    if paren <= start or not body[start:paren].replace('_', 'a').replace('.', 'a').isalnum():
+        return start, length
+
+    end = body.rfind(')')
+    if end <= paren:
+        return start, length
+    return paren + 1, end
+
+
+def parse_comment_body(body):
+    """解析评论接口的JSONP/JSON响应体，只解码一次，失败返回 None
+
+    安装了 orjson 时走快速路径；否则用标准库 raw_decode 从偏移处直接解码，无需切片复制。
+    """
+    if not body:
+        return None
+    start, end = jsonp_bounds(body)
+    try:
+        if orjson is not None:
+            # 纯JSON时切片 [0:len] 直接返回原字符串，不产生复制
+            return orjson.loads(body[start:end])
+        data, _ = _json_decoder.raw_decode(body, start)
+        return data
+    except ValueError:
+        return None
+
+
+def find_comment_list(data):
+    """在响应数据中定位评论列表，返回 (字段名, 列表)，找不到时返回 (None, None)"""
+    if not isinstance(data, dict):
+        return None, None
+    for field in COMMENT_LIST_FIELDS:
+        value = data.get(field)
+        if isinstance(value, list):
+            return field, value
+        if isinstance(value, dict) and isinstance(value.get('comments'), list):
+            return f"{field}.comments", value['comments']
+    if isinstance(data.get('commentInfoList'), list):
+        return 'commentInfoList', data['commentInfoList']
+    return None, None
+
+
+def normalize_comment(comment, product_id=None, product_name=None):
+    """把接口返回的原始评论转换为统一格式的 CommentRecord，没有内容时返回 None"""
+    # 尝试多种可能的内容字段
+    content = None
+    for content_field in ('content', 'commentData', 'commentContent', 'comment'):
+        if comment.get(content_field):
+            content = comment[content_field]
+            break
+    if not content:
+        return None
+
+    comment_data = CommentRecord(
+        comment_id=comment.get('id', comment.get('commentId')),
+        content=content,
+        creation_time=comment.get('creationTime', comment.get('commentTime', comment.get('date', datetime.now().strftime('%Y-%m-%d %H:%M:%S')))),
+        nickname=comment.get('nickname', comment.get('userName', comment.get('userNickName', '匿名用户'))),
+        score=comment.get('score', comment.get('starCount', comment.get('star', 5))),
+        user_level=comment.get('userLevelName', comment.get('userLevel', '')),
+        color=comment.get('productColor', comment.get('color', '')),
+        size=comment.get('productSize', comment.get('size', '')),
+        images=comment.get('images', comment.get('pics', []))
+    )
+    if product_id is not None:
+        comment_data.product_id = product_id
+        comment_data.product_name = product_name
+    return comment_data
+
+
+def iter_comments(data, product_id=None, product_name=None):
+    """惰性地逐条产出规范化后的评论"""
+    _, comments = find_comment_list(data)
+    if not comments:
+        return
+    for comment in comments:
+        if isinstance(comment, dict):
+            comment_data = normalize_comment(comment, product_id, product_name)
+            if comment_data:
+                yield comment_data
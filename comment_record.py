@@ -0,0 +1,120 @@
+from collections.abc import Mapping
+
+# 字典键 -> 属性名，顺序与 normalize_comment 生成的字典一致
+FIELDS = (
+    ('commentId', 'comment_id'),
+    ('content', 'content'),
+    ('creationTime', 'creation_time'),
+    ('nickname', 'nickname'),
+    ('score', 'score'),
+    ('userLevelName', 'user_level'),
+    ('productColor', 'color'),
+    ('productSize', 'size'),
+    ('images', 'images'),
+)
+# 只在设置了值时才出现在字典中的键
+OPTIONAL_FIELDS = (
+    ('product_id', 'product_id'),
+    ('product_name', 'product_name'),
+    ('url', 'url'),
+)
+
+_ATTRS = dict(FIELDS + OPTIONAL_FIELDS)
+_MISSING = object()
+_NO_IMAGES = ()
+
+
+class CommentRecord(Mapping):
+    """一条评论的紧凑表示
+
+    用 __slots__ 存储固定字段，没有每条评论一份的字典键表；同一次爬取的商品ID和商品名
+    是同一个字符串对象的引用，images 为空时共享同一个空元组。实现了只读的映射接口，
+    comment['content']、comment.get('nickname') 等原有的字典用法不变；
+    推送、缓存、导出等需要JSON的边界调用 to_dict() 还原为与原来完全一致的字典。
+    字典中的其他键保存在 extra 中，来回转换不丢失。
+    """
+
+    __slots__ = tuple(attr for _, attr in FIELDS + OPTIONAL_FIELDS) + ('extra',)
+
+    def __init__(self, content, comment_id=None, creation_time=None, nickname=None, score=None,
+                 user_level='', color='', size='', images=None, product_id=_MISSING,
+                 product_name=_MISSING, url=_MISSING, extra=None):
+        self.comment_id = comment_id
+        self.content = content
+        self.creation_time = creation_time
+        self.nickname = nickname
+        self.score = score
+        self.user_level = user_level
+        self.color = color
+        self.size = size
+        self.images = tuple(images) if images else _NO_IMAGES
+        self.product_id = product_id
+        self.product_name = product_name
+        self.url = url
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, data):
+        """由评论字典创建，已经是 CommentRecord 时原样返回"""
+        if isinstance(data, CommentRecord):
+            return data
+        values = {}
+        extra = None
+        for key, value in data.items():
+            attr = _ATTRS.get(key)
+            if attr is None:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+            else:
+                values[attr] = value
+        if 'content' not in values:
+            values['content'] = None
+        return cls(extra=extra, **values)
+
+    def __getitem__(self, key):
+        attr = _ATTRS.get(key)
+        if attr is not None:
+            value = getattr(self, attr)
+            if value is not _MISSING:
+                return list(value) if attr == 'images' else value
+        elif self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __iter__(self):
+        for key, _ in FIELDS:
+            yield key
+        for key, attr in OPTIONAL_FIELDS:
+            if getattr(self, attr) is not _MISSING:
+                yield key
+        if self.extra:
+            yield from self.extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __contains__(self, key):
+        attr = _ATTRS.get(key)
+        if attr is not None:
+            return getattr(self, attr) is not _MISSING
+        return bool(self.extra) and key in self.extra
+
+    def to_dict(self):
+        """还原为 normalize_comment 原来生成的字典"""
+        return {key: self[key] for key in self}
+
+    def __eq__(self, other):
+        if isinstance(other, (CommentRecord, dict)):
+            return self.to_dict() == dict(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"CommentRecord({self.to_dict()!r})"
+
+
+def as_dict(comment):
+    """推送、缓存、导出等边界使用，CommentRecord 转为字典，其他对象原样返回"""
+    return comment.to_dict() if isinstance(comment, CommentRecord) else comment
@@ -0,0 +1,126 @@
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+def batch_room(batch_id):
+    """批量任务对应的Socket.IO房间名"""
+    return f"batch_{batch_id}"
+
+
+class CrawlBatch:
+    """一次批量提交的多个商品爬取任务"""
+
+    def __init__(self, product_ids):
+        self.batch_id = uuid.uuid4().hex
+        self.created_at = time.time()
+        self.finished_at = None
+        # product_id -> 'pending' / completed / failed / cancelled
+        self.states = {product_id: 'pending' for product_id in product_ids}
+        self.comment_counts = {}
+        self.errors = {}
+        self.cached = 0
+
+    @property
+    def total(self):
+        return len(self.states)
+
+    @property
+    def pending(self):
+        return sum(1 for state in self.states.values() if state == 'pending')
+
+    def progress(self):
+        counts = {}
+        for state in self.states.values():
+            counts[state] = counts.get(state, 0) + 1
+        return {
+            'batch_id': self.batch_id,
+            'total': self.total,
+            'done': self.total - self.pending,
+            'states': counts,
+            'comments': sum(self.comment_counts.values()),
+            'cached': self.cached
+        }
+
+    def summary(self):
+        summary = self.progress()
+        summary.update({
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+            'elapsed': round((self.finished_at or time.time()) - self.created_at, 2),
+            'failed': {product_id: error for product_id, error in self.errors.items()}
+        })
+        return summary
+
+
+class BatchTracker:
+    """汇总批量任务的进度
+
+    监听调度器中每个任务的结束，更新所属批次的统计，每个任务结束时调用
+    on_progress(batch, progress)，整个批次结束时调用一次 on_complete(batch, summary)。
+    """
+
+    def __init__(self, on_progress=None, on_complete=None, history_size=50):
+        self.on_progress = on_progress
+        self.on_complete = on_complete
+        self._lock = threading.Lock()
+        self._active = {}
+        # product_id -> 等待该商品结束的批次ID集合
+        self._waiting = {}
+        self._history = deque(maxlen=history_size)
+
+    def create(self, product_ids):
+        batch = CrawlBatch(product_ids)
+        with self._lock:
+            self._active[batch.batch_id] = batch
+            for product_id in batch.states:
+                self._waiting.setdefault(product_id, set()).add(batch.batch_id)
+        return batch
+
+    def job_finished(self, job):
+        """调度器的任务结束回调"""
+        completed = []
+        progressed = []
+        with self._lock:
+            batch_ids = self._waiting.pop(job.product_id, set())
+            for batch_id in batch_ids:
+                batch = self._active.get(batch_id)
+                if not batch:
+                    continue
+                result = job.result or {}
+                state = job.state
+                if state == 'completed' and result.get('status') == 'error':
+                    state = 'failed'
+                batch.states[job.product_id] = state
+                batch.comment_counts[job.product_id] = result.get('count', 0)
+                if result.get('cached'):
+                    batch.cached += 1
+                error = job.error or result.get('error')
+                if state != 'completed' and error:
+                    batch.errors[job.product_id] = error
+                progressed.append((batch, batch.progress()))
+                if batch.pending == 0:
+                    batch.finished_at = time.time()
+                    del self._active[batch_id]
+                    self._history.append(batch)
+                    completed.append((batch, batch.summary()))
+
+        for batch, progress in progressed:
+            if self.on_progress:
+                self.on_progress(batch, progress)
+        for batch, summary in completed:
+            logger.info(f"批量任务 {batch.batch_id} 完成: 共 {batch.total} 个商品，"
+                        f"{summary['comments']} 条评论，耗时 {summary['elapsed']} 秒")
+            if self.on_complete:
+                self.on_complete(batch, summary)
+
+    def status(self, batch_id):
+        with self._lock:
+            batch = self._active.get(batch_id)
+            if not batch:
+                batch = next((b for b in self._history if b.batch_id == batch_id), None)
+            return batch.summary() if batch else None
@@ -0,0 +1,129 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from comment_record import as_dict
+
+logger = logging.getLogger(__name__)
+
+
+def latest_creation_time(comments):
+    """评论中最新的 creationTime（'%Y-%m-%d %H:%M:%S' 格式可直接按字符串比较）"""
+    times = [c.get('creationTime') for c in comments if isinstance(c.get('creationTime'), str)]
+    return max(times) if times else None
+
+
+class CrawlCache:
+    """按商品ID缓存的爬取结果
+
+    两级缓存：内存中的LRU（最多 capacity 个商品）和磁盘上每个商品一个JSON文件。
+    ttl 秒内的结果视为新鲜，直接返回给客户端；过期的结果仍然保留，
+    作为增量刷新的起点（只拉取比 latest_time 更新的评论）。
+    """
+
+    def __init__(self, base_dir="jd_user_data/cache", capacity=64, ttl=1800):
+        self.base_dir = Path(base_dir)
+        self.capacity = capacity
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        # 缓存指标
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.disk_reads = 0
+        self.writes = 0
+
+    def _path(self, product_id):
+        return self.base_dir / f"{product_id}.json"
+
+    def _remember(self, product_id, entry):
+        """调用方需持有 self._lock"""
+        self._entries[product_id] = entry
+        self._entries.move_to_end(product_id)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def _load_from_disk(self, product_id):
+        path = self._path(product_id)
+        if not path.exists():
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            self.disk_reads += 1
+            return entry
+        except Exception as e:
+            logger.warning(f"读取商品 {product_id} 的爬取缓存失败: {e}")
+            return None
+
+    def lookup(self, product_id):
+        """返回 (缓存条目, 是否新鲜)，没有缓存时返回 (None, False)"""
+        with self._lock:
+            entry = self._entries.get(product_id)
+            if entry is None:
+                entry = self._load_from_disk(product_id)
+                if entry is not None:
+                    self._remember(product_id, entry)
+            else:
+                self._entries.move_to_end(product_id)
+
+            if entry is None:
+                self.misses += 1
+                return None, False
+            fresh = time.time() - entry['crawled_at'] < self.ttl
+            if fresh:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+            return entry, fresh
+
+    def put(self, product_id, comments, summary=None):
+        """保存一次爬取的完整结果"""
+        entry = {
+            'product_id': product_id,
+            'crawled_at': time.time(),
+            'latest_time': latest_creation_time(comments),
+            'summary': summary,
+            'comments': [as_dict(comment) for comment in comments]
+        }
+        with self._lock:
+            self._remember(product_id, entry)
+        self._write(product_id, entry)
+        return entry
+
+    def _write(self, product_id, entry):
+        path = self._path(product_id)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(path.suffix + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            tmp_path.replace(path)
+            self.writes += 1
+        except Exception as e:
+            logger.error(f"写入商品 {product_id} 的爬取缓存失败: {e}")
+
+    def invalidate(self, product_id):
+        with self._lock:
+            self._entries.pop(product_id, None)
+        self._path(product_id).unlink(missing_ok=True)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'capacity': self.capacity,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'disk_reads': self.disk_reads,
+                'writes': self.writes
+            }
@@ -0,0 +1,259 @@
+import asyncio
+import itertools
+import logging
+import threading
+import time
+import traceback
+import uuid
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class CrawlJob:
+    """调度器中的一个爬取任务"""
+
+    def __init__(self, product_url, product_id, product_name, priority=0, options=None, cursors=None):
+        self.job_id = uuid.uuid4().hex
+        self.product_url = product_url
+        self.product_id = product_id
+        self.product_name = product_name
+        self.priority = priority
+        # 传给任务执行函数的额外参数
+        self.options = options or {}
+        # 分页断点 {评分筛选: 下一页页码}，续爬时从这里开始
+        self.cursors = cursors or {}
+        # queued -> running -> completed / failed / cancelled
+        self.state = 'queued'
+        self.error = None
+        # 任务执行函数的返回值
+        self.result = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_requested = False
+        self.task = None
+
+    def to_dict(self):
+        return {
+            'job_id': self.job_id,
+            'product_id': self.product_id,
+            'product_name': self.product_name,
+            'url': self.product_url,
+            'priority': self.priority,
+            'options': self.options,
+            'cursors': self.cursors,
+            'state': self.state,
+            'error': self.error,
+            'result': self.result,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+
+class CrawlScheduler:
+    """单一后台事件循环上的爬取任务调度器
+
+    所有任务进入一个优先级队列（priority 越大越先执行，同优先级先进先出），
+    由 concurrency 个 worker 协程并发执行。排队和运行中的任务按 product_id
+    建立在途索引，用于拒绝重复提交、取消任务和状态查询。
+    submit/cancel/status 可以在任意线程（如Flask请求线程）中调用。
+    """
+
+    def __init__(self, runner, concurrency=2, history_size=200, on_finish=None, store=None):
+        self.runner = runner
+        # 可选的持久化任务表（job_store.JobStore）
+        self.store = store
+        # 任务结束回调 on_finish(job)，在释放锁之后调用
+        self.on_finish = on_finish
+        self.concurrency = concurrency
+        self.loop = asyncio.new_event_loop()
+
+        self._queue = None
+        self._workers = []
+        self._thread = None
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        # 在途索引: product_id -> CrawlJob（排队中和运行中）
+        self._in_flight = {}
+        # 最近结束的任务，用于状态查询
+        self._history = deque(maxlen=history_size)
+
+    def start(self):
+        """启动后台事件循环线程和worker协程"""
+        if self._thread:
+            return self
+
+        def run_loop():
+            asyncio.set_event_loop(self.loop)
+            self.loop.run_forever()
+
+        self._thread = threading.Thread(target=run_loop, name='crawl-scheduler', daemon=True)
+        self._thread.start()
+        self.run_coroutine(self._start_workers()).result()
+        logger.info(f"爬取调度器已启动，并发上限: {self.concurrency}")
+        return self
+
+    async def _start_workers(self):
+        self._queue = asyncio.PriorityQueue()
+        self._workers = [asyncio.ensure_future(self._worker(i)) for i in range(self.concurrency)]
+
+    def run_coroutine(self, coro):
+        """在调度器的事件循环中执行协程，返回 concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def submit(self, product_url, product_id, product_name, priority=0, options=None, cursors=None):
+        """提交爬取任务，同一商品已在途时返回 None"""
+        with self._lock:
+            if product_id in self._in_flight:
+                return None
+            job = CrawlJob(product_url, product_id, product_name, priority, options, cursors)
+            self._in_flight[product_id] = job
+            queue_size = len(self._in_flight)
+            self._persist(job, new=True)
+
+        self.loop.call_soon_threadsafe(self._queue.put_nowait, (-priority, next(self._seq), job))
+        logger.info(f"商品 {product_id} 已加入爬取队列，优先级 {priority}，当前在途任务数: {queue_size}")
+        return job
+
+    def is_in_flight(self, job_id):
+        """任务是否仍在排队或运行"""
+        with self._lock:
+            return any(job.job_id == job_id for job in self._in_flight.values())
+
+    def resume_unfinished(self):
+        """重新提交上次服务退出时未完成的任务，从各自的分页断点继续"""
+        if not self.store:
+            return 0
+        resumed = 0
+        for record in self.store.unfinished():
+            self.store.mark_interrupted(record['job_id'])
+            job = self.submit(record['product_url'], record['product_id'], record['product_name'],
+                              priority=record['priority'], options=record['options'], cursors=record['cursors'])
+            if job:
+                resumed += 1
+                logger.info(f"恢复商品 {record['product_id']} 的爬取任务，断点: {record['cursors']}")
+        return resumed
+
+    def _persist(self, job, new=False):
+        if not self.store:
+            return
+        try:
+            if new:
+                self.store.add(job)
+            else:
+                self.store.update_state(job)
+        except Exception as e:
+            logger.error(f"持久化任务 {job.job_id} 失败: {e}")
+
+    def cancel(self, product_id):
+        """取消排队中或运行中的任务"""
+        with self._lock:
+            job = self._in_flight.get(product_id)
+            if not job:
+                return False
+            job.cancel_requested = True
+            queued = job.state == 'queued'
+            if queued:
+                # 排队中的任务由worker取出时直接跳过
+                self._finish(job, 'cancelled')
+
+        if queued:
+            self._notify(job)
+            return True
+
+        if job.task:
+            self.loop.call_soon_threadsafe(job.task.cancel)
+        return True
+
+    def _finish(self, job, state, error=None, persist=True):
+        """调用方需持有 self._lock"""
+        job.state = state
+        job.error = error
+        job.finished_at = time.time()
+        if persist:
+            self._persist(job)
+        if self._in_flight.get(job.product_id) is job:
+            del self._in_flight[job.product_id]
+        self._history.append(job)
+
+    def _notify(self, job):
+        if self.on_finish:
+            try:
+                self.on_finish(job)
+            except Exception as e:
+                logger.error(f"任务结束回调执行失败: {e}")
+
+    async def _worker(self, worker_id):
+        while True:
+            _, _, job = await self._queue.get()
+            try:
+                with self._lock:
+                    if job.state != 'queued':
+                        continue
+                    job.state = 'running'
+                    job.started_at = time.time()
+                    self._persist(job)
+
+                logger.info(f"worker {worker_id} 开始执行商品 {job.product_id} 的爬取任务")
+                job.task = asyncio.ensure_future(self.runner(job))
+                if job.cancel_requested:
+                    job.task.cancel()
+                try:
+                    job.result = await job.task
+                    state, error = 'completed', None
+                except asyncio.CancelledError:
+                    if not job.cancel_requested:
+                        # worker自身被取消（调度器关闭），任务表中保留运行状态，重启后从断点恢复
+                        with self._lock:
+                            self._finish(job, 'cancelled', '调度器已关闭', persist=False)
+                        self._notify(job)
+                        raise
+                    state, error = 'cancelled', None
+                except Exception as e:
+                    logger.error(f"爬取任务 {job.product_id} 执行失败: {e}")
+                    logger.error(traceback.format_exc())
+                    state, error = 'failed', str(e)
+
+                with self._lock:
+                    self._finish(job, state, error)
+                self._notify(job)
+                logger.info(f"商品 {job.product_id} 爬取任务结束，状态: {state}，耗时 {job.finished_at - job.started_at:.2f} 秒")
+            finally:
+                self._queue.task_done()
+
+    def status(self, product_id=None):
+        """返回在途任务和最近结束的任务"""
+        with self._lock:
+            if product_id:
+                job = self._in_flight.get(product_id)
+                if not job:
+                    job = next((j for j in reversed(self._history) if j.product_id == product_id), None)
+                return job.to_dict() if job else None
+
+            in_flight = [job.to_dict() for job in self._in_flight.values()]
+            return {
+                'concurrency': self.concurrency,
+                'queued': sum(1 for job in in_flight if job['state'] == 'queued'),
+                'running': sum(1 for job in in_flight if job['state'] == 'running'),
+                'in_flight': in_flight,
+                'recent': [job.to_dict() for job in list(self._history)[-20:]]
+            }
+
+    def stop(self, timeout=30):
+        """取消所有worker并停止事件循环"""
+        if not self._thread:
+            return
+
+        async def shutdown():
+            for worker in self._workers:
+                worker.cancel()
+            await asyncio.gather(*self._workers, return_exceptions=True)
+
+        try:
+            self.run_coroutine(shutdown()).result(timeout=timeout)
+        except Exception as e:
+            logger.error(f"关闭爬取调度器时出错: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread = None
@@ -0,0 +1,391 @@
+import logging
+import threading
+import time
+import traceback
+from datetime import datetime
+
+import metrics
+from comment_dedup import comment_fingerprints
+
+logger = logging.getLogger(__name__)
+
+
+def parse_create_time(comment_data):
+    """解析评论日期，失败时使用当前时间"""
+    try:
+        if isinstance(comment_data.get('creationTime'), str) and comment_data.get('creationTime'):
+            return datetime.strptime(comment_data['creationTime'], '%Y-%m-%d %H:%M:%S')
+    except Exception as e:
+        logger.warning(f"解析评论日期失败: {e}，使用当前时间")
+    return datetime.now()
+
+
+class CommentWriter:
+    """基于连接池的评论批量写入器（write-behind）
+
+    enqueue 只把评论放入内存缓冲区，后台线程在缓冲区达到 batch_size
+    或距上次写入超过 flush_interval 秒时，用一条多行 INSERT IGNORE 写入。
+    重复评论由 comment 表上的 (product_id, content_hash) 唯一键过滤，
+    已确认存在的商品ID缓存在内存中，不再逐条查询 product 表。
+    设置了 scorer（sentiment.SentimentScorer）时，写入前对整批评论计算情感得分，
+    一并写入 sentiment_score/sentiment_label 列。设置了 analysis_pool 时，
+    积压形成的大批次的内容指纹交给工作进程计算。
+    批次回调只收到实际新增的评论，已入库或批内重复的评论不会重复计入关键词等统计。
+    一批重试后仍写入失败时调用 on_error(异常, 这一批评论)。
+    """
+
+    def __init__(self, db_config, pool_size=5, batch_size=200, flush_interval=1.0,
+                 max_retries=3, on_error=None, scorer=None, analysis_pool=None):
+        self.db_config = db_config
+        self.pool_size = pool_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.on_error = on_error
+        self.scorer = scorer
+        self.analysis_pool = analysis_pool
+
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._buffer = []
+        self._cond = threading.Condition()
+        self._flushing = False
+        self._flush_requested = False
+        self._stopping = False
+        self._thread = None
+        self._known_products = set()
+        # 每写完（或最终丢弃）一批调用 listener(rows_processed, ok)
+        self._flush_listeners = []
+        # 每成功写入一批调用 listener(batch)，batch 为这一批的评论
+        self._batch_listeners = []
+
+        # 写入指标
+        self.flush_count = 0
+        self.rows_enqueued = 0
+        self.rows_written = 0
+        self.rows_duplicated = 0
+        self.rows_dropped = 0
+        # 按入队顺序已处理完的行数，与 rows_enqueued 对应
+        self.rows_processed = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+        self.total_flush_latency = 0.0
+
+    def get_connection(self):
+        """从连接池获取连接，首次调用时创建连接池"""
+        with self._pool_lock:
+            if self._pool is None:
+                # 首次连接数据库时才导入驱动，离线基准测试注入空连接池时不需要安装
+                from mysql.connector import pooling
+                self._pool = pooling.MySQLConnectionPool(
+                    pool_name="jd_comment_writer",
+                    pool_size=self.pool_size,
+                    pool_reset_session=True,
+                    **self.db_config
+                )
+        return self._pool.get_connection()
+
+    def start(self):
+        """启动后台写入线程"""
+        if self._thread:
+            return self
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name='comment-writer', daemon=True)
+        self._thread.start()
+        logger.info(f"评论写入器已启动，批大小: {self.batch_size}，刷新间隔: {self.flush_interval} 秒")
+        return self
+
+    def enqueue(self, comment_data):
+        """把评论放入写缓冲区，不阻塞调用方"""
+        with self._cond:
+            self._buffer.append(comment_data)
+            self.rows_enqueued += 1
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify_all()
+        if not self._thread:
+            self.start()
+
+    def flush(self, timeout=30):
+        """立即写出缓冲区中的全部评论，等待写入完成"""
+        deadline = time.time() + timeout
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._buffer or self._flushing:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    logger.warning(f"等待评论写入超时，缓冲区剩余 {len(self._buffer)} 条")
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: len(self._buffer) >= self.batch_size or self._flush_requested or self._stopping,
+                    timeout=self.flush_interval
+                )
+                batch = self._buffer
+                self._buffer = []
+                self._flush_requested = False
+                self._flushing = bool(batch)
+                stopping = self._stopping
+
+            if batch:
+                try:
+                    self._write_with_retry(batch)
+                finally:
+                    with self._cond:
+                        self._flushing = False
+                        self._cond.notify_all()
+
+            if stopping:
+                with self._cond:
+                    if not self._buffer:
+                        return
+
+    def add_flush_listener(self, listener):
+        self._flush_listeners.append(listener)
+
+    def remove_flush_listener(self, listener):
+        try:
+            self._flush_listeners.remove(listener)
+        except ValueError:
+            pass
+
+    def add_batch_listener(self, listener):
+        self._batch_listeners.append(listener)
+
+    def remove_batch_listener(self, listener):
+        try:
+            self._batch_listeners.remove(listener)
+        except ValueError:
+            pass
+
+    def _notify_batch(self, batch):
+        for listener in list(self._batch_listeners):
+            try:
+                listener(batch)
+            except Exception as e:
+                logger.error(f"批次回调执行失败: {e}")
+
+    def _notify_flush(self, ok):
+        for listener in list(self._flush_listeners):
+            try:
+                listener(self.rows_processed, ok)
+            except Exception as e:
+                logger.error(f"写入回调执行失败: {e}")
+
+    def _write_with_retry(self, batch):
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                inserted = self._write_batch(batch)
+                self.rows_processed += len(batch)
+                if inserted:
+                    self._notify_batch(inserted)
+                self._notify_flush(True)
+                return
+            except Exception as e:
+                logger.error(f"批量写入评论失败 (第 {attempt}/{self.max_retries} 次): {e}")
+                if attempt == self.max_retries:
+                    logger.error(traceback.format_exc())
+                    self.rows_dropped += len(batch)
+                    self.rows_processed += len(batch)
+                    self._notify_flush(False)
+                    if self.on_error:
+                        self.on_error(e, batch)
+                else:
+                    time.sleep(min(2 ** attempt, 5))
+
+    def _score_batch(self, batch):
+        """整批计算情感得分，未配置或计算失败时这两列写 NULL，留给 Java 端补算"""
+        if self.scorer is not None:
+            try:
+                with metrics.sentiment_seconds.time():
+                    return self.scorer.label_batch([comment_data.get('content') for comment_data in batch])
+            except Exception as e:
+                logger.error(f"计算评论情感得分失败: {e}")
+        return [(None, None)] * len(batch)
+
+    def _existing_fingerprints(self, cursor, keys):
+        """查询 (商品ID, 内容指纹) 中已入库的部分"""
+        by_product = {}
+        for product_id, fingerprint in keys:
+            by_product.setdefault(product_id, []).append(fingerprint)
+        existing = set()
+        for product_id, fingerprints in by_product.items():
+            # 积压形成的大批次分段查询，避免单条语句过长
+            for start in range(0, len(fingerprints), 1000):
+                chunk = fingerprints[start:start + 1000]
+                placeholders = ','.join(['%s'] * len(chunk))
+                cursor.execute(
+                    f"SELECT content_hash FROM comment WHERE product_id = %s AND content_hash IN ({placeholders})",
+                    (product_id, *chunk)
+                )
+                existing.update((product_id, content_hash) for content_hash, in cursor.fetchall())
+        return existing
+
+    def _write_batch(self, batch):
+        """写入一批评论，返回其中实际新增的评论"""
+        start_time = time.time()
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+
+            # 只为缓存中没有的商品写 product 表
+            new_products = {}
+            for comment_data in batch:
+                product_id = comment_data['product_id']
+                if product_id not in self._known_products and product_id not in new_products:
+                    new_products[product_id] = (
+                        product_id,
+                        comment_data.get('product_name') or '未知商品',
+                        comment_data.get('url', '')
+                    )
+            if new_products:
+                cursor.executemany(
+                    """INSERT IGNORE INTO product
+                       (id, name, url, create_time, update_time)
+                       VALUES (%s, %s, %s, NOW(), NOW())""",
+                    list(new_products.values())
+                )
+
+            # 先查出已入库的指纹，只插入新评论，回调也只通知这些评论
+            fingerprints = comment_fingerprints(batch, self.analysis_pool)
+            seen = self._existing_fingerprints(
+                cursor, {(comment_data['product_id'], fingerprint)
+                         for comment_data, fingerprint in zip(batch, fingerprints)})
+            fresh = []
+            fresh_fingerprints = []
+            for comment_data, fingerprint in zip(batch, fingerprints):
+                key = (comment_data['product_id'], fingerprint)
+                if key not in seen:
+                    seen.add(key)
+                    fresh.append(comment_data)
+                    fresh_fingerprints.append(fingerprint)
+
+            sentiments = self._score_batch(fresh)
+            rows = [(
+                comment_data['product_id'],
+                comment_data['content'],
+                comment_data['nickname'],
+                comment_data['score'],
+                parse_create_time(comment_data),
+                fingerprint,
+                sentiment_score,
+                sentiment_label
+            ) for comment_data, fingerprint, (sentiment_score, sentiment_label)
+                in zip(fresh, fresh_fingerprints, sentiments)]
+            inserted = 0
+            if rows:
+                # 唯一键仍然兜底并发写入的重复评论
+                cursor.executemany(
+                    """INSERT IGNORE INTO comment
+                       (product_id, content, nickname, score, create_time, content_hash,
+                        sentiment_score, sentiment_label)
+                       VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""",
+                    rows
+                )
+                inserted = max(cursor.rowcount, 0)
+            conn.commit()
+            cursor.close()
+        finally:
+            conn.close()
+
+        self._known_products.update(new_products)
+        latency = time.time() - start_time
+        metrics.db_flush_seconds.observe(latency)
+        self.flush_count += 1
+        self.rows_written += inserted
+        self.rows_duplicated += len(batch) - inserted
+        self.last_flush_latency = latency
+        self.max_flush_latency = max(self.max_flush_latency, latency)
+        self.total_flush_latency += latency
+        if new_products:
+            logger.info(f"商品已保存到数据库: {', '.join(new_products)}")
+        logger.info(f"批量写入 {len(batch)} 条评论，新增 {inserted} 条，耗时 {latency * 1000:.1f} ms")
+        return fresh
+
+    def load_watermark(self, product_id):
+        """读取商品的增量爬取水位线，没有时返回 None"""
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT last_comment_id, last_comment_time FROM product WHERE id = %s",
+                (product_id,)
+            )
+            row = cursor.fetchone()
+            cursor.close()
+        finally:
+            conn.close()
+        if not row or row[1] is None:
+            return None
+        return {'comment_id': row[0], 'creation_time': row[1].strftime('%Y-%m-%d %H:%M:%S')}
+
+    def load_comment_contents(self, product_id):
+        """读取商品已入库的全部 (评论内容, 内容指纹)"""
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT content, content_hash FROM comment WHERE product_id = %s", (product_id,))
+            rows = cursor.fetchall()
+            cursor.close()
+        finally:
+            conn.close()
+        return rows
+
+    def save_watermark(self, product_id, product_name, watermark, url=''):
+        """保存商品的增量爬取水位线，只会向更新的时间推进"""
+        creation_time = datetime.strptime(watermark['creation_time'], '%Y-%m-%d %H:%M:%S')
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                """INSERT INTO product
+                   (id, name, url, create_time, update_time, last_comment_id, last_comment_time)
+                   VALUES (%s, %s, %s, NOW(), NOW(), %s, %s)
+                   ON DUPLICATE KEY UPDATE
+                   last_comment_id = IF(last_comment_time IS NULL OR VALUES(last_comment_time) >= last_comment_time,
+                                        VALUES(last_comment_id), last_comment_id),
+                   last_comment_time = IF(last_comment_time IS NULL OR VALUES(last_comment_time) >= last_comment_time,
+                                          VALUES(last_comment_time), last_comment_time),
+                   update_time = NOW()""",
+                (product_id, product_name or '未知商品', url, watermark.get('comment_id'), creation_time)
+            )
+            conn.commit()
+            cursor.close()
+        finally:
+            conn.close()
+        self._known_products.add(product_id)
+
+    def queue_depth(self):
+        with self._cond:
+            return len(self._buffer)
+
+    def stats(self):
+        """返回写入指标"""
+        return {
+            'queue_depth': self.queue_depth(),
+            'flush_count': self.flush_count,
+            'rows_enqueued': self.rows_enqueued,
+            'rows_written': self.rows_written,
+            'rows_duplicated': self.rows_duplicated,
+            'rows_dropped': self.rows_dropped,
+            'rows_processed': self.rows_processed,
+            'known_products': len(self._known_products),
+            'last_flush_latency_ms': round(self.last_flush_latency * 1000, 2),
+            'max_flush_latency_ms': round(self.max_flush_latency * 1000, 2),
+            'avg_flush_latency_ms': round(self.total_flush_latency / self.flush_count * 1000, 2) if self.flush_count else 0.0
+        }
+
+    def stop(self, timeout=30):
+        """写出剩余评论并停止后台线程"""
+        if not self._thread:
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        self._thread = None
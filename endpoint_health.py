@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 请求结果分类
+OUTCOME_OK = 'ok'
+# 403/429，被限流或被风控拦截
+OUTCOME_THROTTLED = 'throttled'
+# 状态码正常但响应为空或无法解析，京东限流时常见
+OUTCOME_EMPTY = 'empty'
+# 网络错误、超时、5xx
+OUTCOME_ERROR = 'error'
+
+THROTTLE_STATUSES = (403, 429)
+
+# 熔断器状态
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+
+def classify_status(status):
+    """把HTTP状态码归类为请求结果"""
+    if status in THROTTLE_STATUSES:
+        return OUTCOME_THROTTLED
+    if 200 <= status < 300:
+        return OUTCOME_OK
+    return OUTCOME_ERROR
+
+
+class EndpointHealth:
+    """单个评论接口的熔断器和自适应令牌桶
+
+    令牌桶按 rate（请求/秒）补充令牌，成功时加性提速，被限流或返回空响应时乘性降速（AIMD）。
+    连续失败 failure_threshold 次后熔断 open_timeout 秒，期间直接跳过该接口；
+    冷却结束后进入半开状态，只放行一个探测请求，成功则恢复，失败则加倍冷却时间重新熔断。
+    所有方法都是线程安全的，状态在进程内所有爬取任务间共享。
+    """
+
+    def __init__(self, name, rate=3.0, min_rate=0.2, max_rate=10.0, burst=3,
+                 increase_step=0.2, decrease_factor=0.5, failure_threshold=5,
+                 open_timeout=30.0, max_open_timeout=600.0):
+        self.name = name
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.failure_threshold = failure_threshold
+        self.base_open_timeout = open_timeout
+        self.max_open_timeout = max_open_timeout
+
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        self.state = STATE_CLOSED
+        self.open_timeout = open_timeout
+        self._opened_at = 0.0
+        self._probing = False
+        self._probe_started = 0.0
+        self.consecutive_failures = 0
+
+        # 统计信息
+        self.outcomes = {OUTCOME_OK: 0, OUTCOME_THROTTLED: 0, OUTCOME_EMPTY: 0, OUTCOME_ERROR: 0}
+        self.skipped = 0
+        self.trips = 0
+        self.total_latency = 0.0
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def allow(self):
+        """熔断器是否放行请求，半开状态下只放行一个探测请求"""
+        with self._lock:
+            if self.state == STATE_CLOSED:
+                return True
+            if self.state == STATE_OPEN:
+                if time.monotonic() - self._opened_at < self.open_timeout:
+                    self.skipped += 1
+                    return False
+                self.state = STATE_HALF_OPEN
+                self._probing = False
+                logger.info(f"评论接口 {self.name} 熔断冷却结束，进入半开状态")
+            now = time.monotonic()
+            # 探测请求被取消而没有记录结果时，超过冷却时间再放行一个
+            if self._probing and now - self._probe_started < self.open_timeout:
+                self.skipped += 1
+                return False
+            self._probing = True
+            self._probe_started = now
+            return True
+
+    def is_open(self):
+        """是否处于熔断冷却期，不占用半开状态的探测名额"""
+        with self._lock:
+            return self.state == STATE_OPEN and time.monotonic() - self._opened_at < self.open_timeout
+
+    async def acquire(self):
+        """等待令牌桶中的一个令牌"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            await asyncio.sleep(wait)
+
+    def record(self, outcome, latency=0.0):
+        """记录一次请求结果，调整速率和熔断状态"""
+        with self._lock:
+            self.outcomes[outcome] += 1
+            self.total_latency += latency
+            if outcome == OUTCOME_OK:
+                self.consecutive_failures = 0
+                self.rate = min(self.max_rate, self.rate + self.increase_step)
+                if self.state != STATE_CLOSED:
+                    logger.info(f"评论接口 {self.name} 探测成功，熔断恢复")
+                self.state = STATE_CLOSED
+                self.open_timeout = self.base_open_timeout
+                self._probing = False
+                return
+
+            self.consecutive_failures += 1
+            if outcome in (OUTCOME_THROTTLED, OUTCOME_EMPTY):
+                self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+                # 降速后丢弃积攒的令牌，避免紧接着再突发一批请求
+                self._tokens = min(self._tokens, 1.0)
+            if self.state == STATE_HALF_OPEN:
+                self.open_timeout = min(self.max_open_timeout, self.open_timeout * 2)
+                self._trip()
+            elif self.state == STATE_CLOSED and self.consecutive_failures >= self.failure_threshold:
+                self._trip()
+
+    def _trip(self):
+        self.state = STATE_OPEN
+        self._opened_at = time.monotonic()
+        self._probing = False
+        self.trips += 1
+        logger.warning(f"评论接口 {self.name} 连续失败 {self.consecutive_failures} 次，熔断 {self.open_timeout:.0f} 秒，"
+                       f"速率降至 {self.rate:.2f} 次/秒")
+
+    def stats(self):
+        with self._lock:
+            requests = sum(self.outcomes.values())
+            return {
+                'state': self.state,
+                'rate': round(self.rate, 2),
+                'consecutive_failures': self.consecutive_failures,
+                'requests': requests,
+                'outcomes': dict(self.outcomes),
+                'skipped': self.skipped,
+                'trips': self.trips,
+                'open_timeout': self.open_timeout,
+                'avg_latency_ms': round(self.total_latency / requests * 1000, 2) if requests else 0.0
+            }
+
+
+class EndpointHealthRegistry:
+    """按接口名管理 EndpointHealth，进程内所有爬取任务共用"""
+
+    def __init__(self, **endpoint_config):
+        self.endpoint_config = endpoint_config
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def get(self, name):
+        with self._lock:
+            health = self._endpoints.get(name)
+            if health is None:
+                health = self._endpoints[name] = EndpointHealth(name, **self.endpoint_config)
+            return health
+
+    def all_open(self, names):
+        """给定的接口是否都处于熔断冷却期"""
+        return all(self.get(name).is_open() for name in names)
+
+    def stats(self):
+        with self._lock:
+            endpoints = dict(self._endpoints)
+        return {name: health.stats() for name, health in endpoints.items()}
+
+
+# 进程内共享的接口健康状态
+default_endpoint_health = EndpointHealthRegistry()
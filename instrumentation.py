@@ -0,0 +1,104 @@
+import json
+import logging
+import random
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class InterceptInstrumentation:
+    """评论请求处理路径上的计数器和抽样调试采集
+
+    热路径上只做整数和浮点累加，不拼接任何字符串。请求头、响应片段等调试信息
+    只有在日志级别达到 level 时才按 sample_rate 抽样采集：写入日志，配置了
+    capture_dir 时另存为JSON文件（最多 max_captures 个）。
+    """
+
+    def __init__(self, sample_rate=0.01, level=logging.DEBUG, capture_dir=None, max_captures=20,
+                 snippet_size=500):
+        self.sample_rate = sample_rate
+        self.level = level
+        self.capture_dir = Path(capture_dir) if capture_dir else None
+        self.max_captures = max_captures
+        self.snippet_size = snippet_size
+
+        # 计数器
+        self.requests = 0
+        self.responses = 0
+        self.no_response = 0
+        self.failed = 0
+        self.bytes_received = 0
+        self.parse_errors = 0
+        self.empty_responses = 0
+        self.comments_seen = 0
+        self.comments_added = 0
+        self.parse_time = 0.0
+        self.max_parse_time = 0.0
+        self.captures = 0
+        self.status_counts = {}
+
+    @property
+    def capturing(self):
+        """当前日志级别下是否采集调试信息"""
+        return self.sample_rate > 0 and logger.isEnabledFor(self.level)
+
+    def record_failure(self, status):
+        self.failed += 1
+        self.status_counts[status] = self.status_counts.get(status, 0) + 1
+
+    def record_response(self, size, parse_time, seen, added, parsed=True):
+        """记录一个成功响应的字节数、解析耗时和评论条数"""
+        self.responses += 1
+        self.bytes_received += size
+        self.parse_time += parse_time
+        if parse_time > self.max_parse_time:
+            self.max_parse_time = parse_time
+        if not parsed:
+            self.parse_errors += 1
+        elif not seen:
+            self.empty_responses += 1
+        self.comments_seen += seen
+        self.comments_added += added
+
+    def maybe_capture(self, url, headers=None, body=None, note=None):
+        """按抽样率采集一次请求的调试信息，返回是否采集"""
+        if not self.capturing or random.random() >= self.sample_rate:
+            return False
+        self.captures += 1
+        snippet = body[:self.snippet_size] if body else ''
+        logger.log(self.level, "评论请求采样 #%d: %s %s 请求头: %s 响应片段: %s",
+                   self.captures, url, note or '', headers, snippet)
+        if self.capture_dir and self.captures <= self.max_captures:
+            try:
+                self.capture_dir.mkdir(parents=True, exist_ok=True)
+                path = self.capture_dir / f"capture_{int(time.time() * 1000)}_{self.captures}.json"
+                with open(path, 'w', encoding='utf-8') as f:
+                    json.dump({'url': url, 'note': note, 'headers': headers, 'body': body},
+                              f, ensure_ascii=False)
+            except Exception as e:
+                logger.warning(f"保存评论请求采样失败: {e}")
+        return True
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'responses': self.responses,
+            'no_response': self.no_response,
+            'failed': self.failed,
+            'status_counts': dict(self.status_counts),
+            'bytes_received': self.bytes_received,
+            'parse_errors': self.parse_errors,
+            'empty_responses': self.empty_responses,
+            'comments_seen': self.comments_seen,
+            'comments_added': self.comments_added,
+            'parse_time_ms': round(self.parse_time * 1000, 2),
+            'avg_parse_time_ms': round(self.parse_time / self.responses * 1000, 3) if self.responses else 0.0,
+            'max_parse_time_ms': round(self.max_parse_time * 1000, 3),
+            'captures': self.captures
+        }
+
+    def summary(self):
+        return (f"拦截 {self.requests} 个评论请求，成功 {self.responses}，失败 {self.failed}，"
+                f"无响应 {self.no_response}，共 {self.bytes_received / 1024:.1f} KB，"
+                f"解析 {self.parse_time * 1000:.1f} ms，评论 {self.comments_seen} 条（新增 {self.comments_added}）")
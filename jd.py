@@ -1,43 +1,110 @@
 import asyncio
-import json
 import re
 import logging
 from pathlib import Path
-from playwright.async_api import async_playwright
 from datetime import datetime
 import random
 import traceback
+import time
+from comment_dedup import CommentDeduper
+from comment_api import CommentApiClient, COMMENT_API_ENDPOINTS, default_rate_limiter
+from endpoint_health import default_endpoint_health, classify_status, OUTCOME_OK, OUTCOME_EMPTY, OUTCOME_ERROR
+from comment_parser import parse_comment_body, iter_comments, normalize_comment
+from comment_record import CommentRecord
+from comment_buffer import CommentBuffer
+from resource_router import ResourceRouter
+from wait_strategy import WaitStrategy
+from strategy_stats import default_strategy_stats
+from instrumentation import InterceptInstrumentation
+import metrics
+from replay import fetch_url
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+def newest_comment(comments):
+    """一批原始评论中 creationTime 最新的一条，都没有时间时返回 None"""
+    timed = [c for c in comments if isinstance(c.get('creationTime'), str)]
+    return max(timed, key=lambda c: c['creationTime']) if timed else None
+
 class JDCommentScraper:
-    def __init__(self, headless=False, user_data_dir="jd_user_data", timeout=90000, test_mode=False):
+    def __init__(self, headless=False, user_data_dir="jd_user_data", timeout=90000, test_mode=False, api_first=True,
+                 api_workers=4, page_cursors=None, block_resources=True, router_config=None, watermark=None,
+                 endpoint_health=None, strategy_stats=None, instrumentation_config=None, buffer_config=None,
+                 api_scores=(0,)):
         # 基本配置
         self.headless = headless
         self.user_data_dir = Path(user_data_dir).absolute()
         self.user_data_dir.mkdir(exist_ok=True)
 
         # 浏览器相关
+        self.playwright = None
         self.browser = None
         self.context = None
         self.page = None
         self.timeout = timeout
         
         # 数据存储
-        self.captured_comments = []
+        # 内存有界的评论缓冲区，超出部分溢出到磁盘，用完后调用 captured_comments.close() 删除溢出文件
+        self.captured_comments = CommentBuffer(**(buffer_config or {}))
+        # 与captured_comments并行维护的去重索引
+        self.deduper = CommentDeduper()
         # 更新京东评论API的匹配模式，增加更多可能的模式
         self.comment_api_pattern = re.compile(r'(comment\?callback=fetchJSON_comment|club\.jd\.com/comment/skuProductPageComments\.action|club\.jd\.com/comment/productPageComments\.action|getCommentListWithCard|productapi\.yiyaojd\.com|pop/commentServer)')
         self.test_mode = test_mode
         
+        # 拦截图片、字体等非必要资源，评论接口始终放行
+        self.resource_router = ResourceRouter(
+            allow_pattern=self.comment_api_pattern, **(router_config or {})
+        ) if block_resources else None
+        
+        # 评论接口直连配置，限速器在进程内所有爬虫实例间共享
+        self.api_first = api_first
+        self.api_workers = api_workers
+        # 直连时请求的评分筛选，每多一个筛选请求数成倍增加，默认只请求全部评论(0)
+        self.api_scores = tuple(api_scores)
+        self.rate_limiter = default_rate_limiter
+        # 各评论接口的熔断器和自适应限速，同样在进程内共享
+        self.endpoint_health = endpoint_health or default_endpoint_health
+        # 各接口和选择器按商品分组的历史成功率和耗时，决定尝试顺序
+        self.strategy_stats = strategy_stats or default_strategy_stats
+        # 分页断点 {评分筛选: 下一页页码}，传入上次的值可续爬
+        self.page_cursors = page_cursors if page_cursors is not None else {}
+        # 每成功获取一页调用 on_checkpoint(page_cursors)，用于持久化断点
+        self.on_checkpoint = None
+        self.last_crawl_result = None
+        self.comment_summary = None
+        # 增量爬取水位线 {'comment_id': 最新评论ID, 'creation_time': 最新评论时间}
+        self.watermark = watermark
+        
         # 记录API请求信息
         self.api_requests = []
+        
+        # 评论到达事件驱动的等待策略
+        self.waiter = WaitStrategy()
+        
+        # 评论请求处理路径的计数器和抽样调试采集
+        self.instrumentation = InterceptInstrumentation(**(instrumentation_config or {}))
+        
+        # 离线回放：recorder 保存拦截到的响应，replay_server 代替京东响应评论请求
+        self.recorder = None
+        self.replay_server = None
+        # analysis_pool.AnalysisPool，设置后较大的评论响应交给工作进程解析
+        self.analysis_pool = None
+
+    async def parse_body(self, body):
+        """解析评论响应体，配置了分析工作池时由它决定是否交给工作进程"""
+        if self.analysis_pool is not None:
+            return await self.analysis_pool.parse_async(body)
+        return parse_comment_body(body)
 
     async def setup(self):
         """设置Playwright浏览器实例，修复版本"""
+        # 只有启动浏览器时才需要 Playwright，解析、去重和离线基准测试不依赖它
+        from playwright.async_api import async_playwright
         try:
-            playwright = await async_playwright().start()
+            self.playwright = await async_playwright().start()
             
             # 精简浏览器启动参数，移除--user-data-dir
             browser_args = [
@@ -54,7 +121,7 @@ class JDCommentScraper:
             ]
             
             # 使用persistent_context方式启动浏览器
-            self.context = await playwright.chromium.launch_persistent_context(
+            self.context = await self.playwright.chromium.launch_persistent_context(
                 user_data_dir=str(self.user_data_dir),
                 headless=self.headless,
                 args=browser_args,
@@ -69,7 +136,7 @@ class JDCommentScraper:
             """)
             
             # 设置路由处理
-            await self.context.route(self.comment_api_pattern, self.intercept_comments)
+            await self.install_routes()
             
             # 创建新页面
             self.page = await self.context.new_page()
@@ -88,137 +155,221 @@ class JDCommentScraper:
                     await self.context.close()
                 except:
                     pass
+            await self.stop_playwright()
             raise e
 
+    async def install_routes(self):
+        """注册评论拦截路由和资源拦截路由"""
+        await self.context.route(self.comment_api_pattern, self.intercept_comments)
+        # 资源路由后注册、先执行，评论接口请求由它回落给评论拦截路由
+        if self.resource_router:
+            self.resource_router.reset()
+            await self.resource_router.install(self.context)
+
+    async def remove_routes(self):
+        """移除 install_routes 注册的路由"""
+        if self.resource_router:
+            await self.resource_router.uninstall(self.context)
+        await self.context.unroute(self.comment_api_pattern, self.intercept_comments)
+
+    def log_wait_stats(self):
+        logger.info(f"等待统计: {self.waiter.summary()}")
+
+    def log_resource_stats(self):
+        if self.resource_router:
+            logger.info(f"资源拦截统计: {self.resource_router.summary()}")
+        logger.info(f"评论请求统计: {self.instrumentation.summary()}")
+
     async def intercept_comments(self, route, request):
-        """拦截评论请求并处理响应"""
+        """拦截评论请求并处理响应
+
+        每个评论请求都会经过这里，只更新计数器，调试信息由 instrumentation 按级别抽样采集。
+        """
+        stats = self.instrumentation
+        url = request.url
         try:
-            # 记录拦截到的URL
-            url = request.url
-            logger.info(f"拦截到评论请求: {url}")
             self.api_requests.append(url)
+            stats.requests += 1
             
-            # 记录请求头部信息用于调试
-            headers = request.headers
-            logger.info(f"请求头部: {headers}")
-            
-            # 继续请求
-            await route.continue_()
+            # 放行请求并等待响应
+            result = await self.fetch_intercepted(route, request)
             
-            # 等待响应
-            response = await request.response()
-            
-            if not response:
-                logger.warning(f"未获取到响应: {url}")
+            if result is None:
+                stats.no_response += 1
+                logger.warning("未获取到响应: %s", url)
                 return
                 
-            if response.ok:
-                logger.info(f"成功获取响应: {url}, 状态码: {response.status}")
-                try:
-                    body = await response.text()
-                    logger.info(f"响应大小: {len(body)} 字节")
-                    
-                    # 保存第一部分响应用于调试
-                    debug_body = body[:500] + ("..." if len(body) > 500 else "")
-                    logger.info(f"响应内容片段: {debug_body}")
-                    
-                    # 处理JSONP响应
-                    if 'fetchJSON_comment' in body:
-                        logger.info("检测到JSONP响应，提取JSON数据")
-                        json_str = re.search(r'fetchJSON_comment\d*\((.*)\);', body)
-                        if json_str:
-                            body = json_str.group(1)
-                            logger.info("JSONP提取成功")
-                        else:
-                            logger.warning("JSONP格式提取失败")
-                    
-                    # 尝试解析JSON
-                    try:
-                        data = json.loads(body)
-                        logger.info(f"JSON解析成功，数据结构: {list(data.keys())}")
-                        
-                        # 尝试多种可能的评论字段
-                        comment_fields = ['comments', 'data', 'commentList', 'list']
-                        comments = None
-                        
-                        for field in comment_fields:
-                            if field in data:
-                                if isinstance(data[field], list):
-                                    comments = data[field]
-                                    logger.info(f"从字段 '{field}' 找到评论列表，包含 {len(comments)} 条评论")
-                                    break
-                                elif isinstance(data[field], dict) and 'comments' in data[field]:
-                                    comments = data[field]['comments']
-                                    logger.info(f"从嵌套字段 '{field}.comments' 找到评论列表，包含 {len(comments)} 条评论")
-                                    break
-                        
-                        if not comments and 'commentInfoList' in data:
-                            comments = data['commentInfoList']
-                            logger.info(f"从字段 'commentInfoList' 找到评论列表，包含 {len(comments)} 条评论")
-                        
-                        if comments:
-                            logger.info(f"成功捕获 {len(comments)} 条评论")
-                            
-                            for comment in comments:
-                                # 尝试多种可能的内容字段
-                                content = None
-                                for content_field in ['content', 'commentData', 'commentContent', 'comment']:
-                                    if content_field in comment and comment[content_field]:
-                                        content = comment[content_field]
-                                        break
-                                
-                                if content:  # 只添加有内容的评论
-                                    comment_data = {
-                                        'content': content,
-                                        'creationTime': comment.get('creationTime', comment.get('commentTime', comment.get('date', datetime.now().strftime('%Y-%m-%d %H:%M:%S')))),
-                                        'nickname': comment.get('nickname', comment.get('userName', comment.get('userNickName', '匿名用户'))),
-                                        'score': comment.get('score', comment.get('starCount', comment.get('star', 5))),
-                                        'userLevelName': comment.get('userLevelName', comment.get('userLevel', '')),
-                                        'productColor': comment.get('productColor', comment.get('color', '')),
-                                        'productSize': comment.get('productSize', comment.get('size', '')),
-                                        'images': comment.get('images', comment.get('pics', []))
-                                    }
-                                    
-                                    logger.info(f"处理评论: {comment_data['nickname']} - {comment_data['content'][:30]}...")
-                                    
-                                    # 避免重复添加相同评论
-                                    content_exists = any(c['content'] == comment_data['content'] and 
-                                                       c['nickname'] == comment_data['nickname'] 
-                                                       for c in self.captured_comments)
-                                    if not content_exists:
-                                        self.captured_comments.append(comment_data)
-                                        logger.info(f"添加新评论: {comment_data['nickname']} - {comment_data['content'][:30]}...")
-                                    else:
-                                        logger.info("评论已存在，跳过")
-                        else:
-                            logger.warning(f"未在响应中找到评论数据，响应键: {list(data.keys())}")
-                    except json.JSONDecodeError as e:
-                        logger.error(f"JSON解析失败: {e}")
-                        logger.error(f"响应内容片段: {body[:200]}...")
-                except Exception as e:
-                    logger.error(f"处理评论数据时出错: {e}")
-                    logger.error(traceback.format_exc())
-            else:
-                logger.warning(f"请求失败，状态码: {response.status}, URL: {url}")
+            status, body = result
+            if not 200 <= status < 300:
+                stats.record_failure(status)
+                logger.warning("请求失败，状态码: %s, URL: %s", status, url)
+                return
+
+            try:
+                # 按偏移剥离JSONP包裹并一次性解码
+                start_time = time.perf_counter()
+                data = await self.parse_body(body)
+                parse_time = time.perf_counter() - start_time
+                metrics.parse_seconds.observe(parse_time, source='intercept')
+                seen = added = 0
+                if data is not None:
+                    for comment_data in iter_comments(data):
+                        seen += 1
+                        # 避免重复添加相同评论
+                        if self.add_comment(comment_data):
+                            added += 1
+                stats.record_response(len(body), parse_time, seen, added,
+                                      parsed=data is not None)
+                
+                if data is None:
+                    logger.error("JSON解析失败: %s", url)
+                    stats.maybe_capture(url, request.headers, body, note='parse_error')
+                elif not seen:
+                    logger.warning("未在响应中找到评论数据: %s", url)
+                    stats.maybe_capture(url, request.headers, body, note='no_comments')
+                else:
+                    stats.maybe_capture(url, request.headers, body)
+            except Exception as e:
+                logger.error(f"处理评论数据时出错: {e}")
+                logger.error(traceback.format_exc())
         except Exception as e:
             logger.error(f"拦截评论请求失败: {e}")
             logger.error(traceback.format_exc())
 
-    async def load_comments(self, product_url, max_pages=3):
-        """加载商品评论"""
+    async def fetch_intercepted(self, route, request):
+        """放行被拦截的评论请求，返回 (状态码, 响应体)，没有响应时返回 None
+
+        设置了 replay_server 时改由本地回放服务器按夹具响应，不访问京东；
+        设置了 recorder 时把成功的响应保存为夹具。
+        """
+        if self.replay_server:
+            status, body = await asyncio.get_running_loop().run_in_executor(
+                None, fetch_url, self.replay_server.url_for(request.url))
+            await route.fulfill(status=status, body=body, content_type='application/javascript; charset=utf-8')
+            return status, body
+
+        await route.continue_()
+        response = await request.response()
+        if not response:
+            return None
+        body = await response.text() if response.ok else ''
+        if self.recorder and response.ok:
+            self.recorder.record(request.url, response.status, body)
+        return response.status, body
+
+    def build_comment_data(self, comment):
+        """把接口返回的原始评论转换为统一格式，没有内容时返回 None"""
+        return normalize_comment(comment)
+
+    def add_comment(self, comment_data):
+        """加入已捕获评论，重复评论返回 False"""
+        if self.deduper.add(comment_data):
+            self.captured_comments.append(comment_data)
+            self.waiter.notify()
+            metrics.comments_captured_total.inc()
+            return True
+        metrics.comments_deduplicated_total.inc(stage='capture')
+        return False
+
+    def handle_comments(self, comments):
+        """处理一批原始评论，返回新增条数"""
+        added = 0
+        for comment in comments:
+            comment_data = self.build_comment_data(comment)
+            if comment_data and self.add_comment(comment_data):
+                added += 1
+        return added
+
+    def create_api_client(self, product_id):
+        """创建评论接口客户端，接口按该商品分组的历史表现排序"""
+        def on_endpoint_result(endpoint, success, latency):
+            self.strategy_stats.record(product_id, 'api', endpoint, success, latency)
+
+        return CommentApiClient(
+            self.context.request,
+            rate_limiter=self.rate_limiter,
+            endpoint_health=self.endpoint_health,
+            endpoint_order=self.strategy_stats.order(product_id, 'api', COMMENT_API_ENDPOINTS),
+            on_endpoint_result=on_endpoint_result,
+            replay_server=self.replay_server,
+            recorder=self.recorder
+        )
+
+    async def fetch_comments_via_api(self, product_id, max_pages=3):
+        """通过浏览器上下文自带的请求客户端，按评分筛选并发分页请求评论接口，返回新增评论数
+
+        分页进度记录在 self.page_cursors 中，再次调用时从断点继续。
+        还没有水位线时用本次获取到的最新评论建立，不额外请求时间倒序的页面。
+        """
+        client = self.create_api_client(product_id)
+        added = 0
+        fetched = []
+
+        def on_page(score, page, comments):
+            nonlocal added
+            added += self.handle_comments(comments)
+            fetched.append(newest_comment(comments))
+            if self.on_checkpoint:
+                self.on_checkpoint(self.page_cursors)
+
+        result = await client.crawl(
+            product_id,
+            max_pages=max_pages,
+            scores=self.api_scores,
+            cursors=self.page_cursors,
+            workers=self.api_workers,
+            on_page=on_page
+        )
+        self.last_crawl_result = result
+        if result['summary']:
+            self.comment_summary = result['summary']
+        # 已有水位线说明是增量未衔接后的完整爬取，不能越过中间没取到的评论
+        if not self.watermark:
+            self.advance_watermark([comment for comment in fetched if comment])
+        return added
+
+    def advance_watermark(self, comments):
+        """用一批原始评论中最新的一条推进 self.watermark"""
+        newest = newest_comment(comments)
+        if newest and (not self.watermark or newest['creationTime'] > (self.watermark.get('creation_time') or '')):
+            self.watermark = {'comment_id': newest.get('id'), 'creation_time': newest['creationTime']}
+
+    async def fetch_new_comments(self, product_id, since=None, max_pages=100, since_id=None):
+        """增量刷新：按时间倒序只请求水位线之后的评论，返回 (新增评论数, 是否已衔接上水位线)
+
+        只有衔接上原水位线时才用获取到的最新评论推进 self.watermark，
+        否则水位线保持不变，中间没取到的评论留给下次爬取。
+        """
+        client = self.create_api_client(product_id)
+        added = 0
+
+        def on_page(page, comments):
+            nonlocal added
+            added += self.handle_comments(comments)
+
+        new_comments, reached = await client.fetch_since(product_id, since, max_pages=max_pages,
+                                                         on_page=on_page, since_id=since_id)
+        if reached:
+            self.advance_watermark(new_comments)
+        return added, reached
+
+    async def load_comments(self, product_url, max_pages=3, incremental=False):
+        """加载商品评论
+
+        incremental 为真且已有水位线时，只按时间倒序翻页到水位线为止。
+        """
         if self.test_mode:
             logger.info("测试模式：生成模拟评论数据")
             for i in range(10):
-                comment_data = {
-                    'content': f"这是一条测试评论 {i+1}，测试商品质量很好！",
-                    'creationTime': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                    'nickname': f"测试用户_{i+1}",
-                    'score': random.randint(1, 5),
-                    'userLevelName': "普通会员",
-                    'productColor': "默认",
-                    'productSize': "默认",
-                    'images': []
-                }
+                comment_data = CommentRecord(
+                    content=f"这是一条测试评论 {i+1}，测试商品质量很好！",
+                    creation_time=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                    nickname=f"测试用户_{i+1}",
+                    score=random.randint(1, 5),
+                    user_level="普通会员",
+                    color="默认",
+                    size="默认"
+                )
                 self.captured_comments.append(comment_data)
             return self.captured_comments
 
@@ -233,6 +384,29 @@ class JDCommentScraper:
         product_id = sku_id.group(1)
         logger.info(f"提取到商品ID: {product_id}")
         
+        # 增量模式只请求水位线之后的评论
+        if incremental and self.watermark and self.context:
+            added, reached = await self.fetch_new_comments(
+                product_id,
+                since=self.watermark.get('creation_time'),
+                since_id=self.watermark.get('comment_id')
+            )
+            logger.info(f"增量模式新增 {added} 条评论，当前水位线: {self.watermark}")
+            if reached:
+                return self.captured_comments
+            logger.warning("增量模式未衔接上水位线，改为完整爬取")
+        
+        # 优先直接请求评论接口，失败时再退回浏览器导航
+        if self.api_first and self.context:
+            try:
+                added = await self.fetch_comments_via_api(product_id, max_pages)
+                if added > 0:
+                    logger.info(f"评论接口直连成功获取 {added} 条评论")
+                    return self.captured_comments
+                logger.info("评论接口直连未获取到评论，退回浏览器导航方式")
+            except Exception as e:
+                logger.warning(f"评论接口直连失败，退回浏览器导航方式: {e}")
+        
         # 重试机制
         max_retries = 3
         retry_count = 0
@@ -251,41 +425,66 @@ class JDCommentScraper:
                 
                 # 首先访问原始商品页面
                 logger.info(f"访问商品页面: {product_url}")
-                await self.page.goto(product_url, **timeout_option)
+                mark = self.waiter.mark()
+                with metrics.page_load_seconds.time():
+                    await self.page.goto(product_url, **timeout_option)
                 
-                # 等待页面加载
-                logger.info("等待页面完全加载")
-                await asyncio.sleep(5)
+                # 等待网络空闲，不再固定等待
+                logger.info("等待页面网络空闲")
+                await self.waiter.settle(self.page)
                 
                 # 记录页面标题，用于确认是否正确加载
                 title = await self.page.title()
                 logger.info(f"页面标题: {title}")
                 
-                # 模拟人类滚动行为
+                # 模拟人类滚动行为，滚动触发的评论请求一到达就结束
                 logger.info("模拟滚动行为")
                 for i in range(5):
                     await self.page.evaluate(f"window.scrollTo(0, {(i+1) * 800})")
-                    await asyncio.sleep(1)
+                    if await self.waiter.wait_for_comments(mark, timeout=self.waiter.min_timeout, label='scroll'):
+                        break
+                
+                if len(self.captured_comments) > 0:
+                    logger.info(f"页面加载后已捕获 {len(self.captured_comments)} 条评论")
+                    self.log_wait_stats()
+                    return self.captured_comments
                 
                 # 构建并直接访问多个评论API URL
-                comment_api_urls = [
-                    f"https://club.jd.com/comment/productPageComments.action?callback=fetchJSON_comment98&productId={product_id}&score=0&sortType=5&page=0&pageSize=10&isShadowSku=0",
-                    f"https://club.jd.com/comment/skuProductPageComments.action?callback=fetchJSON_comment98&productId={product_id}&score=0&sortType=5&page=0&pageSize=10",
-                    f"https://api.m.jd.com/api?functionId=getCommentListWithCard&body=%7B%22productId%22:%22{product_id}%22,%22score%22:0,%22sortType%22:5,%22page%22:0,%22pageSize%22:10%7D"
-                ]
+                comment_api_urls = {
+                    'productPageComments': f"https://club.jd.com/comment/productPageComments.action?callback=fetchJSON_comment98&productId={product_id}&score=0&sortType=5&page=0&pageSize=10&isShadowSku=0",
+                    'skuProductPageComments': f"https://club.jd.com/comment/skuProductPageComments.action?callback=fetchJSON_comment98&productId={product_id}&score=0&sortType=5&page=0&pageSize=10",
+                    'getCommentListWithCard': f"https://api.m.jd.com/api?functionId=getCommentListWithCard&body=%7B%22productId%22:%22{product_id}%22,%22score%22:0,%22sortType%22:5,%22page%22:0,%22pageSize%22:10%7D"
+                }
                 
-                # 逐个尝试访问评论API
-                for api_url in comment_api_urls:
+                # 按历史表现逐个尝试访问评论API，跳过已熔断的接口
+                for endpoint in self.strategy_stats.order(product_id, 'endpoint', comment_api_urls):
+                    api_url = comment_api_urls[endpoint]
+                    health = self.endpoint_health.get(endpoint)
+                    if not health.allow():
+                        logger.info(f"评论接口 {endpoint} 已熔断，跳过")
+                        continue
                     logger.info(f"尝试访问评论API: {api_url}")
+                    await health.acquire()
+                    start_time = time.monotonic()
                     try:
-                        await self.page.goto(api_url, timeout=30000)
-                        await asyncio.sleep(3)
+                        mark = self.waiter.mark()
+                        response = await self.page.goto(api_url, timeout=30000)
+                        arrived = await self.waiter.wait_for_comments(mark, label='api_url')
+                        if response and not response.ok:
+                            outcome = classify_status(response.status)
+                        else:
+                            outcome = OUTCOME_OK if arrived else OUTCOME_EMPTY
+                        health.record(outcome, time.monotonic() - start_time)
+                        self.strategy_stats.record(product_id, 'endpoint', endpoint,
+                                                   len(self.captured_comments) > 0, time.monotonic() - start_time)
                         
                         # 如果已经捕获到评论，则跳出循环
                         if len(self.captured_comments) > 0:
                             logger.info(f"已成功捕获 {len(self.captured_comments)} 条评论，停止尝试其他API")
                             break
                     except Exception as e:
+                        health.record(OUTCOME_ERROR, time.monotonic() - start_time)
+                        self.strategy_stats.record(product_id, 'endpoint', endpoint, False, time.monotonic() - start_time)
                         logger.warning(f"访问评论API出错: {e}")
                 
                 # 如果直接访问API未成功，尝试使用XHR请求
@@ -294,7 +493,7 @@ class JDCommentScraper:
                     
                     # 回到商品页面
                     await self.page.goto(product_url, **timeout_option)
-                    await asyncio.sleep(3)
+                    await self.waiter.settle(self.page)
                     
                     # 模拟点击评论标签触发XHR请求
                     comment_selectors = [
@@ -307,7 +506,8 @@ class JDCommentScraper:
                         "//li[contains(@class, 'curr')]/following-sibling::li"
                     ]
                     
-                    for selector in comment_selectors:
+                    for selector in self.strategy_stats.order(product_id, 'selector', comment_selectors):
+                        start_time = time.monotonic()
                         try:
                             logger.info(f"尝试点击评论选择器: {selector}")
                             try:
@@ -323,34 +523,41 @@ class JDCommentScraper:
                                 if element:
                                     # 先滚动到元素位置
                                     await element.scroll_into_view_if_needed()
-                                    await asyncio.sleep(1)
                                     
-                                    # 点击元素
+                                    # 点击元素后滚动页面，等待触发的评论请求
+                                    mark = self.waiter.mark()
                                     await element.click()
                                     logger.info(f"成功点击评论选择器: {selector}")
-                                    await asyncio.sleep(5)
-                                    
-                                    # 再次滚动页面
                                     await self.page.evaluate("window.scrollBy(0, 500)")
-                                    await asyncio.sleep(2)
+                                    await self.waiter.wait_for_comments(mark, label='click')
                                     
                                     # 如果已经捕获到评论，则跳出循环
                                     if len(self.captured_comments) > 0:
                                         logger.info(f"点击后成功捕获 {len(self.captured_comments)} 条评论")
+                                        self.strategy_stats.record(product_id, 'selector', selector, True,
+                                                                   time.monotonic() - start_time)
                                         break
                             except Exception as e:
                                 logger.warning(f"点击选择器 {selector} 失败: {e}")
+                            self.strategy_stats.record(product_id, 'selector', selector, False,
+                                                       time.monotonic() - start_time)
                         except Exception as e:
                             logger.warning(f"处理选择器 {selector} 时出错: {e}")
                 
                 # 最后检查是否获取到评论
                 if len(self.captured_comments) > 0:
                     logger.info(f"成功获取 {len(self.captured_comments)} 条评论")
+                    self.log_wait_stats()
                     return self.captured_comments
+                elif self.endpoint_health.all_open(comment_api_urls):
+                    # 所有评论接口都在熔断中，重试只会继续触发限流
+                    logger.warning("所有评论接口都已熔断，放弃重试")
+                    self.log_wait_stats()
+                    return []
                 else:
                     logger.warning("尝试所有方法后仍未获取到评论，重试中...")
                     retry_count += 1
-                    await asyncio.sleep(2)
+                    await self.waiter.backoff(retry_count)
                     
             except Exception as e:
                 retry_count += 1
@@ -359,20 +566,23 @@ class JDCommentScraper:
                 
                 if retry_count < max_retries:
                     logger.info(f"重试第 {retry_count} 次 (共{max_retries}次)")
-                    await asyncio.sleep(2)
+                    await self.waiter.backoff(retry_count)
                 else:
                     logger.error(f"已重试 {max_retries} 次，仍然失败")
                     # 记录失败原因和已发出的请求
                     logger.info(f"失败分析 - 已发出的API请求: {len(self.api_requests)}")
                     for i, req in enumerate(self.api_requests):
                         logger.info(f"请求 {i+1}: {req}")
+                    self.log_wait_stats()
                     return []
         
+        self.log_wait_stats()
         return self.captured_comments
 
     async def close(self):
         """关闭浏览器"""
         try:
+            self.log_resource_stats()
             if self.page:
                 try:
                     await self.page.close()
@@ -393,6 +603,19 @@ class JDCommentScraper:
                 except:
                     pass
                 self.browser = None
+
+            await self.stop_playwright()
+            # 删除评论缓冲区的溢出文件
+            self.captured_comments.close()
         except Exception as e:
             logger.error(f"关闭浏览器时出错: {e}")
-            logger.error(traceback.format_exc())
\ No newline at end of file
+            logger.error(traceback.format_exc())
+
+    async def stop_playwright(self):
+        """停止Playwright驱动进程，避免每次setup都遗留一个node进程"""
+        if self.playwright:
+            try:
+                await self.playwright.stop()
+            except Exception as e:
+                logger.warning(f"停止Playwright驱动时出错 (忽略): {e}")
+            self.playwright = None
@@ -1,13 +1,30 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory
 import asyncio
-import json
 import re
 import traceback
 import logging
-from jd import JDCommentScraper
-import mysql.connector
-from flask_socketio import SocketIO
 import threading
+import time
+from jd import JDCommentScraper
+from browser_pool import BrowserPool, launch_context
+from crawl_scheduler import CrawlScheduler
+from db_writer import CommentWriter
+from comment_dedup import BloomFilterStore
+from comment_emitter import CommentEmitter, product_room
+from crawl_cache import CrawlCache
+from crawl_batch import BatchTracker, batch_room
+from job_store import JobStore, JobCheckpointer
+from profile_store import ProfileStore
+from endpoint_health import EndpointHealthRegistry
+from strategy_stats import StrategyStats
+from replay import FixtureRecorder, ReplayServer
+from sentiment import SentimentScorer
+from analysis_pool import AnalysisPool
+from keyword_engine import KeywordEngine
+import metrics
+from comment_parser import find_comment_list, normalize_comment
+from comment_record import CommentRecord
+from flask_socketio import SocketIO, join_room, leave_room
 from datetime import datetime
 from flask_cors import CORS
 from pathlib import Path
@@ -55,99 +72,256 @@ db_config = {
     "database": "SEP"
 }
 
-# 初始化一个记录正在进行的爬取任务的集合
-active_crawl_tasks = set()
-# 为集合添加线程锁，确保线程安全
-task_lock = threading.Lock()
+# 评论推送配置，评论按商品房间批量推送
+emitter_config = {
+    "batch_size": 20,
+    "flush_interval": 0.5
+}
+
+# 按商品房间批量推送评论和进度，只有订阅了该商品的客户端会收到
+comment_emitter = CommentEmitter(socketio, **emitter_config)
+
+# 评论批量写入配置
+db_writer_config = {
+    "pool_size": 5,
+    "batch_size": 200,
+    "flush_interval": 1.0
+}
+
+# 按商品持久化的已入库评论布隆过滤器
+bloom_store = BloomFilterStore(Path(__file__).parent / "jd_user_data" / "dedup")
+
+# 爬取结果缓存配置，ttl 秒内重复请求直接返回缓存，过期后增量刷新
+crawl_cache_config = {
+    "base_dir": str(Path(__file__).parent / "jd_user_data" / "cache"),
+    "capacity": 64,
+    "ttl": 1800
+}
+
+crawl_cache = CrawlCache(**crawl_cache_config)
+
+# 浏览器池配置
+browser_pool_config = {
+    "size": 2,
+    "base_dir": str(Path(__file__).parent / "jd_user_data"),
+    "headless": True,
+    "max_uses": 20,
+    "acquire_timeout": 60
+}
+
+# 共享浏览器配置目录和登录状态快照配置，取代按商品创建的 profile_{商品ID} 目录
+profile_store_config = {
+    "base_dir": str(Path(__file__).parent / "jd_user_data"),
+    "size": browser_pool_config["size"],
+    "save_interval": 60,
+    "max_idle_days": 7
+}
+
+profile_store = ProfileStore(**profile_store_config)
+
+# 常驻浏览器池，服务启动时在调度器的事件循环中预热，池中上下文共享登录状态快照
+browser_pool = BrowserPool(**browser_pool_config,
+                           on_launch=profile_store.restore_state,
+                           on_release=profile_store.save_state)
+
+# 资源拦截配置，参数见 resource_router.ResourceRouter
+resource_router_config = {
+    "block_stylesheets": False
+}
+
+# 评论接口熔断和自适应限速配置，参数见 endpoint_health.EndpointHealth
+endpoint_health_config = {
+    "rate": 3.0,
+    "min_rate": 0.2,
+    "max_rate": 10.0,
+    "failure_threshold": 5,
+    "open_timeout": 30.0,
+    "max_open_timeout": 600.0
+}
+
+# 所有爬取任务共享的评论接口健康状态
+endpoint_health = EndpointHealthRegistry(**endpoint_health_config)
+
+# 评论获取策略统计配置，按商品ID前 prefix_len 位分组记录各接口和选择器的成功率与耗时
+strategy_stats_config = {
+    "path": str(Path(__file__).parent / "jd_user_data" / "strategy_stats.json"),
+    "prefix_len": 4,
+    "min_attempts": 3,
+    "save_interval": 60
+}
+
+strategy_stats = StrategyStats(**strategy_stats_config)
+
+# 评论请求计数和抽样调试采集配置，只有日志级别达到 DEBUG 时才按 sample_rate 采集请求头和响应片段
+instrumentation_config = {
+    "sample_rate": 0.01,
+    "capture_dir": str(Path(__file__).parent / "jd_user_data" / "captures"),
+    "max_captures": 20
+}
+
+# 离线回放配置：record_dir 不为空时把拦截到的评论响应保存为夹具，
+# replay_dir 不为空时评论请求改由本地回放服务器按夹具响应，不访问京东
+replay_config = {
+    "record_dir": None,
+    "replay_dir": None
+}
+
+fixture_recorder = FixtureRecorder(replay_config["record_dir"]) if replay_config["record_dir"] else None
+replay_server = ReplayServer(replay_config["replay_dir"]) if replay_config["replay_dir"] else None
+
+# 评论接口直连配置：workers 个协程并发分页；scores 为请求的评分筛选（0全部 1差评 2中评 3好评 4晒图 5追评），
+# 每多一个筛选请求数成倍增加，默认只请求全部评论，需要按评分补全时再加入其他筛选
+comment_api_config = {
+    "workers": 4,
+    "scores": (0,)
+}
+
+# 每个爬取任务的评论缓冲区配置，内存中最多保留 capacity 条，超出部分溢出到 spill_dir
+comment_buffer_config = {
+    "capacity": 5000,
+    "spill_dir": str(Path(__file__).parent / "jd_user_data" / "spill")
+}
+
+# 爬取调度配置，并发上限默认与浏览器池大小一致
+scheduler_config = {
+    "concurrency": browser_pool_config["size"]
+}
+
+# 持久化任务表配置，resume_on_start 为真时服务启动后恢复上次未完成的任务
+job_store_config = {
+    "path": str(Path(__file__).parent / "jd_user_data" / "crawl_jobs.sqlite3"),
+    "resume_on_start": True
+}
+
+job_store = JobStore(job_store_config["path"])
+
+# 批量爬取配置，批量任务默认优先级低于单个商品的交互式请求
+batch_config = {
+    "max_items": 5000,
+    "default_priority": -1
+}
 
 # 创建爬虫类的扩展，增加实时消息推送功能
 class WebSocketJDScraper(JDCommentScraper):
-    def __init__(self, product_id, product_name, headless=True, test_mode=False):
-        # 确保有一个独立的user_data_dir路径
-        user_data_dir = Path(__file__).parent / "jd_user_data" / f"profile_{product_id}"
-        user_data_dir.mkdir(parents=True, exist_ok=True)
-        super().__init__(headless=headless, test_mode=test_mode, user_data_dir=str(user_data_dir))
+    def __init__(self, product_id, product_name, headless=True, test_mode=False, browser_pool=None,
+                 watermark=None, page_cursors=None):
+        # 不再为每个商品创建配置目录，未使用浏览器池时在 setup 中租用共享目录
+        super().__init__(headless=headless, test_mode=test_mode, user_data_dir=str(profile_store.base_dir),
+                         router_config=resource_router_config, watermark=watermark, page_cursors=page_cursors,
+                         endpoint_health=endpoint_health, strategy_stats=strategy_stats,
+                         instrumentation_config=instrumentation_config, buffer_config=comment_buffer_config,
+                         api_workers=comment_api_config["workers"], api_scores=comment_api_config["scores"])
         self.product_id = product_id
         self.product_name = product_name
         self.total_comments_count = 0
+        # 挂载该商品的布隆过滤器，记录已确认入库的评论，只用于统计可能重复的评论
+        self.deduper.bloom = bloom_store.load(product_id)
+        comment_writer.add_batch_listener(self.on_batch_written)
+        self.recorder = fixture_recorder
+        self.replay_server = replay_server
+        self.analysis_pool = analysis_pool
+        # 浏览器池及当前借用的上下文
+        self.browser_pool = browser_pool
+        self.lease = None
+        # 未使用浏览器池时租用的共享配置目录
+        self.profile_dir = None
     
     # 重写拦截评论方法，添加实时推送
     async def intercept_comments(self, route, request):
+        stats = self.instrumentation
         try:
-            await route.continue_()
-            response = await request.response()
+            stats.requests += 1
+            result = await self.fetch_intercepted(route, request)
             
-            if response and response.ok:
+            if result is None:
+                stats.no_response += 1
+            elif not 200 <= result[0] < 300:
+                stats.record_failure(result[0])
+            else:
                 try:
-                    body = await response.text()
+                    body = result[1]
                     
-                    # 处理JSONP响应
-                    if 'fetchJSON_comment' in body:
-                        json_str = re.search(r'fetchJSON_comment\d*\((.*)\);', body)
-                        if json_str:
-                            body = json_str.group(1)
+                    # 按偏移剥离JSONP包裹并一次性解码
+                    start_time = time.perf_counter()
+                    data = await self.parse_body(body)
+                    parse_time = time.perf_counter() - start_time
+                    metrics.parse_seconds.observe(parse_time, source='intercept')
+                    if data is None:
+                        stats.record_response(len(body), parse_time, 0, 0, parsed=False)
+                        stats.maybe_capture(request.url, request.headers, body, note='parse_error')
+                        raise ValueError("评论响应无法解析为JSON")
                     
-                    data = json.loads(body)
-                    
-                    if 'comments' in data:
-                        comments = data['comments']
-                        self.total_comments_count += len(comments)
-                        logger.info(f"已爬取 {self.total_comments_count} 条评论")
-                        socketio.emit('progress', {'status': 'crawling', 'count': self.total_comments_count})
-                        
-                        for comment in comments:
-                            if comment.get('content'):  # 只添加有内容的评论
-                                comment_data = {
-                                    'content': comment.get('content', ''),
-                                    'creationTime': comment.get('creationTime', ''),
-                                    'nickname': comment.get('nickname', ''),
-                                    'score': comment.get('score', 0),
-                                    'userLevelName': comment.get('userLevelName', ''),
-                                    'productColor': comment.get('productColor', ''),
-                                    'productSize': comment.get('productSize', ''),
-                                    'images': comment.get('images', []),
-                                    'product_id': self.product_id,
-                                    'product_name': self.product_name
-                                }
-                                
-                                # 实时推送新评论
-                                socketio.emit('new_comment', comment_data)
-                                
-                                # 避免重复添加相同评论
-                                content_exists = any(c['content'] == comment_data['content'] and 
-                                                   c['nickname'] == comment_data['nickname'] 
-                                                   for c in self.captured_comments)
-                                if not content_exists:
-                                    self.captured_comments.append(comment_data)
-                                    # 立即保存到数据库
-                                    save_comment_to_db(comment_data)
+                    _, comments = find_comment_list(data)
+                    added = self.handle_comments(comments) if comments else 0
+                    stats.record_response(len(body), parse_time, len(comments or ()), added)
+                    stats.maybe_capture(request.url, request.headers, body)
                 except Exception as e:
                     logger.error(f"处理拦截的评论数据时出错: {e}")
                     logger.error(traceback.format_exc())
-                    socketio.emit('error', {'message': f'处理评论数据错误: {str(e)}'})
+                    comment_emitter.emit('error', {'message': f'处理评论数据错误: {str(e)}'}, self.product_id)
         except Exception as e:
             logger.error(f"拦截评论请求失败: {e}")
             logger.error(traceback.format_exc())
-            socketio.emit('error', {'message': f'拦截评论请求失败: {str(e)}'})
+            comment_emitter.emit('error', {'message': f'拦截评论请求失败: {str(e)}'}, self.product_id)
+
+    def preload_comments(self, comments):
+        """载入缓存中的评论并立即推送，这些评论已经入库，不再写数据库"""
+        for comment_data in map(CommentRecord.from_dict, comments):
+            if self.deduper.add(comment_data):
+                self.captured_comments.append(comment_data)
+                comment_emitter.add(self.product_id, comment_data)
+        comment_emitter.flush(self.product_id)
+
+    def build_comment_data(self, comment):
+        """转换为统一格式并附带商品信息"""
+        return normalize_comment(comment, self.product_id, self.product_name)
+
+    def add_comment(self, comment_data):
+        """新评论实时推送并写入数据库"""
+        if not super().add_comment(comment_data):
+            return False
+        
+        # 新评论进入该商品房间的推送缓冲区，按批推送
+        comment_emitter.add(self.product_id, comment_data)
+        
+        # 布隆过滤器存在误判，不能据此跳过入库，重复评论由数据库按内容指纹过滤
+        if self.deduper.is_stored(comment_data):
+            metrics.comments_likely_stored_total.inc()
+        save_comment_to_db(comment_data)
+        return True
+
+    def on_batch_written(self, batch):
+        """写入器的批次回调：批次写入成功后才把本商品新增的评论记入布隆过滤器"""
+        for comment_data in batch:
+            if comment_data.get('product_id') == self.product_id:
+                self.deduper.mark_stored(comment_data)
+
+    def handle_comments(self, comments):
+        """拦截和接口直连两条路径共用的评论处理入口，推送爬取进度"""
+        self.total_comments_count += len(comments)
+        logger.debug("已爬取 %d 条评论", self.total_comments_count)
+        comment_emitter.emit('progress', {'status': 'crawling', 'count': self.total_comments_count}, self.product_id)
+        return super().handle_comments(comments)
 
     async def setup(self):
-        """修复版的浏览器设置方法"""
+        """修复版的浏览器设置方法，优先从浏览器池借用预热好的上下文"""
+        if self.browser_pool:
+            self.lease = await self.browser_pool.acquire()
+            try:
+                self.context = self.lease.context
+                await self.install_routes()
+                self.page = await self.context.new_page()
+                self.page.set_default_timeout(self.timeout)
+            except Exception:
+                await self.release_lease(broken=True)
+                raise
+            self.browser = None
+            return self
+
         try:
-            playwright = await async_playwright().start()
-            
-            # 精简浏览器启动参数，移除--user-data-dir参数
-            browser_args = [
-                '--no-sandbox',
-                '--no-zygote',
-                '--single-process', 
-                '--disable-gpu',
-                '--disable-dev-shm-usage',
-                '--disable-setuid-sandbox',
-                '--disable-accelerated-2d-canvas',
-                '--disable-breakpad',
-                '--window-size=1920,1080',
-                '--start-maximized'
-            ]
+            self.playwright = await async_playwright().start()
+            self.profile_dir = profile_store.lease()
+            self.user_data_dir = self.profile_dir
             
             # 重试机制
             max_retries = 3
@@ -156,43 +330,16 @@ class WebSocketJDScraper(JDCommentScraper):
             while retry_count < max_retries:
                 try:
                     # 使用persistent_context方式启动浏览器
-                    self.context = await playwright.chromium.launch_persistent_context(
-                        user_data_dir=str(self.user_data_dir),
+                    self.context = await launch_context(
+                        self.playwright,
+                        self.user_data_dir,
                         headless=self.headless,
-                        args=browser_args,
-                        viewport={"width": 1920, "height": 1080},
-                        user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
-                        timeout=self.timeout,
-                        ignore_https_errors=True
+                        timeout=self.timeout
                     )
-                    
-                    # 设置默认的额外HTTP头，模拟正常浏览器请求
-                    await self.context.set_extra_http_headers({
-                        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
-                        'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-                        'Cache-Control': 'max-age=0',
-                        'Connection': 'keep-alive',
-                        'Sec-Ch-Ua': '"Chromium";v="122", "Not(A:Brand";v="24", "Google Chrome";v="122"',
-                        'Sec-Ch-Ua-Mobile': '?0',
-                        'Sec-Ch-Ua-Platform': '"macOS"',
-                        'Sec-Fetch-Dest': 'document',
-                        'Sec-Fetch-Mode': 'navigate',
-                        'Sec-Fetch-Site': 'none',
-                        'Sec-Fetch-User': '?1',
-                        'Upgrade-Insecure-Requests': '1'
-                    })
-                    
-                    # 减少JavaScript注入
-                    await self.context.add_init_script("""
-                        Object.defineProperty(navigator, 'webdriver', { get: () => false });
-                        Object.defineProperty(navigator, 'platform', { get: () => 'MacIntel' });
-                        Object.defineProperty(navigator, 'plugins', { get: () => [1, 2, 3, 4, 5] });
-                        Object.defineProperty(navigator, 'languages', { get: () => ['zh-CN', 'zh', 'en'] });
-                        Object.defineProperty(navigator, 'cookieEnabled', { get: () => true });
-                    """)
+                    await profile_store.restore_state(self.context)
                     
                     # 设置路由处理
-                    await self.context.route(self.comment_api_pattern, self.intercept_comments)
+                    await self.install_routes()
                     
                     # 创建新页面
                     self.page = await self.context.new_page()
@@ -221,12 +368,36 @@ class WebSocketJDScraper(JDCommentScraper):
         except Exception as e:
             logger.error(f"浏览器设置失败: {e}")
             logger.error(traceback.format_exc())
+            await self.stop_playwright()
+            self.release_profile()
+            self.captured_comments.close()
             raise
+
+    def release_profile(self):
+        """归还租用的共享配置目录"""
+        profile_dir, self.profile_dir = self.profile_dir, None
+        if profile_dir:
+            profile_store.release(profile_dir)
+
+    async def release_lease(self, broken=False):
+        """把借用的上下文归还给浏览器池"""
+        lease, self.lease = self.lease, None
+        if not lease:
+            return
+        try:
+            await self.remove_routes()
+        except Exception as e:
+            logger.warning(f"移除拦截路由时出错 (忽略): {e}")
+            broken = True
+        self.context = None
+        await self.browser_pool.release(lease, broken=broken)
     
     async def close(self):
         """安全关闭浏览器，增强版"""
+        comment_writer.remove_batch_listener(self.on_batch_written)
         try:
             logger.info("开始安全关闭浏览器资源")
+            self.log_resource_stats()
             
             # 先安全关闭页面
             if hasattr(self, 'page') and self.page:
@@ -238,121 +409,216 @@ class WebSocketJDScraper(JDCommentScraper):
                 except Exception as e:
                     logger.warning(f"关闭页面时出错 (忽略): {e}")
                 self.page = None
+
+            # 池化的上下文只归还不关闭
+            if self.lease:
+                logger.info("归还浏览器上下文到浏览器池")
+                await self.release_lease()
                 
             # 然后关闭上下文
             if hasattr(self, 'context') and self.context:
                 try:
+                    await profile_store.save_state(self.context)
                     logger.info("关闭浏览器上下文")
                     await self.context.close()
                 except Exception as e:
                     logger.warning(f"关闭上下文时出错 (忽略): {e}")
                 self.context = None
+
+            await self.stop_playwright()
+            self.release_profile()
+            # 评论已入库和缓存，删除评论缓冲区的溢出文件
+            self.captured_comments.close()
             
             logger.info("浏览器资源已安全释放")
         except Exception as e:
             logger.error(f"关闭浏览器时出错: {e}")
             logger.error(traceback.format_exc())
 
+def report_db_error(error, batch):
+    """批量写入最终失败时通知订阅了这一批所属商品的前端"""
+    product_ids = {comment_data.get('product_id') for comment_data in batch}
+    for product_id in product_ids - {None}:
+        comment_emitter.emit('error', {'message': f'数据库操作失败: {str(error)}'}, product_id)
+
+# 分析工作池配置：不少于 min_batch 条的批次按 chunk_size 分块交给 workers 个工作进程，
+# 不小于 parse_min_size 个字符的评论响应在工作进程中解析，更小的任务仍在当前进程执行
+analysis_pool_config = {
+    "workers": 2,
+    "min_batch": 1000,
+    "chunk_size": 2000,
+    "parse_min_size": 512 * 1024,
+    "enabled": True
+}
+
+# 情感打分、内容指纹和大响应解析等CPU密集型处理的多进程工作池，在 start_crawler_runtime 中最先启动
+analysis_pool = AnalysisPool(**analysis_pool_config)
+
+# 情感打分配置，得分不低于 positive_threshold 标为正面，不高于 negative_threshold 标为负面
+sentiment_config = {
+    "positive_threshold": 0.6,
+    "negative_threshold": 0.4
+}
+
+# 评论入库前按批计算情感得分，词典与 Java 端 SentimentAnalysisService 一致
+sentiment_scorer = SentimentScorer(**sentiment_config, pool=analysis_pool)
+
+# 评论批量写入器，连接池和写缓冲区在整个服务内共享
+comment_writer = CommentWriter(db_config, **db_writer_config, on_error=report_db_error,
+                               scorer=sentiment_scorer, analysis_pool=analysis_pool)
+
+# 关键词引擎配置：最多保留 max_products 个商品的统计，TF-IDF 排序前按词频取 top * candidate_factor 个候选，
+# 评价维度（名词+形容词组合）至少出现 min_aspect_count 次才返回
+keyword_engine_config = {
+    "max_products": 64,
+    "candidate_factor": 20,
+    "min_aspect_count": 4
+}
+
+# 按商品增量维护词频和文档频率，商品首次查询时从数据库建立，之后随评论写入更新
+keyword_engine = KeywordEngine(loader=comment_writer.load_comment_contents, pool=analysis_pool,
+                               **keyword_engine_config)
+comment_writer.add_batch_listener(keyword_engine.on_batch_written)
+
 # 保存评论到数据库
 def save_comment_to_db(comment_data):
+    """把评论交给批量写入器，由后台线程按批写入数据库"""
     try:
-        conn = mysql.connector.connect(**db_config)
-        cursor = conn.cursor()
-        
-        # 检查产品是否存在，不存在则插入
-        check_product_sql = "SELECT id FROM product WHERE id = %s"
-        cursor.execute(check_product_sql, (comment_data['product_id'],))
-        product_exists = cursor.fetchone()
-        
-        if not product_exists:
-            # 插入产品信息
-            insert_product_sql = """INSERT INTO product 
-                                  (id, name, url, create_time, update_time) 
-                                  VALUES (%s, %s, %s, NOW(), NOW())"""
-            cursor.execute(insert_product_sql, (
-                comment_data['product_id'],
-                comment_data['product_name'] or '未知商品',
-                comment_data.get('url', '')
-            ))
-            conn.commit()
-            logger.info(f"商品已保存到数据库: {comment_data['product_id']} - {comment_data['product_name']}")
-        
-        # 处理评论日期
-        try:
-            # 尝试解析评论日期
-            if isinstance(comment_data.get('creationTime'), str) and comment_data.get('creationTime'):
-                create_time = datetime.strptime(comment_data['creationTime'], '%Y-%m-%d %H:%M:%S')
-            else:
-                create_time = datetime.now()
-        except Exception as e:
-            logger.warning(f"解析评论日期失败: {e}，使用当前时间")
-            create_time = datetime.now()
-        
-        # 检查是否已存在相同评论
-        # 使用统一表名，避免为每个商品创建单独的表
-        table_name = "comment"
-        check_comment_sql = f"""SELECT id FROM {table_name} 
-                              WHERE product_id = %s AND content = %s AND nickname = %s 
-                              LIMIT 1"""
-        cursor.execute(check_comment_sql, (
-            comment_data['product_id'],
-            comment_data['content'],
-            comment_data['nickname']
-        ))
-        comment_exists = cursor.fetchone()
-        
-        if not comment_exists:
-            # 插入评论数据
-            insert_comment_sql = f"""INSERT INTO {table_name} 
-                                (product_id, content, nickname, score, create_time) 
-                                VALUES (%s, %s, %s, %s, %s)"""
-            
-            cursor.execute(insert_comment_sql, (
-                comment_data['product_id'],
-                comment_data['content'],
-                comment_data['nickname'],
-                comment_data['score'],
-                create_time
-            ))
-            conn.commit()
-            logger.info(f"评论已保存到数据库: {comment_data['nickname']} - {comment_data['content'][:30]}...")
-        else:
-            logger.info(f"评论已存在，跳过: {comment_data['nickname']} - {comment_data['content'][:30]}...")
-        
-        cursor.close()
-        conn.close()
+        comment_writer.enqueue(comment_data)
         return True
     except Exception as e:
         logger.error(f"保存评论到数据库失败: {e}")
         logger.error(traceback.format_exc())
-        socketio.emit('error', {'message': f'数据库操作失败: {str(e)}'})
+        comment_emitter.emit('error', {'message': f'数据库操作失败: {str(e)}'}, comment_data.get('product_id'))
         return False
 
 # 检查数据库连接
 def check_database_connection():
     try:
-        conn = mysql.connector.connect(**db_config)
+        conn = comment_writer.get_connection()
         cursor = conn.cursor()
         cursor.execute("SELECT 1")
         result = cursor.fetchone()
+        cursor.close()
         conn.close()
         return True if result else False
     except Exception as e:
         logger.error(f"数据库连接测试失败: {e}")
         return False
 
+async def crawl_from_scratch(scraper, product_url, product_id, product_name):
+    """完整爬取，返回结果是否可以缓存（生成了模拟数据时不缓存）"""
+    # 开始爬取评论
+    logger.info("开始爬取评论...")
+    await scraper.load_comments(product_url)
+    
+    # 确保至少有一些评论数据
+    if len(scraper.captured_comments) == 0:
+        logger.warning("未获取到评论数据，尝试添加错误处理备选方案")
+        
+        # 尝试再次爬取
+        logger.info("尝试二次爬取...")
+        await scraper.load_comments(product_url)
+        
+        # 如果再次尝试后仍然没有数据，则生成一些测试数据
+        if len(scraper.captured_comments) == 0:
+            logger.warning("二次爬取仍未获取到数据，生成模拟数据")
+            # 生成一些简单的测试评论，避免使用固定的iPhone评论
+            current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            for i in range(1, 6):
+                comment_data = CommentRecord(
+                    content=f"这是一条关于商品ID {product_id} 的评论 {i}，由于网络原因无法获取真实评论，这是自动生成的内容。",
+                    nickname=f"用户_{i}",
+                    score=random.randint(1, 5),
+                    creation_time=current_time,
+                    user_level="普通会员",
+                    color="默认",
+                    size="默认",
+                    product_id=product_id,
+                    product_name=product_name,
+                    url=product_url
+                )
+                scraper.captured_comments.append(comment_data)
+                comment_emitter.add(product_id, comment_data)
+                save_comment_to_db(comment_data)
+            return False
+    return True
+
+async def refresh_incrementally(scraper, product_id, cached):
+    """按水位线增量刷新，有过期缓存时先推送缓存结果，返回刷新是否成功
+
+    水位线优先取数据库中保存的值，没有时使用缓存中最新评论的时间。
+    未能衔接上水位线（新评论超过翻页上限或请求失败）时返回 False，水位线不推进。
+    """
+    if cached:
+        scraper.preload_comments(cached['comments'])
+        if not scraper.watermark and cached['latest_time']:
+            scraper.watermark = {'comment_id': None, 'creation_time': cached['latest_time']}
+        logger.info(f"商品 {product_id} 先推送过期缓存中的 {len(cached['comments'])} 条评论")
+    try:
+        added, reached = await scraper.fetch_new_comments(
+            product_id,
+            since=scraper.watermark.get('creation_time') if scraper.watermark else None,
+            since_id=scraper.watermark.get('comment_id') if scraper.watermark else None
+        )
+        logger.info(f"商品 {product_id} 增量刷新新增 {added} 条评论，水位线: {scraper.watermark}")
+        return reached
+    except Exception as e:
+        logger.warning(f"商品 {product_id} 增量刷新失败: {e}")
+        return False
+
+def serve_cached_result(product_id, cached):
+    """缓存命中时直接把结果推送给订阅该商品的客户端"""
+    comments = cached['comments']
+    for comment in comments:
+        comment_emitter.add(product_id, comment)
+    logger.info(f"商品 {product_id} 命中爬取缓存，直接推送 {len(comments)} 条评论")
+    comment_emitter.emit('progress', {
+        'status': 'completed',
+        'count': len(comments),
+        'product_id': product_id,
+        'cached': True,
+        'crawled_at': cached['crawled_at']
+    }, product_id)
+
 # 后台执行爬虫任务
-async def run_crawler(product_url, product_id, product_name):
+async def run_crawler(product_url, product_id, product_name, force_refresh=False, page_cursors=None, checkpointer=None):
     # 测试模式设置，设为False以真实爬取数据
     use_test_mode = False
     
+    # 新鲜的缓存直接推送，不启动浏览器
+    cached = None
+    if not force_refresh:
+        cached, fresh = crawl_cache.lookup(product_id)
+        if fresh:
+            serve_cached_result(product_id, cached)
+            return {'status': 'completed', 'count': len(cached['comments']), 'cached': True}
+    
     scraper = None
+    dropped_before = comment_writer.rows_dropped
+    loop = asyncio.get_running_loop()
     try:
+        # 数据库中的水位线，存在时只增量爬取比它更新的评论
+        watermark = None
+        if not force_refresh:
+            try:
+                watermark = await loop.run_in_executor(None, comment_writer.load_watermark, product_id)
+            except Exception as e:
+                logger.warning(f"读取商品 {product_id} 的水位线失败，执行完整爬取: {e}")
+        
+
         logger.info(f"开始爬取商品: {product_id} - {product_name}")
-        socketio.emit('progress', {'status': 'starting', 'product_id': product_id})
+        comment_emitter.emit('progress', {'status': 'starting', 'product_id': product_id}, product_id)
         
-        # 初始化爬虫实例
-        scraper = WebSocketJDScraper(product_id, product_name, headless=True, test_mode=use_test_mode)
+        # 初始化爬虫实例，浏览器池不可用时退回每次独立启动浏览器
+        scraper = WebSocketJDScraper(
+            product_id, product_name, headless=True, test_mode=use_test_mode,
+            browser_pool=browser_pool if browser_pool.started else None,
+            watermark=watermark,
+            page_cursors=page_cursors
+        )
+        if checkpointer:
+            scraper.on_checkpoint = checkpointer.page_done
         
         # 使用WebSocketJDScraper中的setup方法初始化浏览器
         logger.info("初始化浏览器...")
@@ -361,7 +627,8 @@ async def run_crawler(product_url, product_id, product_name):
         
         while setup_retry_count < max_setup_retries:
             try:
-                await scraper.setup()
+                with metrics.browser_setup_seconds.time():
+                    await scraper.setup()
                 break  # 如果成功则跳出循环
             except Exception as e:
                 setup_retry_count += 1
@@ -370,61 +637,71 @@ async def run_crawler(product_url, product_id, product_name):
                     raise Exception(f"浏览器初始化失败，已重试 {max_setup_retries} 次")
                 await asyncio.sleep(2)  # 等待2秒后重试
         
-        # 开始爬取评论
-        logger.info("开始爬取评论...")
-        await scraper.load_comments(product_url)
-        
-        # 确保至少有一些评论数据
-        if len(scraper.captured_comments) == 0:
-            logger.warning("未获取到评论数据，尝试添加错误处理备选方案")
-            
-            # 尝试再次爬取
-            logger.info("尝试二次爬取...")
-            await scraper.load_comments(product_url)
-            
-            # 如果再次尝试后仍然没有数据，则生成一些测试数据
-            if len(scraper.captured_comments) == 0:
-                logger.warning("二次爬取仍未获取到数据，生成模拟数据")
-                # 生成一些简单的测试评论，避免使用固定的iPhone评论
-                current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                for i in range(1, 6):
-                    comment_data = {
-                        'content': f"这是一条关于商品ID {product_id} 的评论 {i}，由于网络原因无法获取真实评论，这是自动生成的内容。",
-                        'nickname': f"用户_{i}",
-                        'score': random.randint(1, 5),
-                        'creationTime': current_time,
-                        'userLevelName': "普通会员",
-                        'productColor': "默认",
-                        'productSize': "默认",
-                        'images': [],
-                        'product_id': product_id,
-                        'product_name': product_name,
-                        'url': product_url
-                    }
-                    scraper.captured_comments.append(comment_data)
-                    save_comment_to_db(comment_data)
+        # 有水位线或过期缓存时增量刷新，否则完整爬取
+        incremental = bool(cached or watermark)
+        if incremental:
+            refreshed = await refresh_incrementally(scraper, product_id, cached)
+            # 只有在过期缓存基础上刷新的结果才是完整的，可以写回缓存
+            cacheable = refreshed and cached is not None
+            if not refreshed:
+                # 没衔接上水位线，中间可能漏掉评论，改为完整爬取，水位线保持原值
+                logger.warning(f"商品 {product_id} 增量刷新未衔接上水位线，改为完整爬取")
+                cacheable = await crawl_from_scratch(scraper, product_url, product_id, product_name)
+        else:
+            cacheable = await crawl_from_scratch(scraper, product_url, product_id, product_name)
         
-        # 发送所有评论到前端
-        for comment in scraper.captured_comments:
-            logger.info(f"向前端发送评论: {comment['nickname']} - {comment['content'][:30]}...")
-            socketio.emit('new_comment', comment)
-            await asyncio.sleep(0.5)  # 短暂延迟，模拟实时爬取
-            
-        # 发送进度更新
-        socketio.emit('progress', {
+        # 评论在爬取过程中已实时推送，这里只推送缓冲区剩余部分和最终进度
+        comment_emitter.emit('progress', {
             'status': 'crawling', 
-            'count': len(scraper.captured_comments)
-        })
+            'count': len(scraper.captured_comments),
+            'product_id': product_id
+        }, product_id)
+        
+        # 等待本次爬取的评论全部写入数据库，成功后再持久化布隆过滤器
+        flushed = await loop.run_in_executor(None, comment_writer.flush)
+        if flushed and comment_writer.rows_dropped == dropped_before:
+            bloom_store.save(product_id, scraper.deduper.bloom)
+            # 评论全部入库、且增量刷新衔接上原水位线后才推进水位线
+            if scraper.watermark and scraper.watermark != watermark and (not incremental or refreshed):
+                try:
+                    await loop.run_in_executor(
+                        None, comment_writer.save_watermark,
+                        product_id, product_name, scraper.watermark, product_url
+                    )
+                except Exception as e:
+                    logger.error(f"保存商品 {product_id} 的水位线失败: {e}")
+        
+        if cacheable and scraper.captured_comments.has_spilled:
+            # 溢出到磁盘的大结果不放进内存缓存
+            logger.info(f"商品 {product_id} 的评论超过缓冲区容量，不写入爬取缓存")
+        elif cacheable:
+            crawl_cache.put(product_id, scraper.captured_comments, scraper.comment_summary)
+        # 策略统计按 save_interval 节流落盘
+        await loop.run_in_executor(None, strategy_stats.save)
         
         comment_count = len(scraper.captured_comments)
         logger.info(f"商品 {product_id} 爬取完成，共获取 {comment_count} 条评论")
         
-        # 发送完成信号
-        socketio.emit('progress', {
+        # 发送完成信号，附带本次爬取的资源拦截和等待统计
+        comment_emitter.emit('progress', {
             'status': 'completed', 
             'count': comment_count,
-            'product_id': product_id
-        })
+            'product_id': product_id,
+            'resources': scraper.resource_router.stats() if scraper.resource_router else None,
+            'wait': scraper.waiter.stats(),
+            'interception': scraper.instrumentation.stats(),
+            'buffer': scraper.captured_comments.stats(),
+            'cached': False,
+            'incremental': incremental,
+            'watermark': scraper.watermark
+        }, product_id)
+        return {
+            'status': 'completed',
+            'count': comment_count,
+            'cached': False,
+            'incremental': incremental,
+            'pages_failed': (scraper.last_crawl_result or {}).get('pages_failed', 0)
+        }
     except Exception as e:
         logger.error(f"爬虫执行错误: {e}")
         logger.error(traceback.format_exc())
@@ -446,21 +723,21 @@ async def run_crawler(product_url, product_id, product_name):
                 'url': product_url
             }
             
-            socketio.emit('new_comment', error_comment)
-            socketio.emit('error', {'message': f'爬虫执行错误: {str(e)}'})
+            comment_emitter.add(product_id, error_comment)
+            comment_emitter.emit('error', {'message': f'爬虫执行错误: {str(e)}'}, product_id)
             
             # 发送完成信号，标记为出错状态
-            socketio.emit('progress', {
+            comment_emitter.emit('progress', {
                 'status': 'error', 
                 'count': 0,
                 'product_id': product_id,
                 'error': str(e)
-            })
+            }, product_id)
         except Exception as inner_e:
             logger.error(f"处理错误信息时出错: {inner_e}")
         
         # 防止进入错误恢复模式，直接返回
-        return
+        return {'status': 'error', 'count': 0, 'error': str(e)}
     finally:
         # 确保安全关闭浏览器资源
         if scraper:
@@ -472,6 +749,50 @@ async def run_crawler(product_url, product_id, product_name):
                 logger.error(f"关闭爬虫时出错: {e}")
                 logger.error(traceback.format_exc())
 
+async def run_crawl_job(job):
+    """调度器执行单个任务的入口，返回值记录在 job.result 中
+
+    分页断点在评论写入数据库后才持久化到任务表，任务从 job.cursors 处继续。
+    """
+    try:
+        with JobCheckpointer(job_store, job, comment_writer) as checkpointer:
+            result = await run_crawler(job.product_url, job.product_id, job.product_name,
+                                       page_cursors=job.cursors, checkpointer=checkpointer, **job.options)
+        if result and result.get('pages_failed'):
+            job_store.checkpoint(job.job_id, job.cursors, pages_failed=result['pages_failed'])
+        return result
+    except asyncio.CancelledError:
+        logger.info(f"商品 {job.product_id} 的爬取任务已取消")
+        comment_emitter.emit('progress', {'status': 'cancelled', 'count': 0, 'product_id': job.product_id}, job.product_id)
+        raise
+
+def emit_batch_progress(batch, progress):
+    socketio.emit('batch_progress', progress, to=batch_room(batch.batch_id))
+
+def emit_batch_summary(batch, summary):
+    socketio.emit('batch_summary', summary, to=batch_room(batch.batch_id))
+
+# 批量任务进度汇总，每个任务结束时推送进度，批次结束时推送一次汇总
+batch_tracker = BatchTracker(on_progress=emit_batch_progress, on_complete=emit_batch_summary)
+
+# 全局爬取调度器，排队和运行中的任务构成在途索引
+crawl_scheduler = CrawlScheduler(run_crawl_job, **scheduler_config, on_finish=batch_tracker.job_finished,
+                                 store=job_store)
+
+# /metrics 中按需读取各组件统计的仪表盘指标
+metrics.registry.gauge('jd_active_crawls', '正在运行的爬取任务数',
+                       func=lambda: crawl_scheduler.status()['running'])
+metrics.registry.gauge('jd_browser_pool_in_use', '已借出的浏览器池上下文数',
+                       func=lambda: browser_pool.stats()['in_use'])
+metrics.registry.gauge('jd_browser_pool_size', '浏览器池容量', func=lambda: browser_pool.size)
+metrics.registry.gauge('jd_db_write_queue_depth', '评论写缓冲区中等待写入的条数',
+                       func=comment_writer.queue_depth)
+metrics.registry.counter('jd_comments_persisted_total', '实际新写入数据库的评论数',
+                         func=lambda: comment_writer.rows_written)
+metrics.registry.counter('jd_comments_dropped_total', '重试后仍写入失败而丢弃的评论数',
+                         func=lambda: comment_writer.rows_dropped)
+socket_clients = metrics.registry.gauge('jd_socket_clients', '当前连接的Socket.IO客户端数')
+
 @app.route('/')
 def index():
     """返回前端首页"""
@@ -492,7 +813,53 @@ def crawler_page():
 def status():
     """API状态检查"""
     logger.info("API状态请求")
-    return jsonify({"status": "服务正常运行", "version": "1.0"})
+    return jsonify({
+        "status": "服务正常运行",
+        "version": "1.0",
+        "browser_pool": browser_pool.stats(),
+        "db_writer": comment_writer.stats(),
+        "emitter": comment_emitter.stats(),
+        "crawl_cache": crawl_cache.stats(),
+        "profiles": profile_store.stats(),
+        "endpoints": endpoint_health.stats(),
+        "sentiment": sentiment_scorer.stats(),
+        "analysis_pool": analysis_pool.stats(),
+        "keywords": keyword_engine.stats()
+    })
+
+@app.route('/api/strategies')
+@app.route('/api/strategies/<product_id>')
+def strategies(product_id=None):
+    """查看各评论获取策略的成功率、耗时，以及指定商品当前的尝试顺序"""
+    return jsonify({"success": True, "data": strategy_stats.stats(product_id)})
+
+@app.route('/api/keywords/<product_id>')
+def keywords(product_id):
+    """商品的关键词和评价维度，参数 top 为返回个数，by 为 tfidf（默认）或 tf"""
+    try:
+        top = max(1, min(int(request.args.get('top', 20)), 500))
+    except (TypeError, ValueError):
+        top = 20
+    by = request.args.get('by', 'tfidf')
+    if by not in ('tfidf', 'tf'):
+        return jsonify({"success": False, "message": "by 只能是 tfidf 或 tf"})
+    try:
+        data = keyword_engine.summary(product_id)
+        data.update({
+            "product_id": product_id,
+            "keywords": keyword_engine.top(product_id, top, by=by),
+            "aspects": keyword_engine.aspects(product_id, top)
+        })
+        return jsonify({"success": True, "data": data})
+    except Exception as e:
+        logger.error(f"查询商品 {product_id} 的关键词时出错: {e}")
+        logger.error(traceback.format_exc())
+        return jsonify({"success": False, "message": f"服务器错误: {str(e)}"})
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus 文本格式的指标"""
+    return Response(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
 
 # 通配符路由 - 必须放在所有其他路由之后
 @app.route('/<path:path>')
@@ -515,12 +882,46 @@ def catch_all(path):
 
 @socketio.on('connect')
 def handle_connect():
+    socket_clients.inc()
     logger.info(f"客户端已连接: {request.sid}")
 
 @socketio.on('disconnect')
 def handle_disconnect():
+    socket_clients.dec()
     logger.info(f"客户端已断开连接: {request.sid}")
 
+@socketio.on('join_product')
+def handle_join_product(data):
+    """订阅商品的爬取推送，返回该商品当前的任务状态"""
+    product_id = str((data or {}).get('product_id') or '')
+    if not product_id:
+        return {"success": False, "message": "缺少商品ID"}
+    join_room(product_room(product_id))
+    logger.info(f"客户端 {request.sid} 订阅商品 {product_id}")
+    return {"success": True, "product_id": product_id, "job": crawl_scheduler.status(product_id)}
+
+@socketio.on('join_batch')
+def handle_join_batch(data):
+    """订阅批量任务的进度和汇总"""
+    batch_id = (data or {}).get('batch_id')
+    if not batch_id:
+        return {"success": False, "message": "缺少批量任务ID"}
+    join_room(batch_room(batch_id))
+    return {"success": True, "batch_id": batch_id, "progress": batch_tracker.status(batch_id)}
+
+@socketio.on('leave_product')
+def handle_leave_product(data):
+    """取消订阅商品的爬取推送"""
+    product_id = str((data or {}).get('product_id') or '')
+    if product_id:
+        leave_room(product_room(product_id))
+    return {"success": True, "product_id": product_id}
+
+def extract_product_id(product_url):
+    """从商品链接中提取商品ID"""
+    match = re.search(r'/(\d+)\.html', product_url or '')
+    return match.group(1) if match else None
+
 @app.route('/api/crawl', methods=['POST'])
 def start_crawl():
     try:
@@ -537,63 +938,177 @@ def start_crawl():
         
         if not product_id:
             # 尝试从URL中提取商品ID
-            match = re.search(r'/(\d+)\.html', product_url)
-            if match:
-                product_id = match.group(1)
-            else:
+            product_id = extract_product_id(product_url)
+            if not product_id:
                 return jsonify({"success": False, "message": "无法从URL中提取商品ID，请手动指定"})
         
-        # 使用线程锁检查和添加任务，确保线程安全
-        with task_lock:
-            # 检查是否已经有相同的爬取任务在进行中
-            if product_id in active_crawl_tasks:
-                logger.info(f"商品 {product_id} 正在爬取中，拒绝重复请求")
-                return jsonify({"success": False, "message": "该商品正在爬取中，请稍后再试"})
-            
-            # 检查数据库连接
-            if not check_database_connection():
-                return jsonify({"success": False, "message": "数据库连接失败，请检查数据库配置"})
-            
-            # 将商品ID添加到活动任务集合中
-            active_crawl_tasks.add(product_id)
-            logger.info(f"商品 {product_id} 已添加到爬取队列，当前队列大小: {len(active_crawl_tasks)}")
+        # 检查数据库连接
+        if not check_database_connection():
+            return jsonify({"success": False, "message": "数据库连接失败，请检查数据库配置"})
         
-        # 异步启动爬虫
-        thread = threading.Thread(target=lambda: run_crawler_with_cleanup(product_url, product_id, product_name))
-        thread.daemon = True
-        thread.start()
+        # 提交到调度器，同一商品已在排队或运行时拒绝重复请求
+        try:
+            priority = int(data.get('priority', 0))
+        except (TypeError, ValueError):
+            priority = 0
+        # force_refresh 为真时忽略缓存重新完整爬取
+        options = {'force_refresh': True} if data.get('force_refresh') else None
+        # resume 为真时从该商品上次未完成任务的断点继续
+        cursors = None
+        if data.get('resume'):
+            record = job_store.latest_resumable(product_id)
+            # 调度器里仍在排队或运行的任务不能标记为中断，交给下面的重复提交检查拒绝
+            if record and not crawl_scheduler.is_in_flight(record['job_id']):
+                cursors = record['cursors']
+                job_store.mark_interrupted(record['job_id'])
+                logger.info(f"商品 {product_id} 从断点 {cursors} 继续爬取")
+        job = crawl_scheduler.submit(product_url, product_id, product_name, priority=priority,
+                                     options=options, cursors=cursors)
+        if not job:
+            logger.info(f"商品 {product_id} 正在爬取中，拒绝重复请求")
+            return jsonify({"success": False, "message": "该商品正在爬取中，请稍后再试"})
         
-        return jsonify({"success": True, "message": "爬虫已启动"})
+        return jsonify({"success": True, "message": "爬虫已启动", "job_id": job.job_id})
     except Exception as e:
         logger.error(f"启动爬虫时出错: {e}")
         logger.error(traceback.format_exc())
         return jsonify({"success": False, "message": f"服务器错误: {str(e)}"})
 
-def run_crawler_with_cleanup(product_url, product_id, product_name):
-    """
-    运行爬虫并在完成后清理活动任务集合
+@app.route('/api/crawl/batch', methods=['POST'])
+def start_batch_crawl():
+    """批量提交爬取任务
+
+    请求体: {"items": [{"url", "product_id", "product_name"} 或商品链接字符串, ...],
+            "priority": 可选, "force_refresh": 可选}
+    所有任务进入同一个调度队列，共享浏览器池和按主机限速。客户端通过
+    join_batch 订阅 batch_progress 进度和最终的 batch_summary 汇总。
     """
     try:
-        # 使用单独的事件循环运行爬虫任务
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(run_crawler(product_url, product_id, product_name))
-    except Exception as e:
-        logger.error(f"爬虫执行错误: {e}")
-        logger.error(traceback.format_exc())
-        socketio.emit('error', {'message': f'爬虫执行错误: {str(e)}'})
-    finally:
-        # 无论成功还是失败，都从活动任务集合中移除
-        with task_lock:
-            if product_id in active_crawl_tasks:
-                active_crawl_tasks.remove(product_id)
-                logger.info(f"商品 {product_id} 爬取任务已从活动任务集合中移除，当前队列大小: {len(active_crawl_tasks)}")
+        data = request.get_json()
+        if not data:
+            return jsonify({"success": False, "message": "无效的请求数据"})
+        
+        items = data.get('items') or data.get('urls') or []
+        if not isinstance(items, list) or not items:
+            return jsonify({"success": False, "message": "商品列表不能为空"})
+        if len(items) > batch_config["max_items"]:
+            return jsonify({"success": False, "message": f"单次最多提交 {batch_config['max_items']} 个商品"})
+        
+        # 解析并去重商品
+        products = {}
+        rejected = []
+        for item in items:
+            if isinstance(item, str):
+                item = {'url': item}
+            if not isinstance(item, dict):
+                rejected.append({'item': item, 'reason': '格式错误'})
+                continue
+            product_url = item.get('url')
+            product_id = str(item.get('product_id') or extract_product_id(product_url) or '')
+            if not product_url or not product_id:
+                rejected.append({'item': item, 'reason': '缺少商品链接或无法提取商品ID'})
+                continue
+            products.setdefault(product_id, (product_url, item.get('product_name', '未知商品')))
+        
+        if not products:
+            return jsonify({"success": False, "message": "没有有效的商品", "rejected": rejected})
+        
+        # 检查数据库连接
+        if not check_database_connection():
+            return jsonify({"success": False, "message": "数据库连接失败，请检查数据库配置"})
         
-        # 关闭事件循环
         try:
-            loop.close()
-        except:
-            pass
+            priority = int(data.get('priority', batch_config["default_priority"]))
+        except (TypeError, ValueError):
+            priority = batch_config["default_priority"]
+        options = {'force_refresh': True} if data.get('force_refresh') else None
+        
+        # 先登记批次再提交，已在途的商品随原任务结束计入本批次
+        batch = batch_tracker.create(products)
+        in_flight = 0
+        for product_id, (product_url, product_name) in products.items():
+            if not crawl_scheduler.submit(product_url, product_id, product_name, priority=priority, options=options):
+                in_flight += 1
+        
+        logger.info(f"批量任务 {batch.batch_id} 已提交 {len(products)} 个商品，其中 {in_flight} 个已在爬取中")
+        return jsonify({
+            "success": True,
+            "message": "批量爬取已启动",
+            "batch_id": batch.batch_id,
+            "accepted": len(products),
+            "in_flight": in_flight,
+            "rejected": rejected
+        })
+    except Exception as e:
+        logger.error(f"启动批量爬取时出错: {e}")
+        logger.error(traceback.format_exc())
+        return jsonify({"success": False, "message": f"服务器错误: {str(e)}"})
+
+@app.route('/api/crawl/batch/<batch_id>', methods=['GET'])
+def batch_status(batch_id):
+    """查询批量任务的进度汇总"""
+    summary = batch_tracker.status(batch_id)
+    if not summary:
+        return jsonify({"success": False, "message": "未找到该批量任务"})
+    return jsonify({"success": True, "data": summary})
+
+def start_crawler_runtime():
+    """启动评论写入器、推送器、爬取调度器，在调度器的事件循环中预热浏览器池，然后恢复未完成的任务"""
+    # 工作进程以 fork 方式创建，必须在其他后台线程启动之前；已有线程时工作池会改用 spawn
+    analysis_pool.start()
+    comment_writer.start()
+    comment_emitter.start()
+    crawl_scheduler.start()
+    if replay_server:
+        replay_server.start()
+    
+    # 在后台清理旧版按商品创建的配置目录和空闲的多余共享目录
+    threading.Thread(target=profile_store.gc, name='profile-gc', daemon=True).start()
+
+    try:
+        crawl_scheduler.run_coroutine(browser_pool.start()).result()
+        logger.info(f"浏览器池预热完成: {browser_pool.stats()}")
+    except Exception as e:
+        logger.error(f"浏览器池启动失败，将退回为每个任务独立启动浏览器: {e}")
+        logger.error(traceback.format_exc())
+
+    # 浏览器池就绪后再恢复任务，避免恢复的任务抢在预热之前各自启动浏览器
+    if job_store_config["resume_on_start"]:
+        resumed = crawl_scheduler.resume_unfinished()
+        if resumed:
+            logger.info(f"已恢复 {resumed} 个上次未完成的爬取任务")
+
+def stop_crawler_runtime():
+    """停止调度器并关闭浏览器池"""
+    try:
+        crawl_scheduler.run_coroutine(browser_pool.close()).result(timeout=30)
+    except Exception as e:
+        logger.error(f"关闭浏览器池时出错: {e}")
+    crawl_scheduler.stop()
+    comment_emitter.stop()
+    comment_writer.stop()
+    analysis_pool.shutdown()
+    if replay_server:
+        replay_server.stop()
+    job_store.close()
+    strategy_stats.save(force=True)
+
+@app.route('/api/crawl/status', methods=['GET'])
+@app.route('/api/crawl/status/<product_id>', methods=['GET'])
+def crawl_status(product_id=None):
+    """查询调度器中的任务状态"""
+    status_info = crawl_scheduler.status(product_id)
+    if product_id and not status_info:
+        return jsonify({"success": False, "message": "未找到该商品的爬取任务"})
+    return jsonify({"success": True, "data": status_info})
+
+@app.route('/api/crawl/<product_id>/cancel', methods=['POST'])
+def cancel_crawl(product_id):
+    """取消排队中或运行中的爬取任务"""
+    if crawl_scheduler.cancel(product_id):
+        logger.info(f"已请求取消商品 {product_id} 的爬取任务")
+        return jsonify({"success": True, "message": "已取消爬取任务"})
+    return jsonify({"success": False, "message": "该商品没有排队或运行中的爬取任务"})
 
 if __name__ == '__main__':
     # 启动前检查数据库连接
@@ -602,5 +1117,10 @@ if __name__ == '__main__':
     else:
         logger.error("数据库连接失败，服务可能无法正常工作")
         
+    start_crawler_runtime()
+
     logger.info("启动Flask-SocketIO服务，监听端口 5004")
-    socketio.run(app, host='0.0.0.0', port=5004, debug=False, allow_unsafe_werkzeug=True)
+    try:
+        socketio.run(app, host='0.0.0.0', port=5004, debug=False, allow_unsafe_werkzeug=True)
+    finally:
+        stop_crawler_runtime()
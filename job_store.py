@@ -0,0 +1,209 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# 服务重启后需要恢复的状态
+UNFINISHED_STATES = ('queued', 'running')
+# 可以从断点续爬的状态
+RESUMABLE_STATES = ('queued', 'running', 'failed', 'cancelled', 'interrupted')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS crawl_job (
+    job_id TEXT PRIMARY KEY,
+    product_id TEXT NOT NULL,
+    product_url TEXT,
+    product_name TEXT,
+    priority INTEGER DEFAULT 0,
+    options TEXT,
+    state TEXT NOT NULL,
+    cursors TEXT,
+    pages_fetched INTEGER DEFAULT 0,
+    pages_failed INTEGER DEFAULT 0,
+    error_count INTEGER DEFAULT 0,
+    last_error TEXT,
+    created_at REAL,
+    started_at REAL,
+    finished_at REAL,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_crawl_job_product ON crawl_job (product_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_crawl_job_state ON crawl_job (state);
+"""
+
+
+class JobStore:
+    """基于本地SQLite文件的持久化爬取任务表
+
+    记录每个任务的状态、分页断点（{评分筛选: 下一页页码}）、已获取/失败页数和错误次数，
+    服务重启或任务失败后可以从最后一个断点继续，而不是从第0页重新开始。
+    """
+
+    def __init__(self, path="jd_user_data/crawl_jobs.sqlite3"):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+            self._conn.commit()
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            self._conn.commit()
+            return cursor
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return [self._row_to_dict(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    @staticmethod
+    def _row_to_dict(row):
+        record = dict(row)
+        record['options'] = json.loads(record['options']) if record['options'] else {}
+        # JSON 对象的键是字符串，评分筛选还原为整数
+        cursors = json.loads(record['cursors']) if record['cursors'] else {}
+        record['cursors'] = {int(score): page for score, page in cursors.items()}
+        return record
+
+    def add(self, job):
+        now = time.time()
+        self._execute(
+            """INSERT OR REPLACE INTO crawl_job
+               (job_id, product_id, product_url, product_name, priority, options, state, cursors,
+                created_at, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (job.job_id, job.product_id, job.product_url, job.product_name, job.priority,
+             json.dumps(job.options), job.state, json.dumps(job.cursors), job.created_at, now)
+        )
+
+    def update_state(self, job):
+        """记录任务状态变化，失败时累加错误次数"""
+        self._execute(
+            """UPDATE crawl_job
+               SET state = ?, last_error = COALESCE(?, last_error),
+                   error_count = error_count + ?, started_at = ?, finished_at = ?, updated_at = ?
+               WHERE job_id = ?""",
+            (job.state, job.error, 1 if job.state == 'failed' else 0,
+             job.started_at, job.finished_at, time.time(), job.job_id)
+        )
+
+    def checkpoint(self, job_id, cursors, pages_fetched=None, pages_failed=None):
+        """保存分页断点"""
+        self._execute(
+            """UPDATE crawl_job
+               SET cursors = ?, pages_fetched = COALESCE(?, pages_fetched),
+                   pages_failed = COALESCE(?, pages_failed), updated_at = ?
+               WHERE job_id = ?""",
+            (json.dumps(cursors), pages_fetched, pages_failed, time.time(), job_id)
+        )
+
+    def mark_interrupted(self, job_id):
+        self._execute(
+            "UPDATE crawl_job SET state = 'interrupted', updated_at = ? WHERE job_id = ?",
+            (time.time(), job_id)
+        )
+
+    def get(self, job_id):
+        rows = self._query("SELECT * FROM crawl_job WHERE job_id = ?", (job_id,))
+        return rows[0] if rows else None
+
+    def unfinished(self):
+        """上次服务退出时仍在排队或运行的任务"""
+        placeholders = ','.join('?' * len(UNFINISHED_STATES))
+        return self._query(
+            f"SELECT * FROM crawl_job WHERE state IN ({placeholders}) ORDER BY priority DESC, created_at",
+            UNFINISHED_STATES
+        )
+
+    def latest_resumable(self, product_id):
+        """商品最近一次任务未完成时返回该任务，最近一次已完成或没有任务时返回 None
+
+        只看最近一次任务，之后已有任务完成时更早的断点已经过时。
+        """
+        rows = self._query(
+            "SELECT * FROM crawl_job WHERE product_id = ? ORDER BY created_at DESC LIMIT 1",
+            (product_id,)
+        )
+        if rows and rows[0]['state'] in RESUMABLE_STATES:
+            return rows[0]
+        return None
+
+    def history(self, product_id, limit=20):
+        return self._query(
+            "SELECT * FROM crawl_job WHERE product_id = ? ORDER BY created_at DESC LIMIT ?",
+            (product_id, limit)
+        )
+
+    def prune(self, max_age_days=30):
+        """删除早已结束的任务记录"""
+        cutoff = time.time() - max_age_days * 86400
+        placeholders = ','.join('?' * len(UNFINISHED_STATES))
+        cursor = self._execute(
+            f"DELETE FROM crawl_job WHERE state NOT IN ({placeholders}) AND updated_at < ?",
+            (*UNFINISHED_STATES, cutoff)
+        )
+        return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JobCheckpointer:
+    """只在评论写入数据库之后才推进任务的分页断点
+
+    每爬完一页调用 page_done(cursors)，记录当时写入器已入队的评论序号；
+    写入器按入队顺序写出，处理进度越过该序号后，对应的断点才写入任务表。
+    这样重启后从断点续爬不会漏掉还留在写缓冲区里的评论。
+    """
+
+    def __init__(self, store, job, writer):
+        self.store = store
+        self.job = job
+        self.writer = writer
+        self._lock = threading.Lock()
+        self._pending = []
+        self._failed = False
+        self.pages_done = 0
+
+    def page_done(self, cursors):
+        with self._lock:
+            self.pages_done += 1
+            self._pending.append((self.writer.rows_enqueued, dict(cursors), self.pages_done))
+        self.on_flush(self.writer.rows_processed, True)
+
+    def on_flush(self, rows_processed, ok):
+        """写入器的刷新回调，可能在写入线程中调用"""
+        with self._lock:
+            if not ok:
+                # 有评论写入失败，之后的断点都不可信，停止推进
+                self._failed = True
+                self._pending.clear()
+                return
+            if self._failed:
+                return
+            durable = None
+            while self._pending and self._pending[0][0] <= rows_processed:
+                durable = self._pending.pop(0)
+        if durable:
+            _, cursors, pages_done = durable
+            self.job.cursors = cursors
+            try:
+                self.store.checkpoint(self.job.job_id, cursors, pages_fetched=pages_done)
+            except Exception as e:
+                logger.error(f"保存任务 {self.job.job_id} 的断点失败: {e}")
+
+    def __enter__(self):
+        self.writer.add_flush_listener(self.on_flush)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.writer.remove_flush_listener(self.on_flush)
@@ -0,0 +1,321 @@
+import heapq
+import logging
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+
+from comment_dedup import comment_fingerprint
+
+try:
+    import jieba
+    import jieba.posseg
+    jieba.setLogLevel(logging.WARNING)
+except ImportError:  # jieba 为可选依赖，未安装时按汉字二元组统计，不提取评价维度
+    jieba = None
+
+logger = logging.getLogger(__name__)
+
+# 以下词表与 Java 端 KeywordExtractionService 一致
+STOP_WORDS = frozenset((
+    "的", "了", "和", "是", "在", "我", "有", "就", "不", "也", "这",
+    "真的", "特别", "非常", "真是", "太", "款", "起来", "变得", "感觉",
+    "使用", "可以", "一个", "没有", "什么", "这样", "还是", "就是", "这个", "时候"
+))
+LOW_VALUE_WORDS = frozenset(("觉得", "东西", "商品", "收到", "购买"))
+
+# 评价维度：名词+形容词组合（如“颜色漂亮”），统一为名词在前
+ASPECT_NOUN_FLAGS = frozenset(('n', 'nz'))
+ASPECT_ADJ_FLAGS = frozenset(('a', 'ad', 'ag', 'an'))
+
+_CJK_RUN = re.compile(r'[一-鿿]+')
+
+
+def _is_keyword(word, flag):
+    """只保留名词、形容词和习用语，过滤单字、停用词和低价值词"""
+    return (len(word) > 1 and word not in STOP_WORDS and word not in LOW_VALUE_WORDS
+            and (flag.startswith('n') or flag.startswith('a') or flag == 'l'))
+
+
+def analyze_text(text):
+    """把一条评论切分为 (关键词列表, 评价维度列表)"""
+    if not text:
+        return [], []
+    if jieba is None:
+        terms = []
+        for run in _CJK_RUN.findall(text):
+            for index in range(len(run) - 1):
+                bigram = run[index:index + 2]
+                if bigram not in STOP_WORDS and bigram not in LOW_VALUE_WORDS:
+                    terms.append(bigram)
+        return terms, []
+
+    pairs = [(pair.word, pair.flag) for pair in jieba.posseg.cut(text)]
+    terms = [word for word, flag in pairs if _is_keyword(word, flag)]
+    aspects = []
+    for (word, flag), (next_word, next_flag) in zip(pairs, pairs[1:]):
+        if flag in ASPECT_NOUN_FLAGS and next_flag in ASPECT_ADJ_FLAGS:
+            aspects.append(word + next_word)
+        elif flag in ASPECT_ADJ_FLAGS and next_flag in ASPECT_NOUN_FLAGS:
+            aspects.append(next_word + word)
+    return terms, aspects
+
+
+def analyze_texts(texts):
+    """批量切分，供 AnalysisPool 在工作进程中调用"""
+    return [analyze_text(text) for text in texts]
+
+
+class _Bucket:
+    __slots__ = ('count', 'terms', 'higher', 'lower')
+
+    def __init__(self, count):
+        self.count = count
+        # 同一计数的词按首次达到该计数的顺序排列
+        self.terms = {}
+        self.higher = None
+        self.lower = None
+
+
+class RankedCounter:
+    """按计数分桶的计数器
+
+    非空的计数桶按计数组成双向链表，词的计数增加 delta 时只需从它所在的桶向上移动，
+    代价与跨过的桶数成正比；top(k) 从最高的桶往下取，代价 O(k)。
+    """
+
+    def __init__(self):
+        self._floor = _Bucket(0)
+        self._ceiling = _Bucket(math.inf)
+        self._floor.higher = self._ceiling
+        self._ceiling.lower = self._floor
+        self._buckets = {}
+        self._term_bucket = {}
+
+    def __len__(self):
+        return len(self._term_bucket)
+
+    def get(self, term):
+        bucket = self._term_bucket.get(term)
+        return bucket.count if bucket else 0
+
+    def add(self, term, delta=1):
+        if delta <= 0:
+            return
+        old = self._term_bucket.get(term)
+        count = (old.count if old else 0) + delta
+        target = self._buckets.get(count)
+        if target is None:
+            node = old or self._floor
+            while node.higher.count < count:
+                node = node.higher
+            target = self._buckets[count] = _Bucket(count)
+            target.lower = node
+            target.higher = node.higher
+            node.higher.lower = target
+            node.higher = target
+        target.terms[term] = None
+        self._term_bucket[term] = target
+        if old is not None:
+            del old.terms[term]
+            if not old.terms:
+                old.lower.higher = old.higher
+                old.higher.lower = old.lower
+                del self._buckets[old.count]
+
+    def top(self, k, min_count=1):
+        """计数从高到低的前 k 个 (词, 计数)，只返回计数不小于 min_count 的"""
+        result = []
+        node = self._ceiling.lower
+        while node is not self._floor and node.count >= min_count and len(result) < k:
+            for term in node.terms:
+                result.append((term, node.count))
+                if len(result) >= k:
+                    break
+            node = node.lower
+        return result
+
+
+class _ProductTerms:
+    __slots__ = ('docs', 'tf', 'df', 'aspects', 'version', 'ranked', 'ranked_version')
+
+    def __init__(self):
+        self.docs = 0
+        self.tf = RankedCounter()
+        self.df = Counter()
+        self.aspects = RankedCounter()
+        self.version = 0
+        # 按 TF-IDF 排好序的候选词缓存，商品统计或全局 IDF 更新后失效
+        self.ranked = None
+        self.ranked_version = None
+
+
+class KeywordEngine:
+    """按商品增量维护词频(TF)、文档频率(DF)和评价维度计数的关键词引擎
+
+    商品第一次被查询时由 loader(product_id) 从数据库读取全部 (评论内容, 内容指纹) 建立统计，
+    之后评论写入器每写完一批调用 on_batch_written(batch)，只对已建立统计的商品做增量更新，
+    查询不再重新扫描评论全文。加载期间写入的批次先暂存，加载完成后按内容指纹
+    跳过已包含在加载结果中的评论。
+
+    top(product_id, k) 先按词频取 k * candidate_factor 个候选，再按
+    TF * (log((1+N)/(1+DF)) + 1) 排序，N 和 DF 是引擎内全部商品的评论数和文档频率；
+    排序结果缓存到该商品或全局统计下次更新，重复查询的代价为 O(k)。最多保留 max_products 个商品的统计，
+    超出时淘汰最久未使用的，再次查询时重新加载。
+    """
+
+    def __init__(self, loader=None, max_products=64, candidate_factor=20, min_aspect_count=4, pool=None):
+        self.loader = loader
+        self.max_products = max_products
+        self.candidate_factor = candidate_factor
+        # 与 Java 端一致，评价维度至少出现4次才返回
+        self.min_aspect_count = min_aspect_count
+        # analysis_pool.AnalysisPool，大批次的分词交给工作进程
+        self.pool = pool
+        self._lock = threading.Lock()
+        self._products = OrderedDict()
+        self._loading = {}
+        self._global_df = Counter()
+        self._global_docs = 0
+        # 任一商品的统计变化都会改变 IDF，缓存的排序结果需要一并失效
+        self._global_version = 0
+
+        self.loads = 0
+        self.evictions = 0
+        self.comments_indexed = 0
+
+    def _analyze(self, texts):
+        if self.pool is not None:
+            return self.pool.map(analyze_texts, texts)
+        return analyze_texts(texts)
+
+    def _apply(self, terms, analyzed):
+        """把切分结果计入商品统计，调用方持有锁"""
+        for words, aspects in analyzed:
+            terms.docs += 1
+            self._global_docs += 1
+            counts = Counter(words)
+            for word, count in counts.items():
+                terms.tf.add(word, count)
+            terms.df.update(counts.keys())
+            self._global_df.update(counts.keys())
+            for aspect, count in Counter(aspects).items():
+                terms.aspects.add(aspect, count)
+        terms.version += 1
+        self._global_version += 1
+        self.comments_indexed += len(analyzed)
+
+    def _forget(self, terms):
+        """淘汰商品时把它的文档频率从全局统计中扣除，调用方持有锁"""
+        self._global_docs -= terms.docs
+        self._global_df.subtract(terms.df)
+        for word in [word for word in terms.df if self._global_df[word] <= 0]:
+            del self._global_df[word]
+        self._global_version += 1
+
+    def on_batch_written(self, batch):
+        """CommentWriter 的批次回调：按商品分组，增量更新已建立统计的商品"""
+        groups = {}
+        with self._lock:
+            for comment_data in batch:
+                product_id = comment_data.get('product_id')
+                if product_id in self._products:
+                    groups.setdefault(product_id, []).append(comment_data.get('content') or '')
+                elif product_id in self._loading:
+                    self._loading[product_id].append(comment_data)
+        for product_id, texts in groups.items():
+            analyzed = self._analyze(texts)
+            with self._lock:
+                terms = self._products.get(product_id)
+                if terms is not None:
+                    self._apply(terms, analyzed)
+
+    def ensure_loaded(self, product_id):
+        """商品没有统计时用 loader 从数据库建立，返回该商品的统计"""
+        with self._lock:
+            terms = self._products.get(product_id)
+            if terms is not None:
+                self._products.move_to_end(product_id)
+                return terms
+            if self.loader is None:
+                return None
+            self._loading.setdefault(product_id, [])
+
+        try:
+            rows = self.loader(product_id)
+            analyzed = self._analyze([content or '' for content, _ in rows])
+            loaded_hashes = {content_hash for _, content_hash in rows}
+        except Exception:
+            with self._lock:
+                self._loading.pop(product_id, None)
+            raise
+
+        with self._lock:
+            pending = self._loading.pop(product_id, [])
+            terms = self._products.get(product_id)
+            if terms is not None:
+                return terms
+            terms = _ProductTerms()
+            self._apply(terms, analyzed)
+            # 加载期间写入、但不在加载结果里的评论
+            pending = [comment_data.get('content') or '' for comment_data in pending
+                       if comment_fingerprint(comment_data) not in loaded_hashes]
+            if pending:
+                self._apply(terms, analyze_texts(pending))
+            self._products[product_id] = terms
+            self.loads += 1
+            while len(self._products) > self.max_products:
+                _, evicted = self._products.popitem(last=False)
+                self._forget(evicted)
+                self.evictions += 1
+        logger.info(f"商品 {product_id} 的关键词统计已建立，共 {terms.docs} 条评论，{len(terms.tf)} 个词")
+        return terms
+
+    def _idf(self, word):
+        return math.log((1 + self._global_docs) / (1 + self._global_df[word])) + 1
+
+    def top(self, product_id, k=20, by='tfidf'):
+        """商品的前 k 个关键词 [{word, tf, df, score}]，by 为 'tfidf' 或 'tf'"""
+        terms = self.ensure_loaded(product_id)
+        if terms is None:
+            return []
+        with self._lock:
+            if by == 'tf':
+                return [{'word': word, 'tf': tf, 'df': terms.df[word], 'score': tf}
+                        for word, tf in terms.tf.top(k)]
+
+            limit = k * self.candidate_factor
+            version = (terms.version, self._global_version)
+            if terms.ranked is None or terms.ranked_version != version or len(terms.ranked) < min(k, len(terms.tf)):
+                candidates = terms.tf.top(limit)
+                scored = ((tf * self._idf(word), word, tf) for word, tf in candidates)
+                terms.ranked = [{'word': word, 'tf': tf, 'df': terms.df[word], 'score': round(score, 4)}
+                                for score, word, tf in heapq.nlargest(limit, scored)]
+                terms.ranked_version = version
+            return terms.ranked[:k]
+
+    def aspects(self, product_id, k=20):
+        """商品出现次数最多的前 k 个评价维度 [{aspect, count}]"""
+        terms = self.ensure_loaded(product_id)
+        if terms is None:
+            return []
+        with self._lock:
+            return [{'aspect': aspect, 'count': count}
+                    for aspect, count in terms.aspects.top(k, self.min_aspect_count)]
+
+    def summary(self, product_id):
+        terms = self.ensure_loaded(product_id)
+        return {'comments': terms.docs if terms else 0, 'terms': len(terms.tf) if terms else 0}
+
+    def stats(self):
+        with self._lock:
+            return {
+                'products': len(self._products),
+                'loading': len(self._loading),
+                'corpus_comments': self._global_docs,
+                'corpus_terms': len(self._global_df),
+                'comments_indexed': self.comments_indexed,
+                'loads': self.loads,
+                'evictions': self.evictions,
+                'segmenter': 'jieba' if jieba is not None else 'bigram'
+            }
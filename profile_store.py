@@ -0,0 +1,201 @@
+import json
+import logging
+import shutil
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# 按 origin 写入快照中的 localStorage，%s 为 {origin: {键: 值}} 的JSON
+LOCAL_STORAGE_SCRIPT = """
+(() => {
+    const items = (%s)[window.location.origin];
+    if (!items) return;
+    try {
+        for (const [name, value] of Object.entries(items)) {
+            if (window.localStorage.getItem(name) === null) {
+                window.localStorage.setItem(name, value);
+            }
+        }
+    } catch (e) {}
+})();
+"""
+
+
+def dir_size(path):
+    """目录占用的字节数"""
+    total = 0
+    for child in Path(path).rglob('*'):
+        try:
+            if child.is_file() and not child.is_symlink():
+                total += child.stat().st_size
+        except OSError:
+            pass
+    return total
+
+
+class ProfileStore:
+    """少量共享的浏览器配置目录和一份共享的登录状态快照
+
+    爬取任务从 size 个 shared_{n} 目录中租用一个（同一目录同一时间只能被一个
+    Chromium 使用），全部租出时临时多建一个，空闲后由 gc 清理。Cookie 和
+    localStorage 以 Playwright storage_state 格式保存在 storage_state.json 中，
+    新启动的上下文从快照恢复，结束时按 save_interval 节流写回。
+    gc 删除旧版按商品创建的 profile_{商品ID} 目录和空闲的多余共享目录。
+    """
+
+    def __init__(self, base_dir="jd_user_data", size=2, save_interval=60, max_idle_days=7,
+                 legacy_pattern='profile_*'):
+        self.base_dir = Path(base_dir)
+        self.size = size
+        self.save_interval = save_interval
+        self.max_idle_days = max_idle_days
+        self.legacy_pattern = legacy_pattern
+        self.state_path = self.base_dir / "storage_state.json"
+
+        self._lock = threading.Lock()
+        self._leased = set()
+        self._last_saved = 0.0
+
+        # 统计信息
+        self.leases = 0
+        self.overflow_leases = 0
+        self.restores = 0
+        self.saves = 0
+        self.gc_removed = 0
+        self.gc_bytes_freed = 0
+
+    def _profile_dir(self, index):
+        return self.base_dir / f"shared_{index}"
+
+    def lease(self):
+        """租用一个空闲的共享配置目录"""
+        with self._lock:
+            index = 0
+            while index in self._leased:
+                index += 1
+            self._leased.add(index)
+            self.leases += 1
+            if index >= self.size:
+                self.overflow_leases += 1
+        path = self._profile_dir(index)
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def release(self, path):
+        index = int(Path(path).name.rsplit('_', 1)[1])
+        with self._lock:
+            self._leased.discard(index)
+        try:
+            # 记录最近使用时间，gc 据此判断是否空闲
+            Path(path).touch()
+        except OSError:
+            pass
+
+    def load_state(self):
+        """读取登录状态快照，没有时返回 None"""
+        if not self.state_path.exists():
+            return None
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"读取登录状态快照失败: {e}")
+            return None
+
+    async def restore_state(self, context):
+        """把快照中的Cookie和localStorage恢复到新启动的浏览器上下文
+
+        Playwright 没有直接写入 localStorage 的接口，按 origin 注册一段初始化脚本，
+        页面脚本运行前写入快照中有、而配置目录里还没有的键，不覆盖更新的值。
+        """
+        state = self.load_state()
+        if not state:
+            return False
+        cookies = state.get('cookies') or []
+        origins = {entry['origin']: {item['name']: item['value'] for item in entry.get('localStorage') or []}
+                   for entry in state.get('origins') or [] if entry.get('origin')}
+        origins = {origin: items for origin, items in origins.items() if items}
+        if not cookies and not origins:
+            return False
+        try:
+            if cookies:
+                await context.add_cookies(cookies)
+            if origins:
+                await context.add_init_script(LOCAL_STORAGE_SCRIPT % json.dumps(origins))
+            self.restores += 1
+            return True
+        except Exception as e:
+            logger.warning(f"恢复登录状态失败: {e}")
+            return False
+
+    async def save_state(self, context, force=False):
+        """把上下文的Cookie和localStorage写回快照，save_interval 秒内最多一次"""
+        now = time.monotonic()
+        if not force and now - self._last_saved < self.save_interval:
+            return False
+        self._last_saved = now
+        try:
+            state = await context.storage_state()
+        except Exception as e:
+            logger.warning(f"获取浏览器登录状态失败: {e}")
+            return False
+        try:
+            self.base_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.state_path.with_suffix('.json.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+            tmp_path.replace(self.state_path)
+            self.saves += 1
+            return True
+        except Exception as e:
+            logger.error(f"保存登录状态快照失败: {e}")
+            return False
+
+    def gc(self, max_idle_days=None):
+        """删除旧的按商品配置目录和空闲的多余共享目录，返回释放的字节数"""
+        max_idle_days = self.max_idle_days if max_idle_days is None else max_idle_days
+        cutoff = time.time() - max_idle_days * 86400
+        candidates = list(self.base_dir.glob(self.legacy_pattern))
+        with self._lock:
+            for path in self.base_dir.glob('shared_*'):
+                try:
+                    index = int(path.name.rsplit('_', 1)[1])
+                except ValueError:
+                    continue
+                if index >= self.size and index not in self._leased:
+                    candidates.append(path)
+
+        removed = 0
+        freed = 0
+        for path in candidates:
+            try:
+                if not path.is_dir() or path.stat().st_mtime > cutoff:
+                    continue
+                size = dir_size(path)
+                shutil.rmtree(path)
+                removed += 1
+                freed += size
+            except Exception as e:
+                logger.warning(f"清理浏览器配置目录 {path} 失败: {e}")
+
+        self.gc_removed += removed
+        self.gc_bytes_freed += freed
+        if removed:
+            logger.info(f"已清理 {removed} 个浏览器配置目录，释放 {freed / 1024 / 1024:.1f} MB")
+        return freed
+
+    def stats(self):
+        with self._lock:
+            leased = len(self._leased)
+        return {
+            'size': self.size,
+            'leased': leased,
+            'leases': self.leases,
+            'overflow_leases': self.overflow_leases,
+            'restores': self.restores,
+            'saves': self.saves,
+            'gc_removed': self.gc_removed,
+            'gc_bytes_freed': self.gc_bytes_freed
+        }
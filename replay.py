@@ -0,0 +1,208 @@
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.error import HTTPError
+from urllib.parse import parse_qs, urlencode, urlparse
+from urllib.request import urlopen
+
+logger = logging.getLogger(__name__)
+
+# 决定评论接口响应内容的查询参数，callback 等其余参数不参与匹配
+FIXTURE_KEY_PARAMS = ('productId', 'score', 'sortType', 'page', 'pageSize', 'functionId', 'body')
+
+
+def fixture_key(url):
+    """评论接口URL对应的夹具键：接口路径加上决定响应内容的参数"""
+    parsed = urlparse(url)
+    query = parse_qs(parsed.query)
+    params = [(name, query[name][0]) for name in FIXTURE_KEY_PARAMS if name in query]
+    endpoint = parsed.path.rsplit('/', 1)[-1]
+    return endpoint + '?' + urlencode(params)
+
+
+def fixture_filename(key):
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16] + '.json'
+
+
+class FixtureRecorder:
+    """把拦截到的评论接口响应保存为夹具文件，供离线回放和基准测试使用
+
+    每个响应一个JSON文件 {key, url, status, body, recorded_at}，同一键只保留最新一次。
+    """
+
+    def __init__(self, fixture_dir):
+        self.fixture_dir = Path(fixture_dir)
+        self.fixture_dir.mkdir(parents=True, exist_ok=True)
+        self.recorded = 0
+
+    def record(self, url, status, body):
+        key = fixture_key(url)
+        fixture = {
+            'key': key,
+            'url': url,
+            'status': status,
+            'body': body,
+            'recorded_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+        try:
+            with open(self.fixture_dir / fixture_filename(key), 'w', encoding='utf-8') as f:
+                json.dump(fixture, f, ensure_ascii=False)
+            self.recorded += 1
+        except Exception as e:
+            logger.warning(f"保存评论响应夹具失败: {e}")
+
+
+class FixtureStore:
+    """按夹具键索引的评论接口响应"""
+
+    def __init__(self, fixture_dir):
+        self.fixture_dir = Path(fixture_dir)
+        self._fixtures = {}
+        self.reload()
+
+    def reload(self):
+        fixtures = {}
+        for path in sorted(self.fixture_dir.glob('*.json')):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    fixture = json.load(f)
+                fixtures[fixture['key']] = fixture
+            except Exception as e:
+                logger.warning(f"读取评论响应夹具 {path} 失败: {e}")
+        self._fixtures = fixtures
+        return len(fixtures)
+
+    def lookup(self, url):
+        return self._fixtures.get(fixture_key(url))
+
+    def __len__(self):
+        return len(self._fixtures)
+
+    def urls(self):
+        return [fixture['url'] for fixture in self._fixtures.values()]
+
+
+def generate_fixtures(fixture_dir, product_id, total, page_size=10, seed=0,
+                      endpoint='productPageComments'):
+    """按京东评论接口的JSONP格式生成 total 条合成评论的分页夹具，返回各页URL
+
+    用于录制数据不足时的大规模基准测试（1万、10万条评论）。
+    """
+    rng = random.Random(seed)
+    recorder = FixtureRecorder(fixture_dir)
+    words = ('质量很好', '物流很快', '性价比高', '包装破损', '和描述一致', '不太满意', '客服态度好', '会回购')
+    base_time = datetime(2024, 1, 1)
+    pages = (total + page_size - 1) // page_size
+    urls = []
+    for page in range(pages):
+        comments = []
+        for index in range(page * page_size, min(total, (page + 1) * page_size)):
+            comments.append({
+                'id': 10_000_000 + index,
+                'content': f"{rng.choice(words)}，{rng.choice(words)}。第{index}条评论",
+                'creationTime': (base_time + timedelta(minutes=index)).strftime('%Y-%m-%d %H:%M:%S'),
+                'nickname': f"用户{rng.randint(1, 99999)}",
+                'score': rng.randint(1, 5),
+                'userLevelName': 'PLUS会员',
+                'productColor': '默认',
+                'productSize': '默认',
+                'images': []
+            })
+        data = {
+            'productCommentSummary': {'commentCount': total},
+            'maxPage': pages,
+            'comments': comments
+        }
+        url = (f"https://club.jd.com/comment/{endpoint}.action?callback=fetchJSON_comment98"
+               f"&productId={product_id}&score=0&sortType=5&page={page}&pageSize={page_size}&isShadowSku=0")
+        body = f"fetchJSON_comment98({json.dumps(data, ensure_ascii=False)});"
+        recorder.record(url, 200, body)
+        urls.append(url)
+    return urls
+
+
+def fetch_url(url, timeout=10):
+    """同步请求回放服务器，返回 (状态码, 响应体)"""
+    try:
+        with urlopen(url, timeout=timeout) as response:
+            return response.status, response.read().decode('utf-8')
+    except HTTPError as e:
+        return e.code, ''
+
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        fixture = self.server.store.lookup(self.path)
+        self.server.requests += 1
+        if fixture is None:
+            self.server.misses += 1
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = fixture['body'].encode('utf-8')
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self.send_response(fixture.get('status', 200))
+        self.send_header('Content-Type', 'application/javascript; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("回放服务器: " + format, *args)
+
+
+class ReplayServer:
+    """在本地HTTP端口回放评论接口夹具的替身服务器
+
+    请求路径和查询参数与京东评论接口一致（如 /comment/productPageComments.action?productId=...），
+    按夹具键匹配返回录制的响应，未录制的请求返回404。latency 为每个响应附加的固定延迟（秒）。
+    """
+
+    def __init__(self, fixture_dir, host='127.0.0.1', port=0, latency=0.0):
+        self.store = FixtureStore(fixture_dir)
+        self._server = ThreadingHTTPServer((host, port), _ReplayHandler)
+        self._server.daemon_threads = True
+        self._server.store = self.store
+        self._server.latency = latency
+        self._server.requests = 0
+        self._server.misses = 0
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url_for(self, url):
+        """把京东评论接口URL改写为回放服务器上的同名路径"""
+        parsed = urlparse(url)
+        return f"{self.base_url}{parsed.path}?{parsed.query}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='replay-server', daemon=True)
+        self._thread.start()
+        logger.info(f"评论接口回放服务器已启动: {self.base_url}，共 {len(self.store)} 个夹具")
+        return self
+
+    def stats(self):
+        return {'fixtures': len(self.store), 'requests': self._server.requests, 'misses': self._server.misses}
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join(5)
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
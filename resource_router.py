@@ -0,0 +1,103 @@
+import logging
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# 爬取评论不需要的资源类型（Playwright request.resource_type）
+DEFAULT_BLOCKED_TYPES = frozenset({'image', 'media', 'font'})
+
+# 第三方统计、监控和广告域名，匹配域名本身及其子域名
+DEFAULT_BLOCKED_HOSTS = (
+    'mercury.jd.com',
+    'wl.jd.com',
+    'wlmonitor.m.jd.com',
+    'sgm-static.jd.com',
+    'h5speed.m.jd.com',
+    'blackhole.m.jd.com',
+    'gias.jd.com',
+    'ccc-x.jd.com',
+    'hm.baidu.com',
+    'cnzz.com',
+    'google-analytics.com',
+    'googletagmanager.com',
+    'doubleclick.net'
+)
+
+# 被拦截资源无法得知实际大小，按类型估算节省的字节数
+ESTIMATED_RESOURCE_BYTES = {
+    'image': 40 * 1024,
+    'media': 500 * 1024,
+    'font': 60 * 1024,
+    'stylesheet': 30 * 1024,
+    'script': 50 * 1024
+}
+DEFAULT_ESTIMATED_BYTES = 2 * 1024
+
+
+class ResourceRouter:
+    """上下文级别的资源拦截路由
+
+    按资源类型和域名确定性地拦截非必要请求，匹配 allow_pattern 的请求
+    （评论接口）始终交给后续的路由处理器。需要在评论拦截路由之后安装，
+    Playwright 会优先调用后注册的处理器。
+    """
+
+    def __init__(self, allow_pattern=None, blocked_types=DEFAULT_BLOCKED_TYPES,
+                 blocked_hosts=DEFAULT_BLOCKED_HOSTS, block_stylesheets=False):
+        self.allow_pattern = allow_pattern
+        self.blocked_types = set(blocked_types)
+        if block_stylesheets:
+            self.blocked_types.add('stylesheet')
+        self.blocked_hosts = tuple(blocked_hosts)
+        self.reset()
+
+    def reset(self):
+        """清零统计，每次爬取开始时调用"""
+        self.requests_seen = 0
+        self.requests_blocked = 0
+        self.bytes_saved = 0
+        self.blocked_by_type = {}
+
+    def _blocked_host(self, host):
+        return any(host == blocked or host.endswith('.' + blocked) for blocked in self.blocked_hosts)
+
+    def should_block(self, url, resource_type):
+        if self.allow_pattern is not None and self.allow_pattern.search(url):
+            return False
+        if resource_type in self.blocked_types:
+            return True
+        return self._blocked_host(urlparse(url).hostname or '')
+
+    async def handle(self, route, request):
+        self.requests_seen += 1
+        resource_type = request.resource_type
+        if not self.should_block(request.url, resource_type):
+            # 交给评论拦截等其他路由处理器，没有则正常发出请求
+            await route.fallback()
+            return
+
+        self.requests_blocked += 1
+        self.blocked_by_type[resource_type] = self.blocked_by_type.get(resource_type, 0) + 1
+        self.bytes_saved += ESTIMATED_RESOURCE_BYTES.get(resource_type, DEFAULT_ESTIMATED_BYTES)
+        try:
+            await route.abort('blockedbyclient')
+        except Exception as e:
+            logger.debug(f"拦截资源请求失败 (忽略): {request.url}, {e}")
+
+    async def install(self, context):
+        await context.route('**/*', self.handle)
+
+    async def uninstall(self, context):
+        await context.unroute('**/*', self.handle)
+
+    def stats(self):
+        return {
+            'requests_seen': self.requests_seen,
+            'requests_blocked': self.requests_blocked,
+            'blocked_by_type': dict(self.blocked_by_type),
+            'estimated_bytes_saved': self.bytes_saved
+        }
+
+    def summary(self):
+        return (f"共 {self.requests_seen} 个请求，拦截 {self.requests_blocked} 个，"
+                f"估计节省 {self.bytes_saved / 1024 / 1024:.2f} MB")
@@ -0,0 +1,216 @@
+import logging
+import re
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 以下词典与 Java 端 SentimentAnalysisService 保持一致，修改时两边同步
+
+# 积极词典
+POSITIVE_WORDS = (
+    "好", "棒", "赞", "优秀", "满意", "喜欢", "推荐", "不错", "完美", "超值",
+    "好用", "漂亮", "实惠", "划算", "给力", "惊喜", "舒适", "方便", "实用",
+    "精美", "高端", "大气", "上档次", "物美价廉", "物超所值", "性价比高",
+    "质量好", "做工好", "包装好", "服务好", "态度好", "速度快", "发货快",
+    "物流快", "正品", "真品", "新品", "全新", "完好", "完整", "齐全"
+)
+
+# 消极词典
+NEGATIVE_WORDS = (
+    "差", "烂", "糟", "失望", "后悔", "不推荐", "不行", "不好", "差劲", "垃圾",
+    "贵", "贵了", "不值", "浪费", "退货", "退款", "投诉", "问题", "故障",
+    "损坏", "瑕疵", "缺陷", "不足", "不满意", "不划算", "不实用",
+    "质量差", "做工差", "包装差", "服务差", "态度差", "速度慢", "发货慢",
+    "物流慢", "假货", "仿品", "二手", "旧", "破损", "残缺", "不齐"
+)
+
+# 程度副词及其权重
+DEGREE_WORDS = {
+    "非常": 1.5, "很": 1.3, "太": 1.3, "特别": 1.2, "比较": 0.8, "有点": 0.7, "稍微": 0.6,
+    "一般": 0.5, "极其": 1.6, "格外": 1.4, "相当": 1.2, "略微": 0.7, "几乎": 0.6
+}
+
+# 否定词
+NEGATION_WORDS = (
+    "不", "没", "无", "非", "否", "别", "莫", "勿", "未", "不要", "不能",
+    "不会", "不该", "不可", "不必", "不用", "不须", "不消"
+)
+
+# 词类，判定顺序与 Java 端一致：程度副词、否定词、积极词、消极词
+KIND_DEGREE = 0
+KIND_NEGATION = 1
+KIND_POSITIVE = 2
+KIND_NEGATIVE = 3
+
+LABEL_POSITIVE = '正面'
+LABEL_NEUTRAL = '中性'
+LABEL_NEGATIVE = '负面'
+
+# 拼接一批评论时使用的分隔符，不出现在任何词典词中
+_SEPARATOR = '\n'
+
+
+def compile_lexicon(min_length=2):
+    """把四个词典编译为一个按最长优先排列的正则，返回 (pattern, 词->编号, 词类数组, 权重数组)
+
+    Java 端分词后跳过单字词，单字的情感词和否定词实际不起作用，这里同样只编译长度不小于
+    min_length 的词。正则在每个位置优先匹配最长的词，效果等同于按词典做正向最大匹配。
+    """
+    entries = {}
+    for word, weight in DEGREE_WORDS.items():
+        entries.setdefault(word, (KIND_DEGREE, weight))
+    for word in NEGATION_WORDS:
+        entries.setdefault(word, (KIND_NEGATION, 1.0))
+    for word in POSITIVE_WORDS:
+        entries.setdefault(word, (KIND_POSITIVE, 1.0))
+    for word in NEGATIVE_WORDS:
+        entries.setdefault(word, (KIND_NEGATIVE, 1.0))
+
+    words = sorted((word for word in entries if len(word) >= min_length), key=lambda w: (-len(w), w))
+    pattern = re.compile('|'.join(re.escape(word) for word in words))
+    word_ids = {word: index for index, word in enumerate(words)}
+    kinds = np.array([entries[word][0] for word in words], dtype=np.int8)
+    weights = np.array([entries[word][1] for word in words], dtype=np.float64)
+    return pattern, word_ids, kinds, weights
+
+
+class SentimentScorer:
+    """按批计算评论情感得分的词典模型，结果写入 comment 表的 sentiment_score/sentiment_label
+
+    与 Java 端 SentimentAnalysisService 使用相同的词典和规则：情感词前连续奇数个否定词时极性取反，
+    紧挨着的程度副词按权重放大，得分为积极分/(积极分+消极分)，范围0-1，没有情感词时为0.5。
+    一批评论用分隔符拼成一个字符串，由编译好的正则一次扫描出全部词典词，
+    否定词计数、程度副词和按评论汇总都用 NumPy 在整批数组上完成。
+
+    Java 端先用 HanLP 分词再查词典，这里没有分词器，用词典上的最长匹配代替；
+    程度副词只在与情感词（或中间的否定词）紧挨着时生效，近似 Java 端“下一个词即重置”的规则。
+    """
+
+    def __init__(self, positive_threshold=0.6, negative_threshold=0.4, pool=None):
+        self.positive_threshold = positive_threshold
+        self.negative_threshold = negative_threshold
+        # analysis_pool.AnalysisPool，大批次交给工作进程打分
+        self.pool = pool
+        self._pattern, self._word_ids, self._kinds, self._weights = compile_lexicon()
+
+        self.batches = 0
+        self.texts_scored = 0
+        self.words_matched = 0
+        self.total_time = 0.0
+
+    def _match(self, texts):
+        """扫描整批文本，返回 (文本序号, 起点, 终点, 词编号) 四个数组"""
+        offsets = np.zeros(len(texts), dtype=np.int64)
+        position = 0
+        for index, text in enumerate(texts):
+            offsets[index] = position
+            position += len(text) + len(_SEPARATOR)
+
+        word_ids = self._word_ids
+        starts = []
+        ends = []
+        ids = []
+        for match in self._pattern.finditer(_SEPARATOR.join(texts)):
+            starts.append(match.start())
+            ends.append(match.end())
+            ids.append(word_ids[match.group()])
+
+        starts = np.array(starts, dtype=np.int64)
+        docs = np.searchsorted(offsets, starts, side='right') - 1
+        return docs, starts, np.array(ends, dtype=np.int64), np.array(ids, dtype=np.int64)
+
+    def score_batch(self, texts):
+        """计算一批文本的情感得分，返回 float64 数组，空文本和没有情感词的文本为0.5"""
+        start_time = time.perf_counter()
+        texts = [text if isinstance(text, str) else '' for text in texts]
+        if self.pool is not None and self.pool.should_offload(len(texts)):
+            scores = self.pool.map(score_texts, texts)
+            self.batches += 1
+            self.texts_scored += len(texts)
+            self.total_time += time.perf_counter() - start_time
+            return scores
+        return self._score_local(texts, start_time)
+
+    def _score_local(self, texts, start_time):
+        count = len(texts)
+        scores = np.full(count, 0.5)
+        if count == 0:
+            return scores
+
+        docs, starts, ends, ids = self._match(texts)
+        total = len(ids)
+        if total:
+            kinds = self._kinds[ids]
+            weights = self._weights[ids]
+            index = np.arange(total)
+            is_sentiment = kinds >= KIND_POSITIVE
+
+            # 新的一条评论从第一个匹配开始，之前的否定词和程度副词不再生效
+            doc_first = np.ones(total, dtype=bool)
+            doc_first[1:] = docs[1:] != docs[:-1]
+
+            # 每个情感词之前（同一评论内、上一个情感词之后）的否定词个数
+            negation_count = np.concatenate(([0], np.cumsum(kinds == KIND_NEGATION)))
+            previous_sentiment = np.concatenate(([-1], np.where(is_sentiment, index, -1)[:-1]))
+            reset = np.maximum.accumulate(np.maximum(previous_sentiment, np.where(doc_first, index - 1, -1)))
+            negated = (negation_count[index + 1] - negation_count[reset + 1]) % 2 == 1
+
+            # 程度副词与情感词之间只隔着紧挨着的否定词时才生效
+            broken = doc_first.copy()
+            broken[1:] |= (starts[1:] != ends[:-1]) | is_sentiment[:-1]
+            last_break = np.maximum.accumulate(np.where(broken, index, -1))
+            last_degree = np.maximum.accumulate(np.where(kinds == KIND_DEGREE, index, -1))
+            degree = np.where((last_degree >= 0) & (last_break <= last_degree),
+                              weights[np.maximum(last_degree, 0)], 1.0)
+
+            polarity = np.where(kinds == KIND_POSITIVE, 1.0, -1.0)
+            signed = np.where(negated, -polarity, polarity) * degree
+            sentiment_docs = docs[is_sentiment]
+            signed = signed[is_sentiment]
+            positive = np.bincount(sentiment_docs, weights=np.where(signed > 0, signed, 0.0), minlength=count)
+            negative = np.bincount(sentiment_docs, weights=np.where(signed < 0, -signed, 0.0), minlength=count)
+            totals = positive + negative
+            np.divide(positive, totals, out=scores, where=totals > 0)
+            np.clip(scores, 0.0, 1.0, out=scores)
+
+        self.batches += 1
+        self.texts_scored += count
+        self.words_matched += total
+        self.total_time += time.perf_counter() - start_time
+        return scores
+
+    def label(self, score):
+        if score >= self.positive_threshold:
+            return LABEL_POSITIVE
+        if score <= self.negative_threshold:
+            return LABEL_NEGATIVE
+        return LABEL_NEUTRAL
+
+    def label_batch(self, texts):
+        """返回 [(得分, 标签), ...]，得分保留4位小数"""
+        return [(round(float(score), 4), self.label(score)) for score in self.score_batch(texts)]
+
+    def score(self, text):
+        return float(self.score_batch([text])[0])
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'texts_scored': self.texts_scored,
+            'words_matched': self.words_matched,
+            'avg_batch_ms': round(self.total_time / self.batches * 1000, 3) if self.batches else 0.0
+        }
+
+
+# 工作进程内使用的打分器，首次调用时创建
+_worker_scorer = None
+
+
+def score_texts(texts):
+    """供 AnalysisPool 在工作进程中调用的模块级打分函数"""
+    global _worker_scorer
+    if _worker_scorer is None:
+        _worker_scorer = SentimentScorer()
+    return _worker_scorer.score_batch(texts)
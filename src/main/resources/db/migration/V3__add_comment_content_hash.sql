@@ -0,0 +1,3 @@
+ALTER TABLE comment
+    ADD COLUMN content_hash CHAR(40) DEFAULT NULL COMMENT '评论内容+昵称指纹(SHA1)，用于批量写入去重',
+    ADD UNIQUE KEY uk_product_content_hash (product_id, content_hash);
@@ -0,0 +1,3 @@
+ALTER TABLE product
+    ADD COLUMN last_comment_id BIGINT DEFAULT NULL COMMENT '增量爬取水位线：已爬取的最新评论ID',
+    ADD COLUMN last_comment_time DATETIME DEFAULT NULL COMMENT '增量爬取水位线：已爬取的最新评论时间';
@@ -0,0 +1,8 @@
+-- 为加 content_hash 之前入库的评论补算指纹，否则唯一键忽略 NULL，重新爬取会把历史评论全部重复写入一遍。
+-- 公式与 comment_dedup.comment_fingerprint 完全一致：SHA1(content + '\0' + nickname) 的UTF-8字节，
+-- Python 端昵称为 None 时格式化为字符串 'None'，这里同样处理。
+-- 历史数据中已有的重复评论按 id 顺序只给第一条写指纹，其余因唯一键冲突被 IGNORE 跳过，保持 NULL。
+UPDATE IGNORE comment
+SET content_hash = SHA1(CONCAT(content, CHAR(0 USING utf8mb4), IFNULL(nickname, 'None')))
+WHERE content_hash IS NULL
+ORDER BY id;
@@ -0,0 +1,164 @@
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# 全部商品汇总统计使用的分组名，分组样本不足时用它排序
+GLOBAL_GROUP = '*'
+
+
+class _StrategyRecord:
+    __slots__ = ('attempts', 'successes', 'latency', 'last_success')
+
+    def __init__(self, attempts=0, successes=0, latency=None, last_success=None):
+        self.attempts = attempts
+        self.successes = successes
+        # 成功时耗时的指数加权平均（秒）
+        self.latency = latency
+        self.last_success = last_success
+
+    def to_dict(self):
+        return {
+            'attempts': self.attempts,
+            'successes': self.successes,
+            'latency': self.latency,
+            'last_success': self.last_success
+        }
+
+
+class StrategyStats:
+    """记录各评论获取策略（接口、选择器）按商品分组的成功率和耗时，并据此排序
+
+    商品按ID前 prefix_len 位分组（同一类目的SKU通常ID前缀相同）。排序依据是
+    期望耗时 = 平均成功耗时 / 成功率，成功率做拉普拉斯平滑，没有记录的策略按
+    default_latency 和 50% 成功率估计，排在已知会失败的策略之前。
+    分组尝试次数少于 min_attempts 时使用全部商品的汇总统计。
+    统计保存在 path 指向的JSON文件中，服务重启后继续使用。
+    """
+
+    def __init__(self, path=None, prefix_len=4, min_attempts=3, smoothing=0.3, default_latency=5.0,
+                 save_interval=60):
+        self.path = Path(path) if path else None
+        self.prefix_len = prefix_len
+        self.min_attempts = min_attempts
+        self.smoothing = smoothing
+        self.default_latency = default_latency
+        self.save_interval = save_interval
+
+        self._lock = threading.Lock()
+        # {kind: {group: {strategy: _StrategyRecord}}}
+        self._records = {}
+        self._dirty = False
+        self._last_saved = 0.0
+        self.load()
+
+    def group_of(self, product_id):
+        return str(product_id)[:self.prefix_len] or GLOBAL_GROUP
+
+    def _record(self, kind, group, strategy):
+        strategies = self._records.setdefault(kind, {}).setdefault(group, {})
+        record = strategies.get(strategy)
+        if record is None:
+            record = strategies[strategy] = _StrategyRecord()
+        return record
+
+    def record(self, product_id, kind, strategy, success, latency):
+        """记录一次尝试，kind 为策略类别（如 endpoint、selector）"""
+        with self._lock:
+            for group in (self.group_of(product_id), GLOBAL_GROUP):
+                record = self._record(kind, group, strategy)
+                record.attempts += 1
+                if success:
+                    record.successes += 1
+                    record.last_success = time.time()
+                    record.latency = latency if record.latency is None else (
+                        self.smoothing * latency + (1 - self.smoothing) * record.latency)
+            self._dirty = True
+
+    def _expected_cost(self, record):
+        if record is None:
+            return self.default_latency / 0.5
+        rate = (record.successes + 1) / (record.attempts + 2)
+        latency = self.default_latency if record.latency is None else record.latency
+        return latency / rate
+
+    def order(self, product_id, kind, strategies):
+        """按期望耗时从低到高返回策略列表，相同时保持原顺序"""
+        strategies = list(strategies)
+        with self._lock:
+            groups = self._records.get(kind, {})
+            records = groups.get(self.group_of(product_id), {})
+            if sum(r.attempts for r in records.values()) < self.min_attempts:
+                records = groups.get(GLOBAL_GROUP, {})
+            costs = {strategy: self._expected_cost(records.get(strategy)) for strategy in strategies}
+        return sorted(strategies, key=lambda strategy: costs[strategy])
+
+    def load(self):
+        if not self.path or not self.path.exists():
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning(f"读取策略统计失败: {e}")
+            return
+        with self._lock:
+            self._records = {
+                kind: {
+                    group: {strategy: _StrategyRecord(**record) for strategy, record in strategies.items()}
+                    for group, strategies in groups.items()
+                }
+                for kind, groups in data.items()
+            }
+
+    def save(self, force=False):
+        """把统计写回文件，save_interval 秒内最多一次"""
+        if not self.path:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            if not self._dirty or (not force and now - self._last_saved < self.save_interval):
+                return False
+            data = self._snapshot()
+            self._dirty = False
+            self._last_saved = now
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix('.json.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            tmp_path.replace(self.path)
+            return True
+        except Exception as e:
+            logger.error(f"保存策略统计失败: {e}")
+            return False
+
+    def _snapshot(self, group=None):
+        return {
+            kind: {
+                g: {strategy: record.to_dict() for strategy, record in strategies.items()}
+                for g, strategies in groups.items() if group is None or g == group
+            }
+            for kind, groups in self._records.items()
+        }
+
+    def stats(self, product_id=None):
+        """返回全部统计，传入商品ID时只返回该商品所在分组和当前排序"""
+        with self._lock:
+            if product_id is None:
+                return self._snapshot()
+            group = self.group_of(product_id)
+            snapshot = self._snapshot(group)
+            kinds = {kind: list(groups.get(GLOBAL_GROUP, {})) for kind, groups in self._records.items()}
+        return {
+            'group': group,
+            'records': {kind: groups.get(group, {}) for kind, groups in snapshot.items()},
+            'order': {kind: self.order(product_id, kind, strategies) for kind, strategies in kinds.items()}
+        }
+
+
+# 进程内共享的策略统计（不落盘），服务中可传入带文件路径的实例
+default_strategy_stats = StrategyStats()
@@ -10,10 +10,14 @@ sio = socketio.Client()
 # 记录时间戳
 start_time = time.time()
 
+# 测试商品
+PRODUCT_ID = "100019125512"
+
 # 事件计数器
 events = {
     'progress': 0,
-    'new_comment': 0,
+    'new_comments': 0,
+    'comments': 0,
     'error': 0
 }
 
@@ -23,7 +27,10 @@ crawling_completed = False
 # 连接处理函数
 @sio.event
 def connect():
-    print(f"已连接到爬虫服务器，等待数据推送...")
+    print(f"已连接到爬虫服务器，订阅商品 {PRODUCT_ID} 的推送...")
+    # 评论和进度只推送给订阅了该商品房间的客户端
+    sio.emit('join_product', {'product_id': PRODUCT_ID},
+             callback=lambda ack: print(f"订阅结果: {ack}"))
 
 # 断开连接处理函数
 @sio.event
@@ -40,13 +47,17 @@ def on_progress(data):
         crawling_completed = True
         print(f"\n爬取完成！总共爬取了 {data.get('count')} 条评论")
         print(f"总运行时间: {time.time() - start_time:.2f} 秒")
-        print(f"收到事件总数: progress={events['progress']}, new_comment={events['new_comment']}, error={events['error']}")
+        print(f"收到事件总数: progress={events['progress']}, new_comments={events['new_comments']}, "
+              f"评论={events['comments']}, error={events['error']}")
 
-# 新评论事件处理函数
-@sio.on('new_comment')
-def on_new_comment(data):
-    events['new_comment'] += 1
-    print(f"收到新评论: {data.get('nickname')} - {data.get('content')[:30]}...")
+# 批量评论事件处理函数
+@sio.on('new_comments')
+def on_new_comments(data):
+    events['new_comments'] += 1
+    events['comments'] += data.get('count', 0)
+    print(f"收到 {data.get('count')} 条新评论，商品ID={data.get('product_id')}")
+    for comment in data.get('comments', [])[:3]:
+        print(f"  {comment.get('nickname')} - {comment.get('content', '')[:30]}...")
 
 # 错误事件处理函数
 @sio.on('error')
@@ -71,8 +82,8 @@ if __name__ == '__main__':
         response = requests.post(
             f"{server_url}/api/crawl",
             json={
-                "url": "https://item.jd.com/100019125512.html", 
-                "product_id": "100019125512", 
+                "url": f"https://item.jd.com/{PRODUCT_ID}.html", 
+                "product_id": PRODUCT_ID, 
                 "product_name": "华为手机测试"
             }
         )
@@ -91,7 +102,7 @@ if __name__ == '__main__':
                 break
             # 每10秒打印一次等待状态
             if int(elapsed) % 10 == 0 and int(elapsed) > 0:
-                print(f"已等待 {int(elapsed)} 秒，已收到 {events['new_comment']} 条评论...")
+                print(f"已等待 {int(elapsed)} 秒，已收到 {events['comments']} 条评论...")
         
         # 等待3秒，确保所有数据都已接收
         time.sleep(3)
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# 爬虫模块都在仓库根目录下，不是安装包
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
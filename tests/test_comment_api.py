@@ -0,0 +1,90 @@
+import asyncio
+
+from comment_api import CommentApiClient
+
+
+class PagedClient(CommentApiClient):
+    """按给定的页面列表响应 fetch_page，None 表示该页请求失败"""
+
+    def __init__(self, pages):
+        super().__init__(request_context=None)
+        self.pages = pages
+        self.requested = []
+
+    async def fetch_page(self, product_id, page, score=0, sort_type=5):
+        self.requested.append((page, sort_type))
+        if page >= len(self.pages):
+            return {'comments': []}
+        comments = self.pages[page]
+        return None if comments is None else {'comments': comments}
+
+
+def comment(comment_id, minute, second=0):
+    return {'id': comment_id, 'creationTime': f'2024-01-01 10:{minute:02d}:{second:02d}'}
+
+
+def fetch_since(pages, since, since_id=None, max_pages=100):
+    client = PagedClient(pages)
+    comments, reached = asyncio.run(client.fetch_since('100', since, max_pages=max_pages, since_id=since_id))
+    return [c['id'] for c in comments], reached, client
+
+
+def test_stops_after_passing_watermark():
+    pages = [[comment(9, 9), comment(8, 8)], [comment(7, 7), comment(5, 5), comment(4, 4)], [comment(3, 3)]]
+    ids, reached, client = fetch_since(pages, '2024-01-01 10:06:00', since_id=5)
+    assert ids == [9, 8, 7]
+    assert reached
+    assert [page for page, _ in client.requested] == [0, 1]
+    assert all(sort_type == 6 for _, sort_type in client.requested)
+
+
+def test_comments_in_watermark_second_are_not_lost():
+    # 6、7 与水位线评论 5 在同一秒发出，且排在它后面
+    pages = [[comment(9, 9), comment(5, 5), comment(6, 5), comment(7, 5)], [comment(4, 4)]]
+    ids, reached, _ = fetch_since(pages, '2024-01-01 10:05:00', since_id=5)
+    assert ids == [9, 6, 7]
+    assert reached
+
+
+def test_keeps_paging_until_watermark_second_is_passed():
+    # 水位线评论所在页没有更早的评论，同一秒的评论可能延续到下一页
+    pages = [[comment(9, 9), comment(5, 5)], [comment(6, 5), comment(4, 4)], [comment(3, 3)]]
+    ids, reached, client = fetch_since(pages, '2024-01-01 10:05:00', since_id=5)
+    assert ids == [9, 6]
+    assert reached
+    assert len(client.requested) == 2
+
+
+def test_since_id_only_stops_at_boundary_comment():
+    pages = [[comment(9, 9), comment(8, 8)], [comment(7, 7), comment(6, 6)]]
+    ids, reached, _ = fetch_since(pages, None, since_id=7)
+    assert ids == [9, 8]
+    assert reached
+
+
+def test_without_watermark_everything_is_new():
+    pages = [[comment(9, 9), comment(8, 8)]]
+    ids, reached, _ = fetch_since(pages, None, max_pages=1)
+    assert ids == [9, 8]
+    assert reached
+
+
+def test_running_out_of_comments_counts_as_reached():
+    pages = [[comment(9, 9)]]
+    ids, reached, _ = fetch_since(pages, '2024-01-01 10:01:00')
+    assert ids == [9]
+    assert reached
+
+
+def test_page_budget_exhausted_is_not_reached():
+    pages = [[comment(9, 9)], [comment(8, 8)], [comment(7, 7)], [comment(1, 1)]]
+    ids, reached, _ = fetch_since(pages, '2024-01-01 10:05:00', max_pages=2)
+    assert ids == [9, 8]
+    assert not reached
+
+
+def test_failed_page_is_not_reached():
+    pages = [[comment(9, 9)], None, [comment(1, 1)]]
+    ids, reached, _ = fetch_since(pages, '2024-01-01 10:05:00')
+    assert ids == [9]
+    assert not reached
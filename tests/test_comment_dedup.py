@@ -0,0 +1,110 @@
+import hashlib
+
+import pytest
+
+from comment_dedup import (BloomFilter, BloomFilterStore, CommentDeduper, comment_fingerprint,
+                           comment_fingerprints)
+from comment_record import CommentRecord
+
+
+def make_comment(index, nickname='用户1'):
+    return {'content': f'质量很好，第{index}条评论', 'nickname': nickname, 'creationTime': '2024-01-01 00:00:00'}
+
+
+def test_fingerprint_is_sha1_of_content_and_nickname():
+    # V5 迁移用 SQL 按同一公式补算历史评论的 content_hash，两边必须一致
+    comment = {'content': '质量很好😀', 'nickname': '用户1'}
+    expected = hashlib.sha1('质量很好😀\x00用户1'.encode('utf-8')).hexdigest()
+    assert comment_fingerprint(comment) == expected
+    assert comment_fingerprint({'content': 'a', 'nickname': None}) == hashlib.sha1(b'a\x00None').hexdigest()
+
+
+def test_fingerprint_ignores_other_fields_and_record_type():
+    comment = make_comment(1)
+    other = dict(comment, creationTime='2025-05-05 12:00:00', score=1)
+    assert comment_fingerprint(comment) == comment_fingerprint(other)
+    assert comment_fingerprint(CommentRecord.from_dict(comment)) == comment_fingerprint(comment)
+    assert comment_fingerprint(comment) != comment_fingerprint(make_comment(1, nickname='用户2'))
+
+
+def test_batch_fingerprints_match_single():
+    comments = [make_comment(index) for index in range(50)]
+    assert comment_fingerprints(comments) == [comment_fingerprint(c) for c in comments]
+
+
+def test_deduper_reports_first_capture_only():
+    deduper = CommentDeduper()
+    assert deduper.add(make_comment(1))
+    assert not deduper.add(dict(make_comment(1)))
+    assert deduper.add(make_comment(2))
+    assert len(deduper) == 2
+    assert deduper.duplicates == 1
+    assert make_comment(1) in deduper
+
+    deduper.clear()
+    assert len(deduper) == 0
+    assert deduper.add(make_comment(1))
+
+
+def test_captured_is_not_stored():
+    deduper = CommentDeduper(bloom=BloomFilter.for_capacity(1000))
+    comment = make_comment(1)
+    assert deduper.add(comment)
+    # 捕获不等于入库，只有写入成功后调用 mark_stored 才记为已入库
+    assert not deduper.is_stored(comment)
+    deduper.mark_stored(comment)
+    assert deduper.is_stored(comment)
+    # 已入库的评论在新一次爬取中仍然算首次捕获
+    deduper.clear()
+    assert deduper.add(comment)
+
+
+def test_without_bloom_nothing_is_stored():
+    deduper = CommentDeduper()
+    deduper.mark_stored(make_comment(1))
+    assert not deduper.is_stored(make_comment(1))
+
+
+def test_bloom_has_no_false_negatives_and_bounded_false_positives():
+    bloom = BloomFilter.for_capacity(2000, 0.01)
+    stored = [comment_fingerprint(make_comment(index)) for index in range(2000)]
+    for fingerprint in stored:
+        bloom.add(fingerprint)
+    assert all(fingerprint in bloom for fingerprint in stored)
+    others = [comment_fingerprint(make_comment(index, nickname='其他')) for index in range(5000)]
+    false_positives = sum(fingerprint in bloom for fingerprint in others)
+    assert false_positives / len(others) < 0.03
+
+
+def test_bloom_store_round_trip(tmp_path):
+    store = BloomFilterStore(tmp_path, capacity=1000)
+    bloom = store.load('100')
+    assert bloom.count == 0
+    fingerprints = [comment_fingerprint(make_comment(index)) for index in range(100)]
+    for fingerprint in fingerprints:
+        bloom.add(fingerprint)
+    store.save('100', bloom)
+
+    loaded = store.load('100')
+    assert (loaded.num_bits, loaded.num_hashes, loaded.count) == (bloom.num_bits, bloom.num_hashes, 100)
+    assert loaded.bits == bloom.bits
+    assert all(fingerprint in loaded for fingerprint in fingerprints)
+    # 各商品分开保存
+    assert store.load('200').count == 0
+
+
+@pytest.mark.parametrize('damage', ['magic', 'truncate'])
+def test_bloom_store_recreates_damaged_file(tmp_path, damage):
+    store = BloomFilterStore(tmp_path, capacity=1000)
+    bloom = store.load('100')
+    bloom.add(comment_fingerprint(make_comment(1)))
+    store.save('100', bloom)
+    path = tmp_path / '100.bloom'
+    data = path.read_bytes()
+    path.write_bytes(b'XXXX' + data[4:] if damage == 'magic' else data[:-1])
+
+    with pytest.raises(ValueError):
+        BloomFilter.load(path)
+    reloaded = store.load('100')
+    assert reloaded.count == 0
+    assert comment_fingerprint(make_comment(1)) not in reloaded
@@ -0,0 +1,62 @@
+import pytest
+
+import comment_parser
+from comment_parser import jsonp_bounds, parse_comment_body
+
+PAYLOAD = '{"comments": [{"id": 1, "content": "质量很好"}], "maxPage": 3}'
+
+
+@pytest.fixture(params=['orjson', 'stdlib'])
+def decoder(request, monkeypatch):
+    """orjson 快速路径和标准库 raw_decode 回退路径都要覆盖"""
+    if request.param == 'orjson':
+        if comment_parser.orjson is None:
+            pytest.skip('未安装 orjson')
+    else:
+        monkeypatch.setattr(comment_parser, 'orjson', None)
+    return request.param
+
+
+@pytest.mark.parametrize('body', [
+    PAYLOAD,
+    f'fetchJSON_comment98({PAYLOAD});',
+    f'fetchJSON_comment98({PAYLOAD})',
+    f'  jQuery.cb_1({PAYLOAD});\n',
+    f'\n{PAYLOAD}\n',
+])
+def test_parses_json_and_jsonp(decoder, body):
+    data = parse_comment_body(body)
+    assert data['maxPage'] == 3
+    assert data['comments'][0]['content'] == '质量很好'
+
+
+@pytest.mark.parametrize('body', [
+    None,
+    '',
+    'fetchJSON_comment98(',
+    'fetchJSON_comment98({"comments": [});',
+    '<html>访问过于频繁</html>',
+    'not json at all',
+])
+def test_invalid_body_returns_none(decoder, body):
+    assert parse_comment_body(body) is None
+
+
+def test_bounds_of_plain_json_cover_whole_body():
+    assert jsonp_bounds(PAYLOAD) == (0, len(PAYLOAD))
+
+
+def test_bounds_skip_callback_and_trailer():
+    body = f'fetchJSON_comment98({PAYLOAD});'
+    start, end = jsonp_bounds(body)
+    assert body[start:end] == PAYLOAD
+
+
+def test_non_identifier_prefix_is_not_treated_as_callback():
+    body = f'var data = cb({PAYLOAD})'
+    assert jsonp_bounds(body) == (0, len(body))
+
+
+def test_callback_without_closing_paren_falls_back_to_whole_body():
+    body = 'cb({"a": 1}'
+    assert jsonp_bounds(body) == (0, len(body))
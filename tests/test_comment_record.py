@@ -0,0 +1,92 @@
+import json
+
+import pytest
+
+from comment_parser import normalize_comment
+from comment_record import CommentRecord, as_dict
+
+RAW = {
+    'id': 101,
+    'content': '质量很好',
+    'creationTime': '2024-01-01 10:00:00',
+    'nickname': '用户1',
+    'score': 5,
+    'userLevelName': 'PLUS会员',
+    'productColor': '黑色',
+    'productSize': 'XL',
+    'images': [{'imgUrl': '//img.jd.com/1.jpg'}],
+}
+
+EXPECTED = {
+    'commentId': 101,
+    'content': '质量很好',
+    'creationTime': '2024-01-01 10:00:00',
+    'nickname': '用户1',
+    'score': 5,
+    'userLevelName': 'PLUS会员',
+    'productColor': '黑色',
+    'productSize': 'XL',
+    'images': [{'imgUrl': '//img.jd.com/1.jpg'}],
+}
+
+
+def test_normalize_comment_maps_to_original_dict():
+    record = normalize_comment(RAW)
+    assert isinstance(record, CommentRecord)
+    assert record.to_dict() == EXPECTED
+    assert list(record) == list(EXPECTED)
+
+
+def test_equality_with_dict_in_both_directions():
+    record = normalize_comment(RAW)
+    assert record == EXPECTED
+    assert EXPECTED == record
+    assert record == CommentRecord.from_dict(EXPECTED)
+    assert record != dict(EXPECTED, score=1)
+    assert record != dict(EXPECTED, extra_key=1)
+    assert (record == 'not a comment') is False
+
+
+def test_round_trip_preserves_optional_and_unknown_keys():
+    data = dict(EXPECTED, product_id='100', product_name='测试商品', url='https://item.jd.com/100.html',
+                afterUserComment={'content': '追评'})
+    record = CommentRecord.from_dict(data)
+    assert record.to_dict() == data
+    assert record['afterUserComment'] == {'content': '追评'}
+    assert CommentRecord.from_dict(record) is record
+    assert CommentRecord.from_dict(record.to_dict()) == record
+
+
+def test_optional_fields_appear_only_when_set():
+    record = normalize_comment(RAW)
+    assert 'product_id' not in record
+    assert record.get('product_id') is None
+    with pytest.raises(KeyError):
+        record['product_id']
+    assert len(record) == len(EXPECTED)
+
+    with_product = normalize_comment(RAW, product_id='100', product_name='测试商品')
+    assert with_product['product_id'] == '100'
+    assert with_product.to_dict() == dict(EXPECTED, product_id='100', product_name='测试商品')
+    assert 'url' not in with_product
+
+
+def test_images_default_to_empty_list():
+    record = normalize_comment(dict(RAW, images=None))
+    assert record['images'] == []
+    assert record.to_dict()['images'] == []
+    # 返回的是副本，修改不影响记录本身
+    record['images'].append('x')
+    assert record['images'] == []
+
+
+def test_as_dict_is_json_serializable():
+    record = normalize_comment(RAW, product_id='100', product_name='测试商品')
+    assert json.loads(json.dumps(as_dict(record), ensure_ascii=False)) == record
+    plain = {'content': 'x'}
+    assert as_dict(plain) is plain
+
+
+def test_records_are_unhashable_like_dicts():
+    with pytest.raises(TypeError):
+        hash(normalize_comment(RAW))
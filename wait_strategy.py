@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class WaitStrategy:
+    """事件驱动的等待策略，替代 load_comments 中的固定 sleep
+
+    评论处理入口每新增评论调用一次 notify()。调用方在触发动作（导航、点击）前
+    用 mark() 记下当前进度，之后 wait_for_comments(mark) 在有新评论时立即返回，
+    否则等到自适应超时。超时按评论到达延迟的指数滑动平均调整，限制在
+    [min_timeout, max_timeout] 之间。所有等待时间都计入统计。
+    """
+
+    def __init__(self, initial_timeout=8.0, min_timeout=1.0, max_timeout=15.0,
+                 settle_timeout=5.0, smoothing=0.3, safety_factor=2.5):
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.settle_timeout = settle_timeout
+        self.smoothing = smoothing
+        self.safety_factor = safety_factor
+        self.latency_avg = None
+        self.initial_timeout = initial_timeout
+
+        self.arrived = 0
+        self._event = None
+
+        # 等待统计
+        self.waits = 0
+        self.hits = 0
+        self.timeouts = 0
+        self.wait_time = 0.0
+        self.wait_time_by_label = {}
+
+    @property
+    def comment_timeout(self):
+        if self.latency_avg is None:
+            return self.initial_timeout
+        return min(self.max_timeout, max(self.min_timeout, self.latency_avg * self.safety_factor))
+
+    def notify(self, count=1):
+        """有新评论到达"""
+        self.arrived += count
+        if self._event is not None:
+            self._event.set()
+
+    def mark(self):
+        return self.arrived, time.monotonic()
+
+    def _record(self, label, elapsed):
+        self.waits += 1
+        self.wait_time += elapsed
+        self.wait_time_by_label[label] = self.wait_time_by_label.get(label, 0.0) + elapsed
+
+    async def wait_for_comments(self, mark, timeout=None, label='comments'):
+        """等待 mark 之后有新评论到达，返回是否等到"""
+        since, marked_at = mark
+        start = time.monotonic()
+        timeout = self.comment_timeout if timeout is None else timeout
+        if self._event is None:
+            self._event = asyncio.Event()
+        try:
+            while self.arrived <= since:
+                remaining = timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    self.timeouts += 1
+                    return False
+                self._event.clear()
+                try:
+                    await asyncio.wait_for(self._event.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+            self.hits += 1
+            latency = time.monotonic() - marked_at
+            self.latency_avg = latency if self.latency_avg is None else (
+                self.smoothing * latency + (1 - self.smoothing) * self.latency_avg)
+            return True
+        finally:
+            self._record(label, time.monotonic() - start)
+
+    async def settle(self, page, timeout=None, label='settle'):
+        """等待页面网络空闲，超时不视为错误"""
+        start = time.monotonic()
+        timeout = self.settle_timeout if timeout is None else timeout
+        try:
+            await page.wait_for_load_state('networkidle', timeout=timeout * 1000)
+            return True
+        except Exception:
+            return False
+        finally:
+            self._record(label, time.monotonic() - start)
+
+    async def backoff(self, attempt, base=0.5, cap=4.0, label='retry'):
+        """重试前的指数退避"""
+        delay = min(cap, base * (2 ** (attempt - 1)))
+        start = time.monotonic()
+        await asyncio.sleep(delay)
+        self._record(label, time.monotonic() - start)
+
+    def stats(self):
+        return {
+            'waits': self.waits,
+            'hits': self.hits,
+            'timeouts': self.timeouts,
+            'wait_time': round(self.wait_time, 3),
+            'wait_time_by_label': {label: round(t, 3) for label, t in self.wait_time_by_label.items()},
+            'comment_timeout': round(self.comment_timeout, 3)
+        }
+
+    def summary(self):
+        return (f"共等待 {self.waits} 次，等到评论 {self.hits} 次，超时 {self.timeouts} 次，"
+                f"等待总时长 {self.wait_time:.2f} 秒")